@@ -1,20 +1,48 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Form, Body, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-import cv2
+import asyncio
+import hashlib
+import hmac
+import json
+import mmap
+import os
 import tempfile
 import logging
+import queue
 import time
 import uuid
-from typing import Dict, List, Optional
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
 
-from detectors.vehicle_detector import VehicleDetector
-from detectors.plate_detector import PlateDetector
-from tracker.centroid_tracker import CentroidTracker
-from ocr.ocr_reader import read_plate_enhanced, multi_pass_ocr, OCRResult
+from ocr.ocr_reader import get_ocr_engine, set_ocr_engine
+from pipeline.job_queue import PRIORITIES, CostModel, Job, JobQueue, QueueFull
+from pipeline.evidence import EvidenceRecorder, evidence_path
+from pipeline.frame_ring import ProcessDecoder
+from pipeline.prescan import ScanResult, plan_frames
+from pipeline.records import build_response_parts
+from pipeline.processor import VideoPipeline, open_video, read_frames, vehicle_event
+from pipeline.result_writer import ResultWriter
+from pipeline.live_stream import LiveStreamManager
+from pipeline.replay import replay_detections, validate_replay_parameters
 from utils.config import *
-from utils.pre_process import safe_crop
-from utils.speed_estimator import calculate_speed
+from utils.result_cache import ResultCache, fingerprint_models, hash_config, make_cache_key
+from utils.detection_store import META_FILE, DetectionStore, DetectionStoreWriter, prune_analyses
+from utils.runtime_config import ConfigError, RuntimeConfig, RuntimeConfigStore
+from utils import tracing, tuning
+from utils.metrics import (
+    REGISTRY,
+    Counter,
+    Gauge,
+    ACTIVE_JOBS,
+    REQUEST_SECONDS,
+    VIDEOS_PROCESSED,
+    render_metrics,
+    stage_timer
+)
 
 # Application Setup
 app = FastAPI(
@@ -40,10 +68,38 @@ logger = logging.getLogger("ai-service")
 logger.setLevel(logging.DEBUG)
 logger.propagate = True
 
+# Host Tuning Profile (thread counts must be set before the models load)
+try:
+    tuning_profile = tuning.load_profile(TUNING_PROFILE_FILE)
+except ValueError as e:
+    logger.error(str(e))
+    raise RuntimeError("Invalid tuning profile")
+if tuning_profile is not None:
+    tuning.apply_profile(tuning_profile)
+    logger.info("🎛  Tuning profile applied (%s): %s", TUNING_PROFILE_FILE, tuning_profile.settings())
+else:
+    logger.info("No tuning profile for this host, library thread defaults in use (see benchmarks.tune)")
+
 # Initialize Models
-vehicle_detector = VehicleDetector()
-plate_detector = PlateDetector()
-tracker = CentroidTracker()
+def load_detectors():
+    """New vehicle and plate detector instances (each instance is used by one thread at a time)"""
+    if STUB_DETECTORS:
+        from detectors.stub_detectors import StubVehicleDetector, StubPlateDetector
+        return StubVehicleDetector(STUB_INFERENCE_MS), StubPlateDetector(STUB_INFERENCE_MS)
+    
+    from detectors.vehicle_detector import VehicleDetector
+    from detectors.plate_detector import PlateDetector
+    return VehicleDetector(), PlateDetector()
+
+
+vehicle_detector, plate_detector = load_detectors()
+if STUB_DETECTORS:
+    from detectors.stub_detectors import StubOCREngine
+    
+    logger.warning("⚠ STUB_DETECTORS=true: using stand-in detectors and OCR, results are not real")
+    set_ocr_engine(StubOCREngine(STUB_INFERENCE_MS))
+else:
+    get_ocr_engine()
 
 # Validate and log configuration
 config_valid, config_errors = validate_configuration()
@@ -55,120 +111,76 @@ if not config_valid:
 
 log_configuration(logger)
 
+# Runtime Configuration (analysis settings that change without a restart)
+runtime_config = RuntimeConfigStore(RuntimeConfig(), RUNTIME_CONFIG_FILE or None)
+try:
+    runtime_config.load()
+except ConfigError as e:
+    logger.error("Runtime configuration invalid (%s):", RUNTIME_CONFIG_FILE)
+    for error in e.errors:
+        logger.error(f"  - {error}")
+    raise RuntimeError("Invalid runtime configuration")
+logger.info("Runtime configuration loaded: %d camera profiles", len(runtime_config.snapshot()["cameras"]))
 
-# Helper Functions
-def sample_trajectory(positions: List[tuple], sampling_rate: int) -> List[Dict]:
-    """Sample trajectory points for compact response"""
-    if not INCLUDE_TRAJECTORY:
-        return []
-    
-    sampled = []
-    for i, (frame, pos) in enumerate(positions):
-        if i % sampling_rate == 0 or i == len(positions) - 1:
-            sampled.append({
-                "frame": frame,
-                "x": pos[0],
-                "y": pos[1]
-            })
-    
-    return sampled
+# Result Cache
+result_cache = None
+model_fingerprint = ""
+if RESULT_CACHE_ENABLED:
+    model_fingerprint = fingerprint_models()
+    result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024)
+    logger.info("Result cache ready: %s", result_cache.stats())
 
+# Job Queue
+job_queue = JobQueue(
+    JOB_WORKERS,
+    JOB_QUEUE_MAX,
+    JOB_QUEUE_MAX_BACKLOG_SECONDS,
+    CostModel(JOB_INITIAL_FRAME_COST_SECONDS, JOB_COST_EWMA_ALPHA)
+)
 
-def calculate_trajectory_length(positions: List[tuple]) -> float:
-    """Calculate total trajectory length in pixels"""
-    if len(positions) < 2:
-        return 0.0
-    
-    total_distance = 0.0
-    for i in range(1, len(positions)):
-        x1, y1 = positions[i-1][1]
-        x2, y2 = positions[i][1]
-        distance = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
-        total_distance += distance
-    
-    return round(total_distance, 2)
+# Live Streams
+live_streams = LiveStreamManager(load_detectors)
 
 
-def build_violation_record(
-    violation_id: str,
-    plate_info: Dict,
-    speed_kmh: float,
-    timestamp_seconds: float,
-    frame_number: int
-) -> Dict:
-    """Build a violation record in the new format"""
-    overspeed = round(speed_kmh - SPEED_LIMIT, 2)
-    severity = get_violation_severity(overspeed)
-    
-    return {
-        "violation_id": violation_id,
-        "plate_number": plate_info["plate_number"],
-        "plate_confidence": plate_info["confidence"],
-        "plate_validated": plate_info["validated"],
-        "speed_kmh": speed_kmh,
-        "speed_limit_kmh": SPEED_LIMIT,
-        "overspeed_kmh": overspeed,
-        "timestamp_seconds": round(timestamp_seconds, 2),
-        "frame_number": frame_number,
-        "severity": severity
-    }
+@app.on_event("shutdown")
+def stop_live_streams():
+    live_streams.stop_all()
+    job_queue.stop()
 
 
-def build_vehicle_record(
-    vehicle_id: str,
-    tracked_info: Dict,
-    ocr_result: Optional[OCRResult],
-    speed_kmh: float,
-    fps: float
-) -> Dict:
-    """Build a tracked vehicle record in the new format"""
-    
-    first_frame = tracked_info["first_frame"]
-    last_frame = tracked_info["last_frame"]
-    positions_with_frames = [
-        (first_frame + i, pos) 
-        for i, pos in enumerate(tracked_info["positions"])
-    ]
-    
-    trajectory_length = calculate_trajectory_length(positions_with_frames)
-    
-    # Build vehicle record
-    vehicle = {
-        "vehicle_id": vehicle_id,
-        "tracking_info": {
-            "first_frame": first_frame,
-            "last_frame": last_frame,
-            "frames_tracked": last_frame - first_frame + 1,
-            "trajectory_length_pixels": trajectory_length
-        },
-        "speed_info": {
-            "speed_kmh": speed_kmh,
-            "is_violation": speed_kmh > SPEED_LIMIT,
-            "calculation_valid": len(tracked_info["positions"]) >= MIN_TRACKED_FRAMES
-        }
-    }
+# Metrics owned by other components, refreshed on every scrape
+CACHE_LOOKUPS = Counter("ai_result_cache_lookups_total", "Result cache lookups", ("result",))
+CACHE_SIZE = Gauge("ai_result_cache_size_bytes", "Result cache size on disk")
+STREAM_QUEUE_DEPTH = Gauge("ai_live_stream_queue_depth", "Decoded frames waiting per live stream", ("stream",))
+STREAM_LAG = Gauge("ai_live_stream_lag_seconds", "End-to-end lag of the last processed frame", ("stream",))
+STREAM_DROPPED = Counter("ai_live_stream_frames_dropped_total", "Frames dropped to bound latency", ("stream",))
+QUEUE_DEPTH = Gauge("ai_job_queue_depth", "Videos waiting in the job queue")
+QUEUE_BACKLOG = Gauge("ai_job_queue_backlog_seconds", "Estimated seconds of queued and running work")
+FRAME_COST = Gauge("ai_job_seconds_per_frame", "Measured processing cost per video frame (EWMA)")
+
+
+def collect_component_metrics():
+    if result_cache is not None:
+        stats = result_cache.stats()
+        CACHE_LOOKUPS.set_total(stats["hits"], result="hit")
+        CACHE_LOOKUPS.set_total(stats["misses"], result="miss")
+        CACHE_SIZE.set(stats["size_bytes"])
     
-    # Add plate information
-    if ocr_result:
-        vehicle["plate_info"] = ocr_result.to_dict()
-        vehicle["plate_info"]["detection_frame"] = tracked_info.get("plate_detected_frame")
-    else:
-        vehicle["plate_info"] = {
-            "plate_number": None,
-            "raw_ocr_text": "",
-            "confidence": 0.0,
-            "validated": False,
-            "validation_errors": ["not_detected"]
-        }
+    queue_stats = job_queue.stats()
+    QUEUE_DEPTH.set(queue_stats["queued"])
+    QUEUE_BACKLOG.set(queue_stats["backlog_seconds"])
+    FRAME_COST.set(queue_stats["seconds_per_frame"])
     
-    # Add sampled trajectory
-    if INCLUDE_TRAJECTORY:
-        vehicle["positions"] = sample_trajectory(
-            positions_with_frames,
-            TRAJECTORY_SAMPLING
-        )
-    
-    return vehicle
+    STREAM_QUEUE_DEPTH.clear()
+    STREAM_LAG.clear()
+    for stream in live_streams.list():
+        metrics = stream.metrics()
+        STREAM_QUEUE_DEPTH.set(metrics["queue_depth"], stream=stream.stream_id)
+        STREAM_LAG.set(metrics["lag_seconds"]["last"], stream=stream.stream_id)
+        STREAM_DROPPED.set_total(metrics["frames_dropped"], stream=stream.stream_id)
+
+
+REGISTRY.add_collector(collect_component_metrics)
 
 
 # API Endpoints
@@ -178,245 +190,827 @@ def health_check():
     return {
         "status": "OK",
         "version": "1.5.0",
-        "config_valid": config_valid
+        "config_valid": config_valid,
+        "stub_detectors": STUB_DETECTORS,
+        "tuning": tuning.active.settings()
     }
 
 
 @app.get("/config")
-def get_configuration():
-    """Get current configuration"""
-    return get_config_dict()
+def get_configuration(camera_id: Optional[str] = None):
+    """Get the current analysis configuration (of a camera profile, if given)"""
+    try:
+        return runtime_config.get(camera_id).to_dict()
+    except ConfigError as e:
+        raise HTTPException(404, str(e))
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics: per-stage latency histograms, counters and gauges"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/queue/stats")
+def get_queue_stats():
+    """Job queue occupancy, backlog estimate and admission counters"""
+    return job_queue.stats()
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Get result cache hit/miss statistics"""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+
+def result_config_digest(config: RuntimeConfig) -> str:
+    """Digest of every setting that influences the analysis result"""
+    return hash_config(config.to_dict(), model_fingerprint)
+
+
+def resolve_request_config(camera_id: Optional[str], overrides: Optional[str]) -> RuntimeConfig:
+    """
+    Configuration of one request: camera profile plus JSON overrides
+    
+    Raises:
+        HTTPException: 400 if the overrides are not valid
+    """
+    values = {}
+    if overrides:
+        try:
+            values = json.loads(overrides)
+        except ValueError:
+            raise HTTPException(400, "Field 'config' must be a JSON object")
+        if not isinstance(values, dict):
+            raise HTTPException(400, "Field 'config' must be a JSON object")
+    
+    try:
+        return runtime_config.resolve(camera_id, values)
+    except ConfigError as e:
+        raise HTTPException(400, "; ".join(e.errors))
+
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+
+def resolve_stream_mode(request: Request, stream: Optional[str]) -> Optional[str]:
+    """Pick the streaming format from the query parameter or the Accept header"""
+    if stream is not None:
+        if stream not in STREAM_MEDIA_TYPES:
+            raise HTTPException(400, f"Invalid stream mode. Allowed: {tuple(STREAM_MEDIA_TYPES)}")
+        return stream
+    
+    accept = request.headers.get("Accept", "")
+    for mode, media_type in STREAM_MEDIA_TYPES.items():
+        if media_type in accept:
+            return mode
+    return None
+
+
+def format_event(event: Dict, mode: str) -> str:
+    """Serialize one pipeline event as an NDJSON line or an SSE message"""
+    data = json.dumps(event, default=str)
+    if mode == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def resolve_tracer(request: Request, metadata: Dict) -> Optional[tracing.Tracer]:
+    """
+    Create a tracer if the client asked for a trace (X-Trace: 1)
+
+    X-Trace-Sample overrides the frame sampling interval (1 = every frame).
+    """
+    if request.headers.get("X-Trace", "").lower() not in ("1", "true"):
+        return None
+    if not TRACE_ENABLED:
+        logger.warning("[%s] Trace requested but TRACE_ENABLED=false", metadata.get("correlation_id"))
+        return None
+    
+    sample_every = TRACE_SAMPLE_EVERY
+    sample_header = request.headers.get("X-Trace-Sample")
+    if sample_header is not None:
+        try:
+            sample_every = int(sample_header)
+        except ValueError:
+            raise HTTPException(400, "X-Trace-Sample must be an integer")
+        if sample_every < 1:
+            raise HTTPException(400, "X-Trace-Sample must be >= 1")
+    
+    return tracing.Tracer(sample_every, TRACE_MAX_EVENTS, metadata)
+
+
+def save_upload(upload_file, suffix: str) -> Tuple[str, int, str]:
+    """
+    Copy an upload to a temporary file
+    
+    Returns:
+        (path, size_bytes, sha256_hex)
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    file_size = 0
+    video_hash = hashlib.sha256()
+    with tmp:
+        while True:
+            chunk = upload_file.read(1024 ** 2)  # 1MB chunks
+            if not chunk:
+                break
+            tmp.write(chunk)
+            video_hash.update(chunk)
+            file_size += len(chunk)
+    return tmp.name, file_size, video_hash.hexdigest()
+
+
+def hash_file(path: str) -> Tuple[int, str]:
+    """
+    Hash a file in place (memory-mapped, nothing is copied)
+    
+    Returns:
+        (size_bytes, sha256_hex)
+    """
+    video_hash = hashlib.sha256()
+    file_size = os.path.getsize(path)
+    if file_size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            video_hash.update(mapped)
+    return file_size, video_hash.hexdigest()
+
+
+def resolve_video_reference(reference: str) -> Path:
+    """
+    Validate a video on the shared volume
+    
+    Accepts a path relative to SHARED_VIDEO_ROOT, an absolute path or a
+    file:// URI under it.
+    
+    Raises:
+        HTTPException: 403 if references are disabled or point outside the
+            root, 400 for other URI schemes, 404 if the file does not exist
+    """
+    if not SHARED_VIDEO_ROOT:
+        raise HTTPException(403, "Video references are disabled (SHARED_VIDEO_ROOT is not set)")
+    
+    parsed = urlparse(reference)
+    if parsed.scheme == "file":
+        if parsed.netloc not in ("", "localhost"):
+            raise HTTPException(400, f"Remote file URIs are not supported: {reference}")
+        reference = unquote(parsed.path)
+    elif parsed.scheme:
+        raise HTTPException(400, f"Unsupported video reference scheme: {parsed.scheme}")
+    
+    root = os.path.realpath(SHARED_VIDEO_ROOT)
+    path = os.path.realpath(os.path.join(root, reference))
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(403, f"Video references must be under {SHARED_VIDEO_ROOT}")
+    if not os.path.isfile(path):
+        raise HTTPException(404, f"Video not found: {reference}")
+    return Path(path)
+
+
+def cached_events(cached: Dict):
+    """Re-emit a cached result as the events a live run would have produced"""
+    violations = {
+        (v["plate_number"], v["frame_number"]): v
+        for v in cached["violations"]
+    }
+    for vehicle in cached["tracked_vehicles"]:
+        key = (vehicle["plate_info"]["plate_number"], vehicle["tracking_info"]["first_frame"])
+        yield vehicle_event(vehicle, violations.get(key))
+    
+    summary = {k: v for k, v in cached.items() if k not in ("violations", "tracked_vehicles")}
+    yield {"event": "summary", **summary}
+
+
+def cached_result_usable(cached: Dict, persist: bool, collect_evidence: bool) -> bool:
+    """Whether a cached result has the detections and evidence the request asks for, still on disk"""
+    if persist:
+        analysis_id = cached.get("analysis_id")
+        if analysis_id is None or not (Path(DETECTION_STORE_DIR) / analysis_id / META_FILE).is_file():
+            return False  # detections were not persisted for this result, or were pruned
+    if collect_evidence:
+        if "evidence_id" not in cached:
+            return False  # no evidence was written for this result
+        for violation in cached["violations"]:
+            evidence = violation.get("evidence", {})
+            urls = [evidence[key] for key in ("snapshot", "clip") if key in evidence] + evidence.get("frames", [])
+            for url in urls:
+                evidence_id, name = url.rsplit("/", 2)[-2:]
+                if evidence_path(EVIDENCE_DIR, evidence_id, name) is None:
+                    return False  # evidence was pruned
+    return True
 
 
 @app.post("/api/process-video")
-async def process_video(request: Request, video: UploadFile = File(...)):    
+async def process_video(
+    request: Request,
+    response: Response,
+    video: Optional[UploadFile] = File(None),
+    persist_detections: Optional[bool] = None,
+    stream: Optional[str] = None,
+    priority: Optional[str] = None,
+    camera_id: Optional[str] = None,
+    config: Optional[str] = Form(None),
+    video_path: Optional[str] = Form(None),
+    evidence: Optional[bool] = None
+):
     # Extract correlation ID from headers
     correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
     
     start_time = time.time()
     
-    logger.info(
-        "[%s] ▶ Received video: filename='%s' content_type='%s'",
-        correlation_id,
-        video.filename,
-        video.content_type
-    )
+    if (video is None) == (video_path is None):
+        raise HTTPException(400, "Send either a 'video' file or a 'video_path' on the shared volume")
+    
+    if video is not None:
+        filename = video.filename
+        logger.info(
+            "[%s] ▶ Received video: filename='%s' content_type='%s'",
+            correlation_id,
+            filename,
+            video.content_type
+        )
+    else:
+        shared_path = resolve_video_reference(video_path)
+        filename = shared_path.name
+        logger.info("[%s] ▶ Received video reference: '%s'", correlation_id, shared_path)
     
     # Validate video format
-    if not video.filename.endswith(ALLOWED_EXT):
+    if not filename.endswith(ALLOWED_EXT):
         logger.warning(
             "[%s] ❌ Invalid format: '%s' (allowed: %s)",
             correlation_id,
-            video.filename,
+            filename,
             ALLOWED_EXT
         )
         raise HTTPException(400, f"Invalid video format. Allowed: {ALLOWED_EXT}")
     
-    # Save uploaded video
-    suffix = Path(video.filename).suffix
-    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    stream_mode = resolve_stream_mode(request, stream)
     
-    file_size = 0
-    while True:
-        chunk = video.file.read(1024 ** 2)  # 1MB chunks
-        if not chunk:
-            break
-        tmp.write(chunk)
-        file_size += len(chunk)
+    priority = priority or request.headers.get("X-Priority", "normal")
+    if priority not in PRIORITIES:
+        raise HTTPException(400, f"Invalid priority. Allowed: {tuple(PRIORITIES)}")
+    
+    # Settings are resolved once, so a reload never changes a running analysis
+    analysis_config = resolve_request_config(camera_id, config)
+    
+    tracer = resolve_tracer(request, {
+        "correlation_id": correlation_id,
+        "filename": filename
+    })
+    request_start = time.perf_counter()
+    
+    # Save uploaded video (off the event loop, hashing a large upload takes a while);
+    # a shared file is only hashed and then decoded where it is
+    uploaded = video is not None
+    if uploaded:
+        suffix = Path(filename).suffix
+        with tracing.activate(tracer), tracing.span("upload", "request"):
+            video_file, file_size, video_digest = await run_in_threadpool(save_upload, video.file, suffix)
+        size_mb = round(file_size / 1024 / 1024, 2)
+        logger.info("[%s] 💾 Saved to '%s' (%.2f MB)", correlation_id, video_file, size_mb)
+    else:
+        video_file = str(shared_path)
+        with tracing.activate(tracer), tracing.span("hash", "request"):
+            file_size, video_digest = await run_in_threadpool(hash_file, video_file)
+        size_mb = round(file_size / 1024 / 1024, 2)
+        logger.info("[%s] 📂 Reading in place (%.2f MB)", correlation_id, size_mb)
     
-    tmp.close()
-    size_mb = round(file_size / 1024 / 1024, 2)
+    persist = DETECTION_STORE_ENABLED if persist_detections is None else persist_detections
+    collect_evidence = EVIDENCE_ENABLED if evidence is None else evidence
     
-    logger.info("[%s] 💾 Saved to '%s' (%.2f MB)", correlation_id, tmp.name, size_mb)
+    # Return cached result for identical submissions (traced requests
+    # always run the pipeline, and their results are not cached)
+    cache_key = None
+    headers = {}
+    if tracer is not None:
+        headers["X-Trace-ID"] = tracer.trace_id
+        logger.info("[%s] 🧵 Tracing enabled: trace_id=%s sample_every=%d", correlation_id, tracer.trace_id, tracer.sample_every)
+    elif result_cache is not None:
+        cache_key = make_cache_key(video_digest, result_config_digest(analysis_config))
+        cached = result_cache.get(
+            cache_key,
+            lambda result: cached_result_usable(result, persist, collect_evidence)
+        )
+        if cached is not None:
+            if uploaded:
+                Path(video_file).unlink()
+            cached["processing_time_seconds"] = round(time.time() - start_time, 2)
+            cached["queue_wait_seconds"] = 0.0
+            cached["video_info"]["filename"] = filename
+            logger.info(
+                "[%s] ⚡ Cache hit: key=%s violations=%d",
+                correlation_id,
+                cache_key[:12],
+                cached["summary"]["violations_detected"]
+            )
+            VIDEOS_PROCESSED.inc(outcome="cache_hit")
+            REQUEST_SECONDS.observe(time.time() - start_time, endpoint="process-video")
+            if stream_mode:
+                return StreamingResponse(
+                    (format_event(event, stream_mode) for event in cached_events(cached)),
+                    media_type=STREAM_MEDIA_TYPES[stream_mode],
+                    headers={"X-Cache": "HIT"}
+                )
+            response.headers["X-Cache"] = "HIT"
+            return cached
+        headers["X-Cache"] = "MISS"
+        response.headers["X-Cache"] = "MISS"
     
-    # Open video
-    cap = cv2.VideoCapture(tmp.name)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps if fps > 0 else 0
+    # Read the video properties; the job opens the video again when it starts
+    with tracing.activate(tracer), tracing.span("open_video", "request"):
+        cap, fps, total_frames, duration = open_video(video_file)
+        cap.release()
     
     logger.info(
         "[%s] 📹 Video info: fps=%.1f total_frames=%d duration=%.1fs",
         correlation_id, fps, total_frames, duration
     )
     
-    # Processing state
-    frame_id = 0
-    processed_frames = 0
-    tracked = {}  # vehicle_id -> tracking info
-    ocr_results = {}  # vehicle_id -> OCRResult
+    def cleanup():
+        if uploaded:
+            Path(video_file).unlink(missing_ok=True)
     
-    # Process frames
-    logger.info("[%s] 🔄 Starting frame processing...", correlation_id)
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    def run_pipeline(job: Job, on_event) -> Optional[Tuple[VideoPipeline, Optional[DetectionStoreWriter], Optional[ScanResult]]]:
+        """Process every frame on a job worker; None if the client went away"""
+        logger.info(
+            "[%s] 🔄 Starting frame processing (queued %.1fs)...",
+            correlation_id, job.wait_seconds
+        )
+        ACTIVE_JOBS.inc()
+        recorder = None
         
-        frame_id += 1
+        def consume(frames) -> bool:
+            events = pipeline.run(frames)
+            try:
+                for event in events:
+                    if job.cancelled.is_set():
+                        logger.warning("[%s] ⏹ Client disconnected, processing stopped", correlation_id)
+                        return False
+                    on_event(event)
+            finally:
+                events.close()  # drop frame references before the decoder shuts down
+            return True
         
-        # Frame skipping
-        if FRAME_SKIP > 0 and frame_id % (FRAME_SKIP + 1) != 0:
-            continue
+        try:
+            # Only the time ranges with activity are processed, if enabled
+            with tracing.activate(tracer), tracing.span("prescan", "request"):
+                scan = plan_frames(video_file, fps, total_frames, analysis_config, correlation_id)
+            ranges = scan.ranges if scan is not None else None
+            
+            store_writer = None
+            if persist:
+                store_writer = DetectionStoreWriter(DETECTION_STORE_DIR, {
+                    "filename": filename,
+                    "video_sha256": video_digest,
+                    "fps": fps,
+                    "total_frames": total_frames,
+                    "duration_seconds": round(duration, 2),
+                    "configuration": analysis_config.to_dict(),
+                    "active_ranges": ranges
+                })
+            
+            # Snapshots and clips are written while the upload still exists
+            if collect_evidence:
+                recorder = EvidenceRecorder(EVIDENCE_DIR, fps, video_file, correlation_id=correlation_id)
+            
+            pipeline = VideoPipeline(
+                vehicle_detector,
+                plate_detector,
+                fps,
+                total_frames,
+                store_writer=store_writer,
+                correlation_id=correlation_id,
+                tracer=tracer,
+                config=analysis_config,
+                evidence=recorder
+            )
+            
+            if DECODE_IN_PROCESS:
+                # Frames arrive through shared memory, decoding overlaps inference
+                with ProcessDecoder(video_file, DECODE_RING_SLOTS, analysis_config.frame_skip, ranges) as decoder:
+                    completed = consume(decoder.frames())
+            else:
+                cap, _, _, _ = open_video(video_file)
+                try:
+                    completed = consume(read_frames(cap, analysis_config.frame_skip, ranges))
+                finally:
+                    cap.release()
+        except Exception:
+            VIDEOS_PROCESSED.inc(outcome="error")
+            raise
+        finally:
+            ACTIVE_JOBS.dec()
+            if recorder is not None:
+                recorder.close()
+            cleanup()
         
-        processed_frames += 1
+        if not completed:
+            return None
+        
+        logger.info("[%s] ✅ Frame processing complete", correlation_id)
+        return pipeline, store_writer, scan
+    
+    def finish(
+        job: Job,
+        pipeline: VideoPipeline,
+        store_writer: Optional[DetectionStoreWriter],
+        scan: Optional[ScanResult]
+    ) -> Tuple[Dict, Dict]:
+        """Response fields before and after the record arrays, once every frame is processed"""
+        analysis_id = store_writer.close() if store_writer is not None else None
+        summary = pipeline.finalizer.summary()
+        processing_time = time.time() - start_time
+        
+        VIDEOS_PROCESSED.inc(outcome="success")
+        REQUEST_SECONDS.observe(processing_time, endpoint="process-video")
+        
+        logger.info(
+            "[%s] 📤 Results: vehicles=%d plates=%d violations=%d time=%.1fs",
+            correlation_id,
+            summary["total_vehicles_tracked"],
+            summary["vehicles_with_plates"],
+            summary["violations_detected"],
+            processing_time
+        )
         
-        # Detect vehicles
-        rects = vehicle_detector.detect(frame)
+        head, tail = build_response_parts(
+            filename,
+            fps,
+            total_frames,
+            duration,
+            pipeline.processed_frames,
+            summary,
+            analysis_config.to_dict(),
+            processing_time,
+            job.wait_seconds,
+            scan.video_info() if scan is not None else None
+        )
         
-        # Update tracker
-        vehicles = tracker.update(rects)
+        if analysis_id is not None:
+            tail["analysis_id"] = analysis_id
+            logger.info("[%s] 🗄 Detections persisted: analysis_id=%s", correlation_id, analysis_id)
+            prune_analyses(DETECTION_STORE_DIR, DETECTION_STORE_MAX_ANALYSES)
         
-        if processed_frames % 100 == 0:
-            logger.debug(
-                "[%s] Frame %d/%d → detected=%d tracked=%d",
-                correlation_id, frame_id, total_frames, len(rects), len(vehicles)
+        if pipeline.evidence is not None:
+            tail["evidence_id"] = pipeline.evidence.evidence_id
+            logger.info(
+                "[%s] 📸 Evidence: %d snapshots, %d clips (evidence_id=%s)",
+                correlation_id,
+                pipeline.evidence.snapshots_written,
+                pipeline.evidence.clips_written,
+                pipeline.evidence.evidence_id
             )
         
-        # Update tracked vehicles
-        for vehicle_id, bbox in vehicles.items():
-            x1, y1, x2, y2 = bbox
-            cX, cY = (x1 + x2) // 2, (y1 + y2) // 2
-            
-            # Initialize tracking info
-            if vehicle_id not in tracked:
-                tracked[vehicle_id] = {
-                    "first_frame": frame_id,
-                    "last_frame": frame_id,
-                    "positions": [(cX, cY)],
-                    "plate_detected_frame": None
-                }
-            else:
-                tracked[vehicle_id]["last_frame"] = frame_id
-                tracked[vehicle_id]["positions"].append((cX, cY))
-            
-            # Try OCR if not yet done
-            if vehicle_id not in ocr_results:
-                v_crop = safe_crop(frame, bbox)
-                if v_crop is None:
-                    continue
-                
-                p_box = plate_detector.detect(v_crop)
-                if p_box:
-                    p_crop = safe_crop(v_crop, p_box)
-                    if p_crop is not None:
-                        # Use multi-pass OCR if enabled
-                        if OCR_MULTI_PASS:
-                            ocr_result = multi_pass_ocr(p_crop, OCR_MAX_ATTEMPTS)
-                        else:
-                            ocr_result = read_plate_enhanced(p_crop, OCR_CONFIDENCE)
-                        
-                        ocr_results[vehicle_id] = ocr_result
-                        tracked[vehicle_id]["plate_detected_frame"] = frame_id
-                        
-                        if ocr_result.plate_number:
-                            logger.debug(
-                                "[%s] 🔍 Vehicle %s → Plate '%s' (conf=%.2f, valid=%s)",
-                                correlation_id,
-                                vehicle_id,
-                                ocr_result.plate_number,
-                                ocr_result.confidence,
-                                ocr_result.validated
-                            )
-    
-    cap.release()
-    Path(tmp.name).unlink()
-    
-    logger.info("[%s] ✅ Frame processing complete", correlation_id)
-    
-    # Build Response
-    violations = []
-    tracked_vehicles = []
-    violation_counter = 1
-    total_speeds = []
-    
-    for vehicle_id, info in tracked.items():
-        ocr_result = ocr_results.get(vehicle_id)
+        if tracer is not None:
+            tail["trace_id"] = tracer.trace_id
         
-        # Calculate speed
-        positions_count = len(info["positions"])
-        if positions_count >= MIN_TRACKED_FRAMES:
-            speed_kmh = calculate_speed(
-                info["first_frame"],
-                info["last_frame"],
-                info["positions"],
-                fps
+        return head, tail
+    
+    def save_trace():
+        tracer.add_span("process-video", "request", request_start, time.perf_counter() - request_start)
+        path = tracer.write(TRACE_DIR)
+        tracing.prune_traces(TRACE_DIR, TRACE_MAX_FILES)
+        logger.info(
+            "[%s] 🧵 Trace saved: %s (%d events, %d sampled frames, %d dropped)",
+            correlation_id, path, len(tracer.events), tracer.sampled_frames, tracer.dropped_events
+        )
+    
+    def submit(fn) -> Job:
+        """Admit the video to the job queue, or reject it with 429"""
+        try:
+            job = job_queue.submit(fn, max(total_frames, 1), priority)
+        except QueueFull as e:
+            cleanup()
+            logger.warning("[%s] ⛔ Rejected: %s (retry after %ds)", correlation_id, e, e.retry_after)
+            raise HTTPException(
+                429,
+                detail={"message": str(e), "retry_after_seconds": e.retry_after},
+                headers={"Retry-After": str(e.retry_after)}
             )
-            total_speeds.append(speed_kmh)
-        else:
-            speed_kmh = 0.0
         
-        # Build vehicle record
-        vehicle_record = build_vehicle_record(
-            f"veh_{vehicle_id:03d}",
-            info,
-            ocr_result,
-            speed_kmh,
-            fps
+        def cleanup_if_dropped(future):
+            # A job cancelled before it started never reaches run_pipeline's cleanup
+            if future.cancelled():
+                cleanup()
+        
+        job.future.add_done_callback(cleanup_if_dropped)
+        
+        logger.info(
+            "[%s] 📥 Queued job %s: priority=%s estimated=%.1fs wait≈%.1fs",
+            correlation_id, job.id, priority, job.estimated_seconds, job.estimated_wait_seconds
         )
+        return job
+    
+    if stream_mode:
+        events = queue.Queue()
         
-        tracked_vehicles.append(vehicle_record)
+        def process_to_stream(job: Job):
+            processed = run_pipeline(job, events.put)
+            if processed is None:
+                return
+            with tracing.activate(tracer), stage_timer("response_build"):
+                head, tail = finish(job, *processed)
+                summary_event = {"event": "summary", **head, **tail}
+            if tracer is not None:
+                save_trace()
+            events.put(summary_event)
         
-        # Check for violation
-        if (ocr_result and 
-            ocr_result.plate_number and 
-            positions_count >= MIN_TRACKED_FRAMES and
-            speed_kmh > SPEED_LIMIT):
-            
-            violation = build_violation_record(
-                f"v_{violation_counter:03d}",
-                vehicle_record["plate_info"],
-                speed_kmh,
-                info["first_frame"] / fps,
-                info["first_frame"]
-            )
+        job = submit(process_to_stream)
+        
+        def event_stream():
+            completed = False
+            try:
+                yield format_event({
+                    "event": "queued",
+                    "job_id": job.id,
+                    "position": job_queue.position(job),
+                    "estimated_wait_seconds": round(job.estimated_wait_seconds, 1)
+                }, stream_mode)
+                
+                while True:
+                    try:
+                        event = events.get(timeout=1.0)
+                    except queue.Empty:
+                        if job.future.done():
+                            job.future.result()  # re-raise a processing error
+                            break
+                        continue
+                    yield format_event(event, stream_mode)
+                    if event["event"] == "summary":
+                        completed = True
+                        break
+            finally:
+                if not completed:
+                    job.cancel()
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type=STREAM_MEDIA_TYPES[stream_mode],
+            headers=headers
+        )
+    
+    def process_to_file(job: Job) -> Optional[str]:
+        # Finalized records are spilled to disk instead of being held in memory
+        writer = ResultWriter()
+        
+        def collect(event):
+            if event["event"] == "vehicle":
+                writer.add(event["vehicle"], event["violation"])
+        
+        try:
+            processed = run_pipeline(job, collect)
+            if processed is None:
+                return None  # cancelled; run_pipeline already removed the upload
             
-            violations.append(violation)
-            violation_counter += 1
+            # Build final response
+            with tracing.activate(tracer), stage_timer("response_build"):
+                head, tail = finish(job, *processed)
+                
+                response_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+                response_file.close()
+                writer.write_json(response_file.name, head, tail)
+        finally:
+            writer.close()
+        
+        if cache_key is not None:
+            result_cache.put_file(cache_key, response_file.name)
+        
+        if tracer is not None:
+            save_trace()
+        
+        if job.cancelled.is_set():
+            Path(response_file.name).unlink(missing_ok=True)  # the client is gone
+            return None
+        return response_file.name
+    
+    job = submit(process_to_file)
+    try:
+        response_path = await asyncio.wrap_future(job.future)
+    except asyncio.CancelledError:
+        # Client went away: drop the job, or stop it if it is already running
+        job.cancel()
+        raise
+    if response_path is None:
+        raise HTTPException(503, "Processing was cancelled")
     
-    # Calculate statistics
-    vehicles_with_plates = sum(
-        1 for v in tracked_vehicles 
-        if v["plate_info"]["plate_number"] is not None
+    return FileResponse(
+        response_path,
+        media_type="application/json",
+        headers=headers,
+        background=BackgroundTask(Path(response_path).unlink, missing_ok=True)
     )
+
+
+@app.post("/api/reanalyze/{analysis_id}")
+def reanalyze_video(analysis_id: str, request: Request, overrides: Dict = Body(default={})):
+    """
+    Replay tracking, speed and violation logic on persisted detections
+    
+    Body: any of speed_limit_kmh, pixel_to_meter, ground_calibration,
+    max_distance, max_disappeared, min_tracked_frames, include_trajectory,
+    trajectory_sampling
+    """
+    correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
+    start_time = time.time()
     
-    avg_speed = round(sum(total_speeds) / len(total_speeds), 2) if total_speeds else 0.0
+    errors = validate_replay_parameters(overrides)
+    if errors:
+        raise HTTPException(400, "; ".join(errors))
     
+    try:
+        store = DetectionStore(DETECTION_STORE_DIR, analysis_id)
+    except FileNotFoundError:
+        raise HTTPException(404, f"Analysis not found: {analysis_id}")
+    
+    logger.info(
+        "[%s] 🔁 Re-analyzing %s (%d frames) with %s",
+        correlation_id, analysis_id, len(store), overrides
+    )
+    
+    with stage_timer("replay"):
+        replay = replay_detections(store, overrides, runtime_config.get())
     processing_time = time.time() - start_time
+    REQUEST_SECONDS.observe(processing_time, endpoint="reanalyze")
     
     logger.info(
-        "[%s] 📤 Results: vehicles=%d plates=%d violations=%d time=%.1fs",
+        "[%s] 📤 Re-analysis: vehicles=%d violations=%d time=%.2fs",
         correlation_id,
-        len(tracked_vehicles),
-        vehicles_with_plates,
-        len(violations),
+        replay["summary"]["total_vehicles_tracked"],
+        replay["summary"]["violations_detected"],
         processing_time
     )
     
-    # Build final response
-    response = {
+    return {
         "status": "success",
         "processing_time_seconds": round(processing_time, 2),
-        "video_info": {
-            "filename": video.filename,
-            "duration_seconds": round(duration, 2),
-            "fps": round(fps, 1),
-            "total_frames": total_frames,
-            "processed_frames": processed_frames
-        },
-        "summary": {
-            "total_vehicles_tracked": len(tracked_vehicles),
-            "vehicles_with_plates": vehicles_with_plates,
-            "violations_detected": len(violations),
-            "average_speed_kmh": avg_speed
-        },
-        "violations": violations,
-        "tracked_vehicles": tracked_vehicles,
-        "configuration": get_config_dict()
+        "analysis_id": analysis_id,
+        **replay
     }
+
+
+@app.get("/api/traces/{trace_id}")
+def get_trace(trace_id: str):
+    """Chrome trace-event JSON of a traced request (open in ui.perfetto.dev)"""
+    path = tracing.trace_path(TRACE_DIR, trace_id)
+    if path is None:
+        raise HTTPException(404, f"Trace not found: {trace_id}")
+    return FileResponse(path, media_type="application/json", filename=f"trace-{trace_id}.json")
+
+
+@app.get("/api/evidence/{evidence_id}/{name}")
+def get_evidence(evidence_id: str, name: str):
+    """Snapshot or clip of a violation, as referenced by its evidence field"""
+    path = evidence_path(EVIDENCE_DIR, evidence_id, name)
+    if path is None:
+        raise HTTPException(404, f"Evidence not found: {evidence_id}/{name}")
+    return FileResponse(path, filename=name)
+
+
+@app.post("/api/streams")
+def start_live_stream(request: Request, payload: Dict = Body(...)):
+    """
+    Start continuous processing of a live source (admin token required)
     
-    return response
+    Body: {"source": "rtsp://camera/stream" | "/streams/cam1.ts", "stream_id": optional,
+           "camera_id": optional profile, "config": optional overrides}
+    """
+    require_admin(request)
+    
+    source = payload.get("source")
+    if not source or not isinstance(source, str):
+        raise HTTPException(400, "Field 'source' is required")
+    
+    overrides = payload.get("config") or {}
+    if not isinstance(overrides, dict):
+        raise HTTPException(400, "Field 'config' must be an object")
+    
+    camera_id = payload.get("camera_id")
+    try:
+        stream_config = runtime_config.resolve(camera_id, overrides)
+    except ConfigError as e:
+        raise HTTPException(400, "; ".join(e.errors))
+    
+    try:
+        stream = live_streams.start(source, payload.get("stream_id"), stream_config, camera_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    return stream.metrics()
+
+
+@app.get("/api/streams")
+def list_live_streams():
+    """List live streams with their lag and throughput metrics"""
+    return {"streams": [stream.metrics() for stream in live_streams.list()]}
+
+
+@app.get("/api/streams/{stream_id}")
+def get_live_stream(stream_id: str):
+    """Metrics and recent violations of one live stream"""
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        raise HTTPException(404, f"Stream not found: {stream_id}")
+    return {**stream.metrics(), "recent_violations": list(stream.recent_events)}
+
+
+@app.get("/api/streams/{stream_id}/events")
+def live_stream_events(stream_id: str):
+    """Server-Sent Events feed of violations detected on a live stream"""
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        raise HTTPException(404, f"Stream not found: {stream_id}")
+    
+    subscriber = stream.subscribe()
+    
+    def event_stream():
+        try:
+            while stream.running:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event, "sse")
+        finally:
+            stream.unsubscribe(subscriber)
+    
+    return StreamingResponse(event_stream(), media_type=STREAM_MEDIA_TYPES["sse"])
+
+
+@app.delete("/api/streams/{stream_id}")
+def stop_live_stream(request: Request, stream_id: str):
+    """Stop a live stream (admin token required)"""
+    require_admin(request)
+    stream = live_streams.stop(stream_id)
+    if stream is None:
+        raise HTTPException(404, f"Stream not found: {stream_id}")
+    return stream.metrics()
+
+
+def require_admin(request: Request):
+    """Check the X-Admin-Token header (admin endpoints are off without ADMIN_TOKEN)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, "Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(401, "Invalid admin token")
+
+
+@app.get("/admin/config")
+def get_runtime_config(request: Request):
+    """Runtime configuration: effective defaults, camera profiles and overrides"""
+    require_admin(request)
+    return runtime_config.snapshot()
+
+
+@app.post("/admin/config/reload")
+def reload_runtime_config(request: Request):
+    """Re-read RUNTIME_CONFIG_FILE (the models stay loaded)"""
+    require_admin(request)
+    try:
+        runtime_config.load()
+    except ConfigError as e:
+        logger.error("Runtime configuration reload failed: %s", e)
+        raise HTTPException(400, "; ".join(e.errors))
+    
+    snapshot = runtime_config.snapshot()
+    logger.info(
+        "🔧 Runtime configuration reloaded: version=%d cameras=%d",
+        snapshot["version"], len(snapshot["cameras"])
+    )
+    return snapshot
+
+
+@app.patch("/admin/config")
+def update_runtime_config(request: Request, camera_id: Optional[str] = None, values: Dict = Body(...)):
+    """
+    Change default (or camera profile) settings; null resets a value
+    
+    Body: any RuntimeConfig setting, e.g. {"speed_limit_kmh": 60, "frame_skip": null}
+    """
+    require_admin(request)
+    try:
+        runtime_config.update(values, camera_id)
+    except ConfigError as e:
+        raise HTTPException(400, "; ".join(e.errors))
+    
+    logger.info("🔧 Runtime configuration updated (%s): %s", camera_id or "defaults", values)
+    return runtime_config.snapshot()
+
+
+@app.delete("/admin/config/cameras/{camera_id}")
+def delete_camera_profile(request: Request, camera_id: str):
+    """Remove a camera profile"""
+    require_admin(request)
+    if not runtime_config.remove_camera(camera_id):
+        raise HTTPException(404, f"Unknown camera: {camera_id}")
+    logger.info("🔧 Camera profile removed: %s", camera_id)
+    return runtime_config.snapshot()
 
 
 @app.get("/")
@@ -429,7 +1023,15 @@ def root():
         "endpoints": {
             "health": "/health",
             "config": "/config",
+            "metrics": "/metrics",
+            "cache_stats": "/cache/stats",
+            "queue_stats": "/queue/stats",
             "process": "/api/process-video",
+            "reanalyze": "/api/reanalyze/{analysis_id}",
+            "traces": "/api/traces/{trace_id}",
+            "evidence": "/api/evidence/{evidence_id}/{name}",
+            "streams": "/api/streams",
+            "admin_config": "/admin/config",
             "docs": "/docs"
         }
     }
\ No newline at end of file
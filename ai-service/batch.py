@@ -0,0 +1,430 @@
+"""
+Offline batch processing of video files
+
+Runs the /api/process-video pipeline without the HTTP layer over
+directories, globs or single files, with a pool of worker processes that
+each load the models once. Every video produces one JSON line in the
+output file, in the same schema as the API response plus a "source"
+object identifying the input:
+
+    {"status": "success", "processing_time_seconds": ..., "queue_wait_seconds": ...,
+     "video_info": {...},
+     "summary": {...}, "violations": [...], "tracked_vehicles": [...],
+     "configuration": {...}, "source": {"path": ..., "size_bytes": ...,
+     "modified_ns": ..., "config_digest": ...}}
+
+Failures are recorded as {"status": "error", "error": ..., "source": {...}}.
+
+Records are appended and synced one by one, so the output file is the
+checkpoint: a rerun skips every video with a record for the same path,
+size, modification time and configuration, and a partially written last
+line from a crash is discarded. Failed videos are retried with
+--retry-failed.
+
+Usage (from the ai-service directory):
+    python batch.py /data/archive --output results.jsonl --workers 4
+    python batch.py "/data/archive/**/*.mp4" --output results.jsonl --camera-id cam-1
+    python batch.py /data/archive --recursive --output results.jsonl --config '{"speed_limit_kmh": 70}'
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+from typing import Dict, List, Optional, Set, Tuple
+
+from ocr.ocr_reader import get_ocr_engine, set_ocr_engine
+from pipeline.evidence import EvidenceRecorder
+from pipeline.frame_ring import mp_context
+from pipeline.prescan import plan_frames
+from pipeline.processor import VideoPipeline, open_video, read_frames
+from pipeline.records import build_response_parts
+from pipeline.result_writer import ResultWriter
+from utils.config import (
+    ALLOWED_EXT,
+    DETECTION_STORE_DIR,
+    EVIDENCE_DIR,
+    EVIDENCE_ENABLED,
+    RUNTIME_CONFIG_FILE,
+    STUB_DETECTORS,
+    STUB_INFERENCE_MS,
+    TUNING_PROFILE_FILE,
+    validate_configuration
+)
+from utils.detection_store import DetectionStoreWriter
+from utils.result_cache import fingerprint_models, hash_config
+from utils.runtime_config import ConfigError, RuntimeConfig, RuntimeConfigStore
+from utils import tuning
+
+logger = logging.getLogger("ai-service")
+
+# Detectors of this worker process, loaded once by init_worker
+_detectors = None
+
+
+# Inputs
+
+def find_videos(inputs: List[str], recursive: bool) -> List[str]:
+    """Absolute paths of the supported videos in directories, globs and files"""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                candidates = (
+                    os.path.join(root, name)
+                    for root, _, names in os.walk(item)
+                    for name in names
+                )
+            else:
+                candidates = (os.path.join(item, name) for name in os.listdir(item))
+        elif glob.has_magic(item):
+            candidates = glob.glob(item, recursive=True)
+        else:
+            candidates = [item]
+
+        for path in candidates:
+            if path.lower().endswith(ALLOWED_EXT) and os.path.isfile(path):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def source_info(path: str, config_digest: str) -> Dict:
+    stat = os.stat(path)
+    return {
+        "path": path,
+        "size_bytes": stat.st_size,
+        "modified_ns": stat.st_mtime_ns,
+        "config_digest": config_digest
+    }
+
+
+def source_key(source: Dict) -> Tuple:
+    return source["path"], source["size_bytes"], source["modified_ns"], source["config_digest"]
+
+
+# Checkpoint
+
+def load_done(output: str, retry_failed: bool) -> Set[Tuple]:
+    """
+    Source keys of the videos already in the output file
+
+    A last line without a newline is the remainder of an interrupted write
+    and is cut off, so appending continues on a clean line.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+
+    with open(output, "rb+") as f:
+        valid_end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_end += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            source = record.get("source")
+            if not source:
+                continue
+            if record.get("status") == "error" and retry_failed:
+                continue
+            done.add(source_key(source))
+
+        if f.tell() != valid_end:
+            logger.warning("Discarding an incomplete record at the end of %s", output)
+            f.truncate(valid_end)
+    return done
+
+
+def append_record(output, part_path: str):
+    """Append one single-line JSON document and make it durable"""
+    with open(part_path, "r", encoding="utf-8") as part:
+        shutil.copyfileobj(part, output)
+    output.write("\n")
+    output.flush()
+    os.fsync(output.fileno())
+
+
+# Worker
+
+def init_worker(profile: tuning.TuningProfile, log_level: int):
+    """Load the models once per worker process"""
+    global _detectors
+
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s | %(levelname)-8s | %(name)-15s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    logger.setLevel(log_level)
+
+    # Before the models and the OCR engine are created
+    tuning.apply_profile(profile)
+
+    if STUB_DETECTORS:
+        from detectors.stub_detectors import StubVehicleDetector, StubPlateDetector, StubOCREngine
+
+        _detectors = StubVehicleDetector(STUB_INFERENCE_MS), StubPlateDetector(STUB_INFERENCE_MS)
+        set_ocr_engine(StubOCREngine(STUB_INFERENCE_MS))
+    else:
+        from detectors.vehicle_detector import VehicleDetector
+        from detectors.plate_detector import PlateDetector
+
+        _detectors = VehicleDetector(), PlateDetector()
+        get_ocr_engine()
+
+    logger.info("Worker %d ready (%s)", os.getpid(), profile.settings())
+
+
+def process_file(
+    path: str,
+    source: Dict,
+    config: RuntimeConfig,
+    part_dir: str,
+    persist: bool,
+    submitted: float
+) -> Tuple[str, str]:
+    """
+    Run the pipeline on one video and write its record to a part file
+
+    The record stays on disk, only a short status line is sent back to the
+    parent process. submitted is the time.time() at which the video was
+    handed to the pool; the wait for a free worker is the queue wait.
+
+    Returns:
+        (path of the part file holding one line of JSON, status line)
+    """
+    vehicle_detector, plate_detector = _detectors
+    correlation_id = f"batch-{uuid.uuid4().hex[:8]}"
+    filename = os.path.basename(path)
+    part = tempfile.NamedTemporaryFile(mode="w", suffix=".json", dir=part_dir, delete=False, encoding="utf-8")
+    part.close()
+
+    start_time = time.time()
+    try:
+        cap, fps, total_frames, duration = open_video(path)
+        if not cap.isOpened() or fps <= 0:
+            cap.release()
+            raise ValueError("Cannot open video")
+
+        scan = plan_frames(path, fps, total_frames, config, correlation_id)
+        ranges = scan.ranges if scan is not None else None
+
+        store_writer = None
+        if persist:
+            store_writer = DetectionStoreWriter(DETECTION_STORE_DIR, {
+                "filename": filename,
+                "fps": fps,
+                "total_frames": total_frames,
+                "duration_seconds": round(duration, 2),
+                "configuration": config.to_dict(),
+                "active_ranges": ranges
+            })
+
+        recorder = None
+        if EVIDENCE_ENABLED:
+            recorder = EvidenceRecorder(EVIDENCE_DIR, fps, path, correlation_id=correlation_id)
+
+        pipeline = VideoPipeline(
+            vehicle_detector,
+            plate_detector,
+            fps,
+            total_frames,
+            store_writer=store_writer,
+            correlation_id=correlation_id,
+            config=config,
+            evidence=recorder
+        )
+
+        writer = ResultWriter(part_dir)
+        try:
+            for event in pipeline.run(read_frames(cap, config.frame_skip, ranges)):
+                if event["event"] == "vehicle":
+                    writer.add(event["vehicle"], event["violation"])
+
+            head, tail = build_response_parts(
+                filename,
+                fps,
+                total_frames,
+                duration,
+                pipeline.processed_frames,
+                pipeline.finalizer.summary(),
+                config.to_dict(),
+                time.time() - start_time,
+                start_time - submitted,
+                scan.video_info() if scan is not None else None
+            )
+            if store_writer is not None:
+                tail["analysis_id"] = store_writer.close()
+            if recorder is not None:
+                tail["evidence_id"] = recorder.evidence_id
+            tail["source"] = source
+
+            writer.write_json(part.name, head, tail)
+        finally:
+            writer.close()
+            if recorder is not None:
+                recorder.close()
+            cap.release()
+
+        summary = head["summary"]
+        status = (
+            f"ok: {summary['total_vehicles_tracked']} vehicles, "
+            f"{summary['violations_detected']} violations in {head['processing_time_seconds']}s"
+        )
+    except Exception as e:
+        logger.exception("[%s] Processing of %s failed", correlation_id, path)
+        with open(part.name, "w", encoding="utf-8") as f:
+            json.dump({
+                "status": "error",
+                "error": f"{type(e).__name__}: {e}",
+                "processing_time_seconds": round(time.time() - start_time, 2),
+                "video_info": {"filename": filename},
+                "source": source
+            }, f)
+        status = f"error: {type(e).__name__}: {e}"
+
+    return part.name, status
+
+
+# Runner
+
+def resolve_config(args) -> RuntimeConfig:
+    store = RuntimeConfigStore(RuntimeConfig(), RUNTIME_CONFIG_FILE or None)
+    overrides = json.loads(args.config) if args.config else {}
+    if not isinstance(overrides, dict):
+        raise ConfigError(["--config must be a JSON object"])
+    store.load()
+    return store.resolve(args.camera_id, overrides)
+
+
+def worker_profile(profile: tuning.TuningProfile, workers: int, threads: Optional[int]) -> tuning.TuningProfile:
+    """
+    Thread counts of each worker
+
+    The host profile is tuned for one process using every core: with
+    several workers no pool may exceed a worker's share of the CPUs. An
+    explicit --threads replaces all three counts.
+    """
+    if threads:
+        return replace(profile, torch_threads=threads, opencv_threads=threads, paddle_threads=threads)
+
+    share = max(1, tuning.usable_cpus() // workers)
+    return replace(
+        profile,
+        torch_threads=min(profile.torch_threads or share, share),
+        opencv_threads=min(profile.opencv_threads or share, share),
+        paddle_threads=min(profile.paddle_threads or share, share)
+    )
+
+
+def run(args) -> int:
+    config_valid, config_errors = validate_configuration()
+    if not config_valid:
+        for error in config_errors:
+            logger.error("  - %s", error)
+        return 2
+
+    try:
+        config = resolve_config(args)
+    except (ConfigError, ValueError) as e:
+        logger.error("Invalid configuration: %s", e)
+        return 2
+    config_digest = hash_config(config.to_dict(), fingerprint_models())
+
+    try:
+        profile = tuning.load_profile(TUNING_PROFILE_FILE) or tuning.TuningProfile()
+    except ValueError as e:
+        logger.error("%s", e)
+        return 2
+
+    videos = find_videos(args.inputs, args.recursive)
+    done = load_done(args.output, args.retry_failed)
+
+    pending = []
+    for path in videos:
+        source = source_info(path, config_digest)
+        if source_key(source) not in done:
+            pending.append((path, source))
+
+    print(f"{len(videos)} videos found, {len(videos) - len(pending)} already done, {len(pending)} to process")
+    if not pending:
+        return 0
+
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(output_dir, exist_ok=True)
+    part_dir = tempfile.mkdtemp(prefix=".batch-", dir=output_dir)
+    log_level = logging.INFO if args.verbose else logging.WARNING
+
+    failed = 0
+    start = time.time()
+    executor = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=mp_context,
+        initializer=init_worker,
+        initargs=(worker_profile(profile, args.workers, args.threads), log_level)
+    )
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            futures = {
+                executor.submit(process_file, path, source, config, part_dir, args.persist_detections, time.time()): path
+                for path, source in pending
+            }
+            for index, future in enumerate(as_completed(futures), start=1):
+                part_path, status = future.result()
+                append_record(output, part_path)
+                os.unlink(part_path)
+                if status.startswith("error"):
+                    failed += 1
+                print(f"[{index}/{len(pending)}] {futures[future]} → {status}")
+    except BrokenProcessPool:
+        logger.error("A worker process died; rerun the same command to resume")
+        return 1
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; rerun the same command to resume")
+        return 130
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    print(f"Processed {len(pending)} videos in {time.time() - start:.1f}s ({failed} failed) → {args.output}")
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Video files, directories or glob patterns")
+    parser.add_argument("--output", "-o", required=True, help="JSONL file (appended to, doubles as checkpoint)")
+    parser.add_argument("--workers", "-w", type=int, default=2, help="Worker processes (each loads the models)")
+    parser.add_argument("--threads", type=int, help="Torch/OpenCV/Paddle threads per worker (default: tuning profile, at most CPUs / workers)")
+    parser.add_argument("--recursive", "-r", action="store_true", help="Include subdirectories")
+    parser.add_argument("--camera-id", help="Camera profile from the runtime configuration")
+    parser.add_argument("--config", help="JSON object of setting overrides, as on /api/process-video")
+    parser.add_argument("--persist-detections", action="store_true", help="Store detections for re-analysis")
+    parser.add_argument("--retry-failed", action="store_true", help="Process videos recorded as failed again")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log pipeline progress of the workers")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be >= 1")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)-8s | %(name)-15s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare two benchmark result files written by benchmarks.suite
+
+Prints the change of every timing (lower is better) between a baseline and
+a candidate run and flags regressions above a threshold.
+
+Usage (from the ai-service directory):
+    python -m benchmarks.compare benchmark-1a2b3c4d.json benchmark-5e6f7a8b.json
+    python -m benchmarks.compare base.json new.json --threshold 5 --fail-on-regression
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+
+def timings(report: Dict) -> Iterator[Tuple[str, float, str]]:
+    """(name, value, unit) of every timing in a report"""
+    for name, result in report["results"].items():
+        if result.get("status") != "ok":
+            continue
+        if "median_us" in result:
+            yield name, result["median_us"], "µs/call"
+        elif "median_seconds" in result:
+            yield name, result["median_seconds"], "s/video"
+        else:
+            for key, value in result.items():
+                if isinstance(value, dict) and "median_us" in value:
+                    yield f"{name}.{key}", value["median_us"], "µs/call"
+
+
+def describe(report: Dict) -> str:
+    git = report.get("git") or {}
+    commit = (git.get("commit") or "unknown")[:8]
+    dirty = "+dirty" if git.get("dirty") else ""
+    return f"{commit}{dirty} on {report['host']['hostname']} ({report['created_at']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {describe(baseline)}")
+    print(f"candidate: {describe(candidate)}")
+    if baseline["parameters"] != candidate["parameters"]:
+        print("warning: benchmark parameters differ, results may not be comparable")
+    if baseline["host"].get("hostname") != candidate["host"].get("hostname"):
+        print("warning: runs come from different hosts")
+    print()
+
+    base_timings = {name: (value, unit) for name, value, unit in timings(baseline)}
+    regressions = 0
+
+    print(f"{'benchmark':<24} {'baseline':>14} {'candidate':>14} {'change':>9}")
+    for name, value, unit in timings(candidate):
+        if name not in base_timings:
+            print(f"{name:<24} {'-':>14} {value:>14.3f} {'new':>9}  {unit}")
+            continue
+
+        base_value, _ = base_timings.pop(name)
+        change = (value - base_value) / base_value * 100 if base_value else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  improved"
+        print(f"{name:<24} {base_value:>14.3f} {value:>14.3f} {change:>+8.1f}%  {unit}{flag}")
+
+    for name, (value, unit) in base_timings.items():
+        print(f"{name:<24} {value:>14.3f} {'-':>14} {'missing':>9}  {unit}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Concurrent load test of /api/process-video
+
+Starts the service locally with uvicorn (optionally with stub detectors,
+so no model files are needed), uploads generated synthetic videos at one
+or more concurrency levels and reports, per level:
+
+- throughput (requests/s and video seconds processed per second)
+- p50/p95/p99/max latency of the uploads
+- error rate by status code
+- /health latency while the uploads are running
+
+Every upload uses a distinct video so the result cache cannot hide the
+processing cost. Pass --url to test an already running service instead.
+
+Usage (from the ai-service directory):
+    python -m benchmarks.load_test --stub --concurrency 5 10 20
+    python -m benchmarks.load_test --stub --stub-inference-ms 30 --concurrency 10 --requests 40
+    python -m benchmarks.load_test --url http://ai-service:8000 --concurrency 5 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.synthetic import SyntheticTraffic
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile, or None for an empty list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(values: List[float]) -> Dict:
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "count": len(values),
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(max(values)) if values else None,
+        "mean_ms": ms(statistics.mean(values)) if values else None
+    }
+
+
+# Videos
+
+def generate_videos(directory: str, count: int, args) -> List[str]:
+    """Distinct synthetic videos (different speeds and traffic density)"""
+    paths = []
+    for i in range(count):
+        scene = SyntheticTraffic(
+            width=args.width,
+            height=args.height,
+            fps=args.fps,
+            vehicle_interval=15 + i % 11,
+            speed_px=(4 + i % 5, 7 + i % 7, 10 + i % 3),
+            vehicle_size=(args.width // 8, args.height // 9),
+            draw_plates=True
+        )
+        paths.append(scene.write_video(os.path.join(directory, f"load_{i:04d}.mp4"), args.frames))
+    return paths
+
+
+def multipart_body(path: str) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        content = f.read()
+    body = b"".join([
+        f"--{boundary}\r\n".encode(),
+        f'Content-Disposition: form-data; name="video"; filename="{os.path.basename(path)}"\r\n'.encode(),
+        b"Content-Type: video/mp4\r\n\r\n",
+        content,
+        f"\r\n--{boundary}--\r\n".encode()
+    ])
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+# Requests
+
+def upload(url: str, path: str, timeout: float) -> Dict:
+    body, content_type = multipart_body(path)
+    request = urllib.request.Request(
+        f"{url}/api/process-video",
+        data=body,
+        headers={"Content-Type": content_type, "X-Correlation-ID": f"load-{uuid.uuid4().hex[:8]}"},
+        method="POST"
+    )
+
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read())
+            status = response.status
+    except urllib.error.HTTPError as e:
+        return {"status": e.code, "latency": time.perf_counter() - start, "error": e.read()[:200].decode(errors="replace")}
+    except Exception as e:
+        return {"status": None, "latency": time.perf_counter() - start, "error": f"{type(e).__name__}: {e}"}
+
+    return {
+        "status": status,
+        "latency": time.perf_counter() - start,
+        "processing_time": payload.get("processing_time_seconds"),
+        "video_seconds": payload.get("video_info", {}).get("duration_seconds", 0.0)
+    }
+
+
+class HealthProbe:
+    """Poll /health in the background and record latencies and failures"""
+
+    def __init__(self, url: str, interval: float, timeout: float):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f"{self.url}/health", timeout=self.timeout) as response:
+                    response.read()
+                self.latencies.append(time.perf_counter() - start)
+            except Exception:
+                self.failures += 1
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_level(url: str, videos: List[str], concurrency: int, requests: int, args) -> Dict:
+    with HealthProbe(url, args.health_interval, args.health_timeout) as health:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(
+                lambda i: upload(url, videos[i % len(videos)], args.timeout),
+                range(requests)
+            ))
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == 200]
+    errors = {}
+    for r in results:
+        if r["status"] != 200:
+            key = str(r["status"]) if r["status"] is not None else "connection"
+            errors[key] = errors.get(key, 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "succeeded": len(ok),
+        "errors": errors,
+        "error_rate": round(1 - len(ok) / requests, 4),
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 3),
+        "video_seconds_per_second": round(sum(r["video_seconds"] for r in ok) / wall, 2),
+        "latency": latency_summary([r["latency"] for r in ok]),
+        "server_processing": latency_summary([r["processing_time"] for r in ok if r.get("processing_time") is not None]),
+        "health": {**latency_summary(health.latencies), "failures": health.failures},
+        "sample_errors": [r["error"] for r in results if "error" in r][:5]
+    }
+
+
+# Local Server
+
+def wait_until_ready(url: str, timeout: float, process: subprocess.Popen):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Service exited during startup (code {process.returncode})")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2) as response:
+                return json.loads(response.read())
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError(f"Service not ready after {timeout}s")
+
+
+def start_service(args, log_file) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["RESULT_CACHE_ENABLED"] = "false"
+    if args.stub:
+        env["STUB_DETECTORS"] = "true"
+        env["STUB_INFERENCE_MS"] = str(args.stub_inference_ms)
+
+    command = [
+        sys.executable, "-m", "uvicorn", "app:app",
+        "--host", "127.0.0.1",
+        "--port", str(args.port),
+        "--workers", str(args.workers),
+        "--log-level", "warning"
+    ]
+    return subprocess.Popen(command, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def print_level(level: Dict):
+    lat, health = level["latency"], level["health"]
+    print(
+        f"concurrency={level['concurrency']:>3} requests={level['requests']:>4} "
+        f"ok={level['succeeded']:>4} error_rate={level['error_rate']:.1%} "
+        f"throughput={level['throughput_rps']:.2f} req/s ({level['video_seconds_per_second']} video s/s)\n"
+        f"    latency p50={lat['p50_ms']} p95={lat['p95_ms']} p99={lat['p99_ms']} max={lat['max_ms']} ms\n"
+        f"    /health p50={health['p50_ms']} p95={health['p95_ms']} p99={health['p99_ms']} "
+        f"max={health['max_ms']} ms failures={health['failures']}"
+    )
+    if level["errors"]:
+        print(f"    errors: {level['errors']} e.g. {level['sample_errors'][:1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Test a running service instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the locally started service")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the local service")
+    parser.add_argument("--stub", action="store_true", help="Start the service with stub detectors (no models needed)")
+    parser.add_argument("--stub-inference-ms", type=float, default=0.0, help="Simulated latency per model call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--requests", type=int, help="Requests per level (default: 2 x concurrency)")
+    parser.add_argument("--videos", type=int, default=20, help="Distinct videos to generate")
+    parser.add_argument("--frames", type=int, default=150, help="Frames per generated video")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Upload timeout in seconds")
+    parser.add_argument("--health-interval", type=float, default=0.5)
+    parser.add_argument("--health-timeout", type=float, default=5.0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"Generating {args.videos} videos ({args.frames} frames, {args.width}x{args.height})...")
+        videos = generate_videos(tmp_dir, args.videos, args)
+
+        process = None
+        log_path = os.path.join(tmp_dir, "service.log")
+        url = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+        try:
+            if args.url is None:
+                with open(log_path, "w") as log_file:
+                    process = start_service(args, log_file)
+                try:
+                    health = wait_until_ready(url, 300, process)
+                except RuntimeError:
+                    with open(log_path) as f:
+                        print(f.read()[-3000:])
+                    raise
+                print(f"Service started on {url}: {health}")
+
+            levels = []
+            for concurrency in args.concurrency:
+                requests = args.requests or 2 * concurrency
+                level = run_level(url, videos, concurrency, requests, args)
+                levels.append(level)
+                print_level(level)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(30)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "target": args.url or "local",
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "levels": levels
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Peak memory of the processing pipeline on synthetic long videos
+
+Each run happens in a fresh process and reports its peak RSS, so runs of
+increasing length can be compared directly. With finalized tracks spilled
+to disk the peak should stay flat as the video gets longer; the
+"in_memory" mode keeps every record in lists for comparison.
+
+Usage (from the ai-service directory):
+    python -m benchmarks.memory_long_video --frames 20000 40000 80000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+import tracemalloc
+
+from benchmarks.synthetic import SyntheticTraffic
+from detectors.synthetic_detectors import ContourVehicleDetector, NoPlateDetector
+from pipeline.processor import VideoPipeline
+from pipeline.result_writer import ResultWriter
+
+
+def run_once(frame_count: int, mode: str, trace: bool) -> dict:
+    """Process one synthetic video and report memory usage"""
+    scene = SyntheticTraffic()
+    pipeline = VideoPipeline(
+        ContourVehicleDetector(),
+        NoPlateDetector(),
+        scene.fps,
+        frame_count,
+        correlation_id="bench"
+    )
+
+    if trace:
+        tracemalloc.start()
+
+    start = time.time()
+    writer = ResultWriter() if mode == "spill" else None
+    vehicles, violations = [], []
+
+    for event in pipeline.run(scene.frames(frame_count)):
+        if event["event"] != "vehicle":
+            continue
+        if writer is not None:
+            writer.add(event["vehicle"], event["violation"])
+        else:
+            vehicles.append(event["vehicle"])
+            if event["violation"] is not None:
+                violations.append(event["violation"])
+
+    head = {"summary": pipeline.finalizer.summary()}
+    if writer is not None:
+        writer.write_json(os.devnull, head, {})
+        writer.close()
+    else:
+        with open(os.devnull, "w") as f:
+            json.dump({**head, "violations": violations, "tracked_vehicles": vehicles}, f)
+
+    elapsed = time.time() - start
+    python_peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "frames": frame_count,
+        "video_minutes": round(frame_count / scene.fps / 60, 1),
+        "vehicles": pipeline.finalizer.vehicles_tracked,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "python_peak_mb": round(python_peak / 1024 ** 2, 2) if trace else None,
+        "elapsed_seconds": round(elapsed, 2)
+    }
+
+
+def _child(frame_count, mode, trace, queue):
+    queue.put(run_once(frame_count, mode, trace))
+
+
+def run_isolated(frame_count: int, mode: str, trace: bool) -> dict:
+    """Run in a fresh process so peak RSS is not shared between runs"""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(frame_count, mode, trace, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, nargs="+", default=[10000, 20000, 40000])
+    parser.add_argument("--modes", nargs="+", choices=["spill", "in_memory"], default=["spill", "in_memory"])
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python heap peak (slower)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes:
+        for frame_count in args.frames:
+            result = run_isolated(frame_count, mode, args.tracemalloc)
+            results.append(result)
+            print(
+                f"{result['mode']:>9} frames={result['frames']:>7} "
+                f"({result['video_minutes']:>5} min) vehicles={result['vehicles']:>5} "
+                f"peak_rss={result['peak_rss_mb']:>7} MB "
+                f"python_peak={result['python_peak_mb']} MB time={result['elapsed_seconds']}s"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
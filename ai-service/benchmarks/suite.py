@@ -0,0 +1,542 @@
+"""
+Stage and end-to-end benchmarks on synthetic traffic
+
+Every stage is measured in isolation on deterministic inputs generated by
+benchmarks.synthetic: CentroidTracker.update, calculate_speed and
+calculate_speeds (with and without a ground plane), apply_corrections /
+validate_plate_format, the YOLO detectors and OCR, and the cost of passing
+frames between processes.
+The end-to-end benchmark runs the same pipeline as /api/process-video on a
+synthetic video file written to a temporary directory.
+
+Stages whose dependencies are not available (model weights, PaddleOCR)
+are reported as skipped with the reason; the end-to-end run then falls back
+to the synthetic stand-in detectors and says so in the results.
+
+Results are written as JSON together with the git commit and the host, so
+runs on different commits can be compared with benchmarks.compare.
+
+Usage (from the ai-service directory):
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only tracker_update calculate_speed --repeats 10
+    python -m benchmarks.suite --width 1920 --height 1080 --speeds 4 8 12 --output base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import SyntheticTraffic, plate_number
+from detectors.synthetic_detectors import ContourVehicleDetector, SyntheticPlateDetector, NoPlateDetector
+from ocr.ocr_reader import apply_corrections, validate_plate_format, basic_clean
+from pipeline.frame_ring import FrameRing, mp_context
+from pipeline.processor import VideoPipeline, open_video, read_frames
+from pipeline.result_writer import ResultWriter
+from tracker.centroid_tracker import CentroidTracker
+from utils.config import (
+    VEHICLE_MODEL_PATH,
+    PLATE_MODEL_PATH,
+    PIXEL_TO_METER,
+    get_config_dict
+)
+from utils.pre_process import safe_crop
+from utils.ground_plane import ground_plane
+from utils.speed_estimator import calculate_speed, calculate_speeds
+
+BENCHMARKS = (
+    "tracker_update",
+    "calculate_speed",
+    "plate_text_rules",
+    "vehicle_detector",
+    "plate_detector",
+    "ocr",
+    "frame_transport",
+    "end_to_end"
+)
+
+# Tracks per calculate_speeds call (tracks ending in the same frames)
+SPEED_BATCH = 16
+
+
+class Skipped(Exception):
+    """Raised by a benchmark whose dependencies are not available"""
+
+
+def measure(make_call: Callable[[], Callable], items: Sequence, repeats: int, warmup: int = 1) -> Dict:
+    """
+    Time calls over a list of inputs
+
+    make_call() is invoked before every repeat and returns the function to
+    call on each item, so stateful stages (the tracker) start fresh. Timings
+    are per call, aggregated over the repeats.
+    """
+    for _ in range(warmup):
+        call = make_call()
+        for item in items:
+            call(item)
+
+    per_call = []
+    for _ in range(repeats):
+        call = make_call()
+        start = time.perf_counter()
+        for item in items:
+            call(item)
+        per_call.append((time.perf_counter() - start) / len(items))
+
+    median = statistics.median(per_call)
+    return {
+        "calls_per_repeat": len(items),
+        "repeats": repeats,
+        "median_us": round(median * 1e6, 3),
+        "mean_us": round(statistics.mean(per_call) * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "max_us": round(max(per_call) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(per_call) * 1e6, 3) if repeats > 1 else 0.0,
+        "calls_per_second": round(1 / median, 1) if median > 0 else None
+    }
+
+
+# Stage Benchmarks
+
+def bench_tracker_update(scene: SyntheticTraffic, args) -> Dict:
+    # Ground-truth boxes, so only the tracker is measured
+    w, h = scene.vehicle_size
+    detections = [
+        [(x, y, x + w, y + h) for _, x, y in scene.vehicles_at(frame_id)]
+        for frame_id in range(1, args.frames + 1)
+    ]
+
+    def make_call():
+        return CentroidTracker().update
+
+    result = measure(make_call, detections, args.repeats)
+    result["avg_detections_per_frame"] = round(sum(map(len, detections)) / len(detections), 2)
+    return result
+
+
+def bench_calculate_speed(scene: SyntheticTraffic, args) -> Dict:
+    rng = random.Random(args.seed)
+    tracks = []
+    for _ in range(1000):
+        length = rng.randint(8, 120)
+        x, y = rng.randint(0, scene.width - 1), rng.randint(0, scene.height - 1)
+        dx = rng.choice(scene.speeds)
+        tracks.append((1, length, [(x + i * dx, y) for i in range(length)]))
+
+    # Road trapezoid 10 m wide and 40 m deep, narrowing towards the top
+    w, h = scene.width, scene.height
+    ground = ground_plane({
+        "image_points": [[int(w * 0.3), int(h * 0.3)], [int(w * 0.7), int(h * 0.3)], [w - 1, h - 1], [0, h - 1]],
+        "ground_points": [[0, 0], [10, 0], [10, 40], [0, 40]],
+        "resolution": [w, h]
+    })
+    batches = [tracks[start:start + SPEED_BATCH] for start in range(0, len(tracks), SPEED_BATCH)]
+
+    def make_scalar_call():
+        return lambda track: calculate_speed(track[0], track[1], track[2], scene.fps, PIXEL_TO_METER)
+
+    def make_batch_call(plane):
+        def call(batch):
+            calculate_speeds(
+                [track[0] for track in batch],
+                [track[1] for track in batch],
+                [track[2][0] for track in batch],
+                [track[2][-1] for track in batch],
+                scene.fps,
+                PIXEL_TO_METER,
+                plane,
+                (w, h)
+            )
+        return lambda: call
+
+    # Batched timings are per track, like the scalar one
+    results = {"per_track": measure(make_scalar_call, tracks, args.repeats)}
+    for name, plane in (("batched", None), ("batched_ground_plane", ground)):
+        result = measure(make_batch_call(plane), batches, args.repeats)
+        for key in ("median_us", "mean_us", "min_us", "max_us", "stdev_us"):
+            result[key] = round(result[key] * len(batches) / len(tracks), 3)
+        result["calls_per_second"] = round(1e6 / result["median_us"], 1) if result["median_us"] > 0 else None
+        result["batch_size"] = SPEED_BATCH
+        results[name] = result
+    return results
+
+
+def bench_plate_text_rules(scene: SyntheticTraffic, args) -> Dict:
+    # Plate strings with the character confusions OCR typically makes
+    rng = random.Random(args.seed)
+    confusions = {"0": "O", "1": "I", "5": "S", "8": "B", "2": "Z", "6": "G"}
+    texts = []
+    for index in range(1000):
+        text = plate_number(index)
+        noisy = "".join(
+            confusions.get(c, c) if rng.random() < 0.2 else c
+            for c in text
+        )
+        texts.append(basic_clean(noisy))
+
+    def make_call():
+        def call(text):
+            corrected, _ = apply_corrections(text)
+            validate_plate_format(corrected)
+        return call
+
+    result = measure(make_call, texts, args.repeats)
+    result["valid_after_correction"] = sum(
+        1 for text in texts if validate_plate_format(apply_corrections(text)[0])[0]
+    )
+    return result
+
+
+def load_detectors():
+    """The YOLO detectors, or Skipped with the reason"""
+    for path in (VEHICLE_MODEL_PATH, PLATE_MODEL_PATH):
+        if not os.path.exists(path):
+            raise Skipped(f"model weights not found: {path}")
+    try:
+        from detectors.vehicle_detector import VehicleDetector
+        from detectors.plate_detector import PlateDetector
+    except ImportError as e:
+        raise Skipped(f"detector dependencies not installed: {e}")
+    return VehicleDetector(), PlateDetector()
+
+
+def load_ocr_engine():
+    try:
+        from ocr.ocr_reader import get_ocr_engine
+        return get_ocr_engine()
+    except ImportError as e:
+        raise Skipped(f"PaddleOCR not installed: {e}")
+
+
+def sample_frames(scene: SyntheticTraffic, count: int) -> List[np.ndarray]:
+    """Frames spread over the scene that contain at least one vehicle"""
+    frames = []
+    frame_id = scene.vehicle_interval
+    while len(frames) < count and frame_id <= 100 * count:
+        if any(True for _ in scene.vehicles_at(frame_id)):
+            frames.append(scene.render(frame_id))
+        frame_id += scene.vehicle_interval // 3 + 1
+    return frames
+
+
+def vehicle_crops(scene: SyntheticTraffic, count: int) -> List[np.ndarray]:
+    w, h = scene.vehicle_size
+    crops = []
+    frame_id = scene.vehicle_interval
+    while len(crops) < count and frame_id <= 100 * count:
+        frame = scene.render(frame_id)
+        for _, x, y in scene.vehicles_at(frame_id):
+            if x >= 0 and x + w <= scene.width:
+                crops.append(safe_crop(frame, (x, y, x + w, y + h)))
+        frame_id += scene.vehicle_interval // 3 + 1
+    return crops[:count]
+
+
+def plate_crops(scene: SyntheticTraffic, count: int) -> List[np.ndarray]:
+    crops = []
+    frame_id = scene.vehicle_interval
+    while len(crops) < count and frame_id <= 100 * count:
+        frame = scene.render(frame_id)
+        for _, x, y in scene.vehicles_at(frame_id):
+            box = scene.plate_box(x, y)
+            if box[0] >= 0 and box[2] <= scene.width:
+                crops.append(safe_crop(frame, box))
+        frame_id += scene.vehicle_interval // 3 + 1
+    return crops[:count]
+
+
+def bench_vehicle_detector(scene: SyntheticTraffic, args) -> Dict:
+    vehicle_detector, _ = load_detectors()
+    frames = sample_frames(scene, args.model_samples)
+
+    return measure(lambda: vehicle_detector.detect, frames, args.model_repeats)
+
+
+def bench_plate_detector(scene: SyntheticTraffic, args) -> Dict:
+    _, plate_detector = load_detectors()
+    crops = vehicle_crops(scene, args.model_samples)
+
+    return measure(lambda: plate_detector.detect, crops, args.model_repeats)
+
+
+def bench_ocr(scene: SyntheticTraffic, args) -> Dict:
+    from ocr.ocr_reader import read_plate_enhanced, multi_pass_ocr
+
+    load_ocr_engine()
+    crops = plate_crops(scene, args.model_samples)
+
+    single = measure(lambda: read_plate_enhanced, crops, args.model_repeats)
+    multi_pass = measure(lambda: multi_pass_ocr, crops, args.model_repeats)
+    read = [read_plate_enhanced(crop) for crop in crops]
+
+    return {
+        "single_pass": single,
+        "multi_pass": multi_pass,
+        "validated_reads": sum(1 for r in read if r.validated),
+        "samples": len(crops)
+    }
+
+
+def _queue_consumer(frames, done, count: int):
+    done.put("ready")
+    for _ in range(count):
+        frames.get()[0, 0]
+    done.put(True)
+
+
+def _ring_consumer(ring: FrameRing, handles, done, count: int):
+    done.put("ready")
+    for _ in range(count):
+        slot = handles.get()
+        ring.view(slot)[0, 0]
+        ring.release(slot)
+    ring.close()
+    done.put(True)
+
+
+def bench_frame_transport(scene: SyntheticTraffic, args) -> Dict:
+    """Per-frame cost of handing frames to another process: pickled vs. shared memory"""
+    frame = scene.render(1)
+    count = args.transport_frames
+
+    def run(mode: str) -> float:
+        done = mp_context.Queue()
+        if mode == "pickle_queue":
+            channel = mp_context.Queue(maxsize=8)
+            process = mp_context.Process(target=_queue_consumer, args=(channel, done, count))
+        else:
+            ring = FrameRing(8, frame.shape)
+            channel = mp_context.Queue()
+            process = mp_context.Process(target=_ring_consumer, args=(ring, channel, done, count))
+        process.start()
+        # Process startup (spawn, imports) is not part of the transport cost
+        done.get()
+
+        start = time.perf_counter()
+        for _ in range(count):
+            if mode == "pickle_queue":
+                channel.put(frame)
+            else:
+                slot = ring.acquire()
+                ring.view(slot)[...] = frame  # stands in for the decoder writing the slot
+                channel.put(slot)
+        done.get()
+        elapsed = time.perf_counter() - start
+
+        process.join()
+        if mode == "shared_ring":
+            ring.close()
+            ring.unlink()
+        return elapsed / count
+
+    result = {"frame_mb": round(frame.nbytes / 1024 ** 2, 2), "frames": count}
+    for mode in ("pickle_queue", "shared_ring"):
+        per_frame = [run(mode) for _ in range(args.model_repeats)]
+        median = statistics.median(per_frame)
+        result[mode] = {
+            "median_us": round(median * 1e6, 3),
+            "min_us": round(min(per_frame) * 1e6, 3),
+            "frames_per_second": round(1 / median, 1) if median > 0 else None
+        }
+    return result
+
+
+def bench_end_to_end(scene: SyntheticTraffic, args) -> Dict:
+    try:
+        vehicle_detector, plate_detector = load_detectors()
+        detectors = "yolo"
+    except Skipped as e:
+        vehicle_detector, plate_detector = ContourVehicleDetector(), SyntheticPlateDetector()
+        detectors = f"synthetic ({e})"
+
+    try:
+        load_ocr_engine()
+        ocr = "paddleocr"
+    except Skipped as e:
+        plate_detector = NoPlateDetector()  # without OCR no plate is read
+        ocr = f"skipped ({e})"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = scene.write_video(os.path.join(tmp_dir, "synthetic.mp4"), args.frames)
+        size_mb = os.path.getsize(path) / 1024 ** 2
+
+        runs = []
+        for _ in range(args.e2e_repeats):
+            # Same steps as /api/process-video, without the HTTP layer
+            start = time.perf_counter()
+            cap, fps, total_frames, _ = open_video(path)
+            pipeline = VideoPipeline(vehicle_detector, plate_detector, fps, total_frames, correlation_id="bench")
+            writer = ResultWriter()
+            try:
+                for event in pipeline.run(read_frames(cap)):
+                    if event["event"] == "vehicle":
+                        writer.add(event["vehicle"], event["violation"])
+                writer.write_json(os.devnull, {"summary": pipeline.finalizer.summary()}, {})
+            finally:
+                writer.close()
+                cap.release()
+            runs.append(time.perf_counter() - start)
+
+    median = statistics.median(runs)
+    summary = pipeline.finalizer.summary()
+    return {
+        "detectors": detectors,
+        "ocr": ocr,
+        "video_frames": args.frames,
+        "video_size_mb": round(size_mb, 2),
+        "processed_frames": pipeline.processed_frames,
+        "repeats": args.e2e_repeats,
+        "median_seconds": round(median, 3),
+        "min_seconds": round(min(runs), 3),
+        "max_seconds": round(max(runs), 3),
+        "video_frames_per_second": round(args.frames / median, 1),
+        "expected_vehicles": scene.total_vehicles(args.frames),
+        "summary": summary
+    }
+
+
+# Runner
+
+def git_info() -> Dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(
+                ["git", *cmd], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    commit = git("rev-parse", "HEAD")
+    return {
+        "commit": commit,
+        "subject": git("log", "-1", "--format=%s") if commit else None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")) if commit else None
+    }
+
+
+def host_info() -> Dict:
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads()
+    }
+
+
+def run_suite(args) -> Dict:
+    scene = SyntheticTraffic(
+        width=args.width,
+        height=args.height,
+        fps=args.fps,
+        lanes=args.lanes,
+        vehicle_interval=args.vehicle_interval,
+        speed_px=args.speeds,
+        vehicle_size=(args.vehicle_width, args.vehicle_height),
+        vehicle_count=args.vehicles,
+        draw_plates=True
+    )
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        start = time.perf_counter()
+        try:
+            result = globals()[f"bench_{name}"](scene, args)
+            result["status"] = "ok"
+        except Skipped as e:
+            result = {"status": "skipped", "reason": str(e)}
+        result["wall_seconds"] = round(time.perf_counter() - start, 2)
+        results[name] = result
+        print(format_result(name, result))
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_info(),
+        "host": host_info(),
+        "parameters": {
+            "scene": {
+                "width": scene.width,
+                "height": scene.height,
+                "fps": scene.fps,
+                "lanes": scene.lanes,
+                "vehicle_interval": scene.vehicle_interval,
+                "speeds_px_per_frame": list(scene.speeds),
+                "vehicle_size": list(scene.vehicle_size),
+                "vehicle_count": scene.vehicle_count
+            },
+            "frames": args.frames,
+            "repeats": args.repeats,
+            "model_samples": args.model_samples,
+            "model_repeats": args.model_repeats,
+            "e2e_repeats": args.e2e_repeats,
+            "transport_frames": args.transport_frames,
+            "seed": args.seed,
+            "configuration": get_config_dict()
+        },
+        "results": results
+    }
+
+
+def format_result(name: str, result: Dict) -> str:
+    if result["status"] != "ok":
+        return f"{name:>18}: skipped ({result['reason']})"
+    if "median_us" in result:
+        return f"{name:>18}: {result['median_us']:>12.2f} µs/call  ({result['calls_per_second']} calls/s)"
+    if "median_seconds" in result:
+        return (
+            f"{name:>18}: {result['median_seconds']:>12.3f} s/video  "
+            f"({result['video_frames_per_second']} frames/s, detectors={result['detectors']})"
+        )
+    return f"{name:>18}: " + ", ".join(
+        f"{key}={value['median_us']:.2f} µs/call" for key, value in result.items() if isinstance(value, dict)
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run only these benchmarks")
+    parser.add_argument("--output", help="JSON result file (default: benchmark-<commit>.json)")
+
+    scene = parser.add_argument_group("synthetic scene")
+    scene.add_argument("--width", type=int, default=1280)
+    scene.add_argument("--height", type=int, default=720)
+    scene.add_argument("--fps", type=float, default=30.0)
+    scene.add_argument("--lanes", type=int, default=3)
+    scene.add_argument("--vehicle-interval", type=int, default=20, help="Frames between new vehicles")
+    scene.add_argument("--vehicles", type=int, help="Total vehicles (default: unlimited)")
+    scene.add_argument("--speeds", type=int, nargs="+", default=[6, 9, 12], help="Pixels per frame, cycled over vehicles")
+    scene.add_argument("--vehicle-width", type=int, default=160)
+    scene.add_argument("--vehicle-height", type=int, default=80)
+    scene.add_argument("--frames", type=int, default=600, help="Frames for the tracker and end-to-end runs")
+    scene.add_argument("--transport-frames", type=int, default=200, help="Frames sent per frame_transport run")
+
+    runs = parser.add_argument_group("repetitions")
+    runs.add_argument("--repeats", type=int, default=20, help="Repeats of the cheap stages")
+    runs.add_argument("--model-samples", type=int, default=20, help="Inputs for detector/OCR benchmarks")
+    runs.add_argument("--model-repeats", type=int, default=3)
+    runs.add_argument("--e2e-repeats", type=int, default=3)
+    runs.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run_suite(args)
+
+    output = args.output or f"benchmark-{(report['git']['commit'] or 'nogit')[:8]}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Synthetic traffic scenes for benchmarks
+
+The scene is fully deterministic: bright boxes move left to right across a
+dark road in a fixed number of lanes, optionally carrying a white plate
+with dark text. The detectors in detectors.synthetic_detectors find those
+boxes and plates, so tracking, speed and response building can be
+exercised without YOLO weights.
+"""
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+PLATE_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def plate_number(index: int) -> str:
+    """Deterministic plate text in the 123TUN456 format"""
+    return f"{(index * 37) % 999 + 1}TUN{(index * 101) % 9999 + 1}"
+
+
+class SyntheticTraffic:
+    """Deterministic stream of frames with vehicles crossing the scene"""
+
+    def __init__(
+        self,
+        width: int = 640,
+        height: int = 360,
+        fps: float = 30.0,
+        lanes: int = 3,
+        vehicle_interval: int = 45,
+        speed_px: Union[int, Sequence[int]] = 6,
+        vehicle_size: Tuple[int, int] = (60, 30),
+        vehicle_count: Optional[int] = None,
+        draw_plates: bool = False
+    ):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.lanes = lanes
+        self.vehicle_interval = vehicle_interval  # frames between new vehicles
+        # Pixels moved per frame, cycled over vehicles when a sequence
+        self.speeds = (speed_px,) if isinstance(speed_px, int) else tuple(speed_px)
+        self.speed_px = self.speeds[0]
+        self.vehicle_size = vehicle_size
+        self.vehicle_count = vehicle_count        # None = endless stream
+        self.draw_plates = draw_plates
+
+    def lane_y(self, lane: int) -> int:
+        lane_height = self.height // (self.lanes + 1)
+        return lane_height * (lane + 1) - self.vehicle_size[1] // 2
+
+    def speed_of(self, index: int) -> int:
+        return self.speeds[index % len(self.speeds)]
+
+    def expected_speed_kmh(self, index: int, pixel_to_meter: float) -> float:
+        """Ground-truth speed of a vehicle for a given calibration"""
+        return self.speed_of(index) * self.fps * pixel_to_meter * 3.6
+
+    def vehicles_at(self, frame_id: int):
+        """(vehicle_index, x, y) of every vehicle visible in a frame"""
+        w, _ = self.vehicle_size
+        crossing_frames = (self.width + w) // min(self.speeds) + 1
+        first = max(0, (frame_id - crossing_frames) // self.vehicle_interval)
+        last = frame_id // self.vehicle_interval
+        if self.vehicle_count is not None:
+            last = min(last, self.vehicle_count - 1)
+
+        for index in range(first, last + 1):
+            age = frame_id - index * self.vehicle_interval
+            x = age * self.speed_of(index) - w
+            if -w < x < self.width:
+                yield index, x, self.lane_y(index % self.lanes)
+
+    def plate_box(self, x: int, y: int) -> Tuple[int, int, int, int]:
+        """Plate rectangle of a vehicle whose box starts at (x, y)"""
+        w, h = self.vehicle_size
+        pw, ph = int(w * 0.7), int(h * 0.35)
+        px1 = x + (w - pw) // 2
+        py1 = y + h - ph - max(2, h // 10)
+        return px1, py1, px1 + pw, py1 + ph
+
+    def render(self, frame_id: int) -> np.ndarray:
+        frame = np.full((self.height, self.width, 3), 50, dtype=np.uint8)
+        w, h = self.vehicle_size
+        for index, x, y in self.vehicles_at(frame_id):
+            if not self.draw_plates:
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 255), -1)
+                continue
+
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (225, 225, 225), -1)
+            px1, py1, px2, py2 = self.plate_box(x, y)
+            cv2.rectangle(frame, (px1, py1), (px2, py2), (255, 255, 255), -1)
+            self._draw_text(frame, plate_number(index), (px1, py1, px2, py2))
+        return frame
+
+    def _draw_text(self, frame, text: str, box: Tuple[int, int, int, int]):
+        px1, py1, px2, py2 = box
+        # Largest scale that fits the plate with a small margin
+        scale = 1.0
+        (tw, th), _ = cv2.getTextSize(text, PLATE_FONT, scale, 1)
+        scale = min((px2 - px1 - 4) / tw, (py2 - py1 - 4) / th)
+        (tw, th), _ = cv2.getTextSize(text, PLATE_FONT, scale, 1)
+        origin = (px1 + (px2 - px1 - tw) // 2, py1 + (py2 - py1 + th) // 2)
+        cv2.putText(frame, text, origin, PLATE_FONT, scale, (20, 20, 20), 1, cv2.LINE_AA)
+
+    def frames(self, count: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield (frame_id, frame) like pipeline.processor.read_frames"""
+        for frame_id in range(1, count + 1):
+            yield frame_id, self.render(frame_id)
+
+    def total_vehicles(self, count: int) -> int:
+        total = count // self.vehicle_interval + 1
+        return total if self.vehicle_count is None else min(total, self.vehicle_count)
+
+    def write_video(self, path: str, count: int, fourcc: str = "mp4v") -> str:
+        """Render count frames to a video file"""
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), self.fps, (self.width, self.height))
+        if not writer.isOpened():
+            raise RuntimeError(f"Cannot write video with codec {fourcc}: {path}")
+        try:
+            for _, frame in self.frames(count):
+                writer.write(frame)
+        finally:
+            writer.release()
+        return path
@@ -0,0 +1,329 @@
+"""
+Host tuning of thread counts and the plate detection batch size
+
+torch, OpenCV and PaddleOCR each default to a thread pool sized for the
+whole machine. This command runs short calibration passes on the current
+host and writes the fastest configuration as a tuning profile
+(TUNING_PROFILE_FILE), which the service and batch.py apply at startup:
+
+- OpenCV threads: resize, colour conversion and blur of full-size frames
+- torch threads: VehicleDetector on a frame plus PlateDetector on the
+  vehicle crops of a frame
+- plate batch size: PlateDetector.detect_batch over the vehicle crops of a
+  frame, at the chosen torch threads
+- Paddle threads: the OCR reader on plate crops (the engine is rebuilt for
+  every candidate)
+
+Each stage is timed with the library default and with 1, 2, 4, ... threads
+up to the usable CPUs; the smallest setting within TOLERANCE of the fastest
+is kept, which leaves cores to the other stages. Stages whose dependencies
+are missing are skipped and keep the library default.
+
+The report ends with the frames per second the models reach with the
+tuned profile and the smallest FRAME_SKIP that keeps up with a camera at
+--fps. FRAME_SKIP changes the analysis (fewer points per track), so it is
+only suggested, not written to the profile.
+
+Usage (from the ai-service directory):
+    python -m benchmarks.tune
+    python -m benchmarks.tune --dry-run
+    python -m benchmarks.tune --width 1920 --height 1080 --output /tmp/tuning-profile.json
+"""
+import argparse
+import math
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import cv2
+
+from benchmarks.suite import (
+    Skipped,
+    measure,
+    load_detectors,
+    load_ocr_engine,
+    sample_frames,
+    vehicle_crops,
+    plate_crops,
+    host_info,
+    git_info
+)
+from benchmarks.synthetic import SyntheticTraffic
+from utils.config import TUNING_PROFILE_FILE
+from utils.tuning import TuningProfile, usable_cpus
+
+# Settings this much slower than the fastest still count as fastest
+TOLERANCE = 0.03
+
+BATCH_SIZES = (1, 2, 4, 8, 16)
+
+
+def thread_candidates(cpus: int) -> List[int]:
+    """1, 2, 4, ... and the CPU count itself"""
+    candidates = []
+    threads = 1
+    while threads < cpus:
+        candidates.append(threads)
+        threads *= 2
+    candidates.append(cpus)
+    return candidates
+
+
+def fastest(timings: Dict, candidates: Sequence):
+    """Smallest candidate within TOLERANCE of the best timing, or None"""
+    best = min(timings.values())
+    for candidate in candidates:
+        if timings[candidate] <= best * (1 + TOLERANCE):
+            return candidate
+    return None
+
+
+def sweep(
+    name: str,
+    default,
+    candidates: Sequence[int],
+    set_threads: Callable,
+    run_pass: Callable[[], float]
+) -> Dict:
+    """
+    Time run_pass with the library default and with every thread count
+
+    Leaves the chosen setting applied, so later stages run with it.
+
+    Returns:
+        Timings in µs per unit, and "threads" (None if the library default
+        was clearly faster than every explicit count)
+    """
+    timings = {"default": run_pass()}
+    for threads in candidates:
+        set_threads(threads)
+        timings[threads] = run_pass()
+
+    chosen = fastest(timings, candidates)
+    set_threads(chosen if chosen is not None else default)
+    best = timings[chosen if chosen is not None else "default"]
+    print(
+        f"{name:>18}: " + ", ".join(f"{key}={value:.0f}" for key, value in timings.items())
+        + f" µs → {chosen if chosen is not None else 'default'}"
+    )
+    return {
+        "status": "ok",
+        "timings_us": {str(key): round(value, 1) for key, value in timings.items()},
+        "threads": chosen,
+        "default_threads": default,
+        "speedup_vs_default": round(timings["default"] / best, 3)
+    }
+
+
+# Calibration Stages
+
+def tune_opencv(scene: SyntheticTraffic, args, candidates: List[int]) -> Dict:
+    frames = sample_frames(scene, args.samples)
+    size = (640, 640 * scene.height // scene.width)
+
+    def make_call():
+        def call(frame):
+            small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            cv2.GaussianBlur(gray, (5, 5), 0)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return call
+
+    def run_pass():
+        return measure(make_call, frames, args.repeats)["median_us"]
+
+    return sweep("opencv_threads", cv2.getNumThreads(), candidates, cv2.setNumThreads, run_pass)
+
+
+def tune_torch(scene: SyntheticTraffic, args, candidates: List[int], crops_per_frame: float) -> Dict:
+    vehicle_detector, plate_detector = load_detectors()
+    import torch
+
+    frames = sample_frames(scene, args.samples)
+    crops = vehicle_crops(scene, args.samples)
+
+    def run_pass():
+        # Model cost of one frame: detection plus plate detection per vehicle
+        vehicle_us = measure(lambda: vehicle_detector.detect, frames, args.repeats)["median_us"]
+        plate_us = measure(lambda: plate_detector.detect, crops, args.repeats)["median_us"]
+        return vehicle_us + crops_per_frame * plate_us
+
+    result = sweep("torch_threads", torch.get_num_threads(), candidates, torch.set_num_threads, run_pass)
+    result["vehicle_detect_us"] = round(
+        measure(lambda: vehicle_detector.detect, frames, args.repeats)["median_us"], 1
+    )
+    return result
+
+
+def tune_plate_batch(scene: SyntheticTraffic, args) -> Dict:
+    _, plate_detector = load_detectors()
+    crops = vehicle_crops(scene, max(args.samples, max(BATCH_SIZES)))
+
+    timings = {}
+    for size in BATCH_SIZES:
+        batches = [crops[start:start + size] for start in range(0, len(crops), size)]
+        if size == 1:
+            result = measure(lambda: plate_detector.detect, crops, args.repeats)
+        else:
+            result = measure(lambda: plate_detector.detect_batch, batches, args.repeats)
+            result["median_us"] = result["median_us"] * len(batches) / len(crops)
+        timings[size] = result["median_us"]
+
+    chosen = fastest(timings, BATCH_SIZES)
+    print(
+        f"{'plate_batch_size':>18}: " + ", ".join(f"{key}={value:.0f}" for key, value in timings.items())
+        + f" µs/crop → {chosen}"
+    )
+    return {
+        "status": "ok",
+        "timings_us_per_crop": {str(key): round(value, 1) for key, value in timings.items()},
+        "batch_size": chosen,
+        "plate_detect_us": round(timings[chosen], 1)
+    }
+
+
+def tune_paddle(scene: SyntheticTraffic, args, candidates: List[int]) -> Dict:
+    from ocr.ocr_reader import read_plate_enhanced, set_ocr_threads
+
+    set_ocr_threads(None)
+    load_ocr_engine()
+    crops = plate_crops(scene, args.samples)
+
+    def set_threads(threads):
+        set_ocr_threads(threads)
+        load_ocr_engine()
+
+    def run_pass():
+        return measure(lambda: read_plate_enhanced, crops, args.repeats)["median_us"]
+
+    result = sweep("paddle_threads", None, candidates, set_threads, run_pass)
+    result["ocr_us"] = round(run_pass(), 1)
+    return result
+
+
+def run_stage(name: str, stage: Callable, *stage_args) -> Dict:
+    start = time.perf_counter()
+    try:
+        result = stage(*stage_args)
+    except Skipped as e:
+        result = {"status": "skipped", "reason": str(e)}
+        print(f"{name:>18}: skipped ({e})")
+    result["wall_seconds"] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def throughput(scene: SyntheticTraffic, results: Dict, crops_per_frame: float) -> Optional[Dict]:
+    """Frames per second of the tuned models and the FRAME_SKIP to keep up"""
+    torch_result, batch_result, ocr_result = results["torch"], results["plate_batch"], results["paddle"]
+    if torch_result["status"] != "ok" or batch_result["status"] != "ok":
+        return None
+
+    # A plate is read once per vehicle; a new vehicle enters every vehicle_interval frames
+    ocr_us = ocr_result.get("ocr_us", 0.0) / scene.vehicle_interval
+    frame_us = torch_result["vehicle_detect_us"] + crops_per_frame * batch_result["plate_detect_us"] + ocr_us
+    max_fps = 1e6 / frame_us
+    return {
+        "model_us_per_frame": round(frame_us, 1),
+        "max_processed_fps": round(max_fps, 2),
+        "camera_fps": scene.fps,
+        # frame_skip=N processes every (N+1)-th frame
+        "suggested_frame_skip": max(0, math.ceil(scene.fps / max_fps) - 1)
+    }
+
+
+def run_tuning(args) -> TuningProfile:
+    scene = SyntheticTraffic(
+        width=args.width,
+        height=args.height,
+        fps=args.fps,
+        lanes=args.lanes,
+        vehicle_interval=args.vehicle_interval,
+        vehicle_size=(args.vehicle_width, args.vehicle_height),
+        draw_plates=True
+    )
+    cpus = usable_cpus()
+    candidates = thread_candidates(args.max_threads or cpus)
+    # Upper bound: plate detection repeats only until the plate is read
+    crops_per_frame = statistics.mean(
+        sum(1 for _ in scene.vehicles_at(frame_id)) for frame_id in range(1, args.frames + 1)
+    )
+    print(f"{cpus} usable CPUs, thread candidates {candidates}, {crops_per_frame:.2f} vehicles per frame")
+
+    results = {
+        "opencv": run_stage("opencv_threads", tune_opencv, scene, args, candidates),
+        "torch": run_stage("torch_threads", tune_torch, scene, args, candidates, crops_per_frame),
+        "plate_batch": run_stage("plate_batch_size", tune_plate_batch, scene, args),
+        "paddle": run_stage("paddle_threads", tune_paddle, scene, args, candidates)
+    }
+    estimate = throughput(scene, results, crops_per_frame)
+
+    return TuningProfile(
+        torch_threads=results["torch"].get("threads"),
+        opencv_threads=results["opencv"].get("threads"),
+        paddle_threads=results["paddle"].get("threads"),
+        plate_batch_size=results["plate_batch"].get("batch_size", 1),
+        measurements={
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git": git_info(),
+            "host": host_info(),
+            "parameters": {
+                "scene": {
+                    "width": scene.width,
+                    "height": scene.height,
+                    "fps": scene.fps,
+                    "lanes": scene.lanes,
+                    "vehicle_interval": scene.vehicle_interval,
+                    "vehicle_size": list(scene.vehicle_size)
+                },
+                "samples": args.samples,
+                "repeats": args.repeats,
+                "tolerance": TOLERANCE
+            },
+            "results": results,
+            "throughput": estimate
+        }
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=TUNING_PROFILE_FILE, help="Profile file (default: TUNING_PROFILE_FILE)")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, do not write the profile")
+    parser.add_argument("--max-threads", type=int, help="Largest thread count tried (default: usable CPUs)")
+
+    scene = parser.add_argument_group("synthetic scene (match the cameras)")
+    scene.add_argument("--width", type=int, default=1280)
+    scene.add_argument("--height", type=int, default=720)
+    scene.add_argument("--fps", type=float, default=30.0)
+    scene.add_argument("--lanes", type=int, default=3)
+    scene.add_argument("--vehicle-interval", type=int, default=20, help="Frames between new vehicles")
+    scene.add_argument("--vehicle-width", type=int, default=160)
+    scene.add_argument("--vehicle-height", type=int, default=80)
+    scene.add_argument("--frames", type=int, default=600, help="Frames over which vehicles per frame are counted")
+
+    runs = parser.add_argument_group("repetitions")
+    runs.add_argument("--samples", type=int, default=10, help="Inputs per calibration pass")
+    runs.add_argument("--repeats", type=int, default=3, help="Repeats per setting")
+    args = parser.parse_args(argv)
+
+    if not args.output and not args.dry_run:
+        parser.error("--output is required when TUNING_PROFILE_FILE is empty")
+
+    profile = run_tuning(args)
+    print(f"Tuned settings: {profile.settings()}")
+
+    estimate = profile.measurements["throughput"]
+    if estimate is not None:
+        print(
+            f"Models: {estimate['max_processed_fps']} frames/s → "
+            f"FRAME_SKIP={estimate['suggested_frame_skip']} keeps up with {estimate['camera_fps']} fps"
+        )
+
+    if args.dry_run:
+        return
+    profile.save(args.output)
+    print(f"Profile written to {args.output} (applied at the next service start)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from ultralytics import YOLO
-from utils.config import PLATE_MODEL_PATH
+from utils.config import PLATE_MODEL_PATH, PLATE_CONFIDENCE
 import torch
 
 class PlateDetector:
@@ -12,25 +12,37 @@ class PlateDetector:
         self.model = YOLO(PLATE_MODEL_PATH) # load YOLO model for plate detection
         self.model.to("cpu")
 
-    def detect(self, vehicle_crop):
+    def detect(self, vehicle_crop, conf=PLATE_CONFIDENCE):
         results = self.model(
             vehicle_crop, # source vehicle image
-            conf=0.25, # confidence threshold
+            conf=conf, # confidence threshold
             verbose=False # disable verbose output
         )
 
-        result = results[0] # first (and only) image
+        return best_plate_box(results[0]) # first (and only) image
 
-        boxes = result.boxes # all detected boxes
+    def detect_batch(self, vehicle_crops, conf=PLATE_CONFIDENCE):
+        # one forward pass over several vehicle crops (one box or None per crop)
+        results = self.model(
+            list(vehicle_crops), # source vehicle images
+            conf=conf, # confidence threshold
+            verbose=False # disable verbose output
+        )
+
+        return [best_plate_box(result) for result in results]
+
+
+def best_plate_box(result):
+    boxes = result.boxes # all detected boxes
+
+    # no boxes detected
+    if len(boxes) == 0:
+        return None
 
-        # no boxes detected
-        if len(result.boxes) == 0:
-            return None
-        
-        # select box with highest confidence
-        best_box = max(boxes, key=lambda b: float(b.conf))
+    # select box with highest confidence
+    best_box = max(boxes, key=lambda b: float(b.conf))
 
-        # extract box coordinates
-        x1, y1, x2, y2 = best_box.xyxy[0].cpu().tolist()
+    # extract box coordinates
+    x1, y1, x2, y2 = best_box.xyxy[0].cpu().tolist()
 
-        return (int(x1), int(y1), int(x2), int(y2))
\ No newline at end of file
+    return (int(x1), int(y1), int(x2), int(y2))
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""
+Stand-in detectors and OCR engine for running the service without models
+
+Enabled with STUB_DETECTORS=true (load testing, CI, local development).
+Vehicles are found as bright boxes and plates as white patches
+(detectors.synthetic_detectors), which matches the synthetic videos
+generated by benchmarks.synthetic. Each inference call can sleep for
+STUB_INFERENCE_MS to approximate the cost of the real models.
+"""
+import time
+import zlib
+
+from detectors.synthetic_detectors import ContourVehicleDetector, SyntheticPlateDetector
+
+
+def _simulate_inference(delay_ms: float):
+    if delay_ms > 0:
+        time.sleep(delay_ms / 1000)
+
+
+class StubVehicleDetector(ContourVehicleDetector):
+    def __init__(self, delay_ms: float = 0.0):
+        super().__init__()
+        self.delay_ms = delay_ms
+
+    def detect(self, frame, conf=None):
+        _simulate_inference(self.delay_ms)
+        return super().detect(frame, conf)
+
+
+class StubPlateDetector(SyntheticPlateDetector):
+    def __init__(self, delay_ms: float = 0.0):
+        super().__init__()
+        self.delay_ms = delay_ms
+
+    def detect(self, vehicle_crop, conf=None):
+        _simulate_inference(self.delay_ms)
+        return super().detect(vehicle_crop, conf)
+
+    def detect_batch(self, vehicle_crops, conf=None):
+        # One simulated call per batch, like a batched forward pass
+        _simulate_inference(self.delay_ms)
+        return [SyntheticPlateDetector.detect(self, crop, conf) for crop in vehicle_crops]
+
+
+class StubOCREngine:
+    """
+    Mimics PaddleOCR.ocr() output
+
+    The text is derived from the image content, so a given plate crop
+    always reads the same valid plate number.
+    """
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay_ms = delay_ms
+
+    def ocr(self, image, cls=True):
+        _simulate_inference(self.delay_ms)
+        h, w = image.shape[:2]
+        checksum = zlib.crc32(image.tobytes())
+        text = f"{checksum % 999 + 1}TUN{checksum % 9999 + 1}"
+        box = [[0, 0], [w, 0], [w, h], [0, h]]
+        return [[[box, (text, 0.95)]]]
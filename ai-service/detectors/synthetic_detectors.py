@@ -0,0 +1,62 @@
+"""
+Lightweight stand-in detectors for synthetic traffic
+
+Match the scenes generated by benchmarks.synthetic: vehicles are bright
+boxes on a dark road and plates white patches inside them, so both are
+found with a threshold instead of a model. Used by the benchmarks and, as
+the base of the stub detectors, by STUB_DETECTORS=true.
+"""
+import cv2
+
+
+class ContourVehicleDetector:
+    """Stand-in for VehicleDetector that finds bright boxes"""
+
+    def __init__(self, threshold: int = 200, min_area: int = 100):
+        self.threshold = threshold
+        self.min_area = min_area
+
+    def detect(self, frame, conf=None):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        rects = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h >= self.min_area:
+                rects.append((x, y, x + w, y + h))
+        return rects
+
+
+class NoPlateDetector:
+    """Stand-in for PlateDetector that never finds a plate (no OCR is run)"""
+
+    def detect(self, vehicle_crop, conf=None):
+        return None
+
+    def detect_batch(self, vehicle_crops, conf=None):
+        return [None] * len(vehicle_crops)
+
+
+class SyntheticPlateDetector:
+    """Stand-in for PlateDetector that finds the white plate of a synthetic vehicle"""
+
+    def __init__(self, threshold: int = 245, min_area: int = 40):
+        self.threshold = threshold
+        self.min_area = min_area
+
+    def detect(self, vehicle_crop, conf=None):
+        gray = cv2.cvtColor(vehicle_crop, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+
+        x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+        if w * h < self.min_area:
+            return None
+        return x, y, x + w, y + h
+
+    def detect_batch(self, vehicle_crops, conf=None):
+        return [self.detect(crop, conf) for crop in vehicle_crops]
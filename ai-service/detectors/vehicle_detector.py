@@ -1,5 +1,5 @@
 from ultralytics import YOLO
-from utils.config import VEHICLE_MODEL_PATH
+from utils.config import VEHICLE_MODEL_PATH, VEHICLE_CONFIDENCE
 import torch
 
 # vehicle class IDs based on COCO dataset
@@ -15,11 +15,11 @@ class VehicleDetector:
         self.model = YOLO(VEHICLE_MODEL_PATH) # load YOLO model
         self.model.to("cpu") # move model to CPU
 
-    def detect(self, frame):
+    def detect(self, frame, conf=VEHICLE_CONFIDENCE):
         results = self.model(
             frame , # source image
             classes=VEHICLE_CLASSES, # filter only vehicle classes
-            conf=0.35, # confidence threshold
+            conf=conf, # confidence threshold
             verbose=False # disable verbose output
         ) # get detections
 
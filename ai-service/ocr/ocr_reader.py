@@ -1,15 +1,56 @@
 import cv2
 import re
-from paddleocr import PaddleOCR
 from typing import Optional, Dict, List, Tuple
 
-# Initialize PaddleOCR
-paddle_ocr = PaddleOCR(
-    use_angle_cls=True,
-    lang='en',
-    show_log=False,
-    gpu=False
-)
+from utils.metrics import OCR_CALLS, OCR_PASS_SECONDS, timed
+
+# PaddleOCR engine, created on first use (see get_ocr_engine)
+paddle_ocr = None
+# CPU threads of the engine (None = PaddleOCR default), see set_ocr_threads
+ocr_threads = None
+
+
+def get_ocr_engine():
+    """
+    Return the shared PaddleOCR engine, initializing it on first call
+
+    Initialization is deferred so that modules using only the plate
+    validation helpers (or pipelines that never reach OCR) do not pay for
+    loading PaddleOCR. The service calls this at startup.
+    """
+    global paddle_ocr
+    if paddle_ocr is None:
+        from paddleocr import PaddleOCR
+
+        options = {} if ocr_threads is None else {"cpu_threads": ocr_threads}
+        paddle_ocr = PaddleOCR(
+            use_angle_cls=True,
+            lang='en',
+            show_log=False,
+            gpu=False,
+            **options
+        )
+    return paddle_ocr
+
+
+def set_ocr_threads(threads: Optional[int]):
+    """
+    Set the CPU threads of the PaddleOCR engine
+
+    Takes effect when the engine is created, so the current engine (if any)
+    is dropped and rebuilt on the next get_ocr_engine() call.
+    """
+    global paddle_ocr, ocr_threads
+    if threads != ocr_threads:
+        ocr_threads = threads
+        paddle_ocr = None
+
+
+def set_ocr_engine(engine):
+    """Replace the OCR engine (any object with PaddleOCR's ocr() signature)"""
+    global paddle_ocr
+    paddle_ocr = engine
+
 
 # Plate patterns (adjust for actual format)
 PLATE_PATTERNS = [
@@ -70,9 +111,21 @@ class OCRResult:
         
         if self.errors:
             result["validation_errors"] = self.errors
-        
+
         return result
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> "OCRResult":
+        """Rebuild a result from the output of to_dict()"""
+        return cls(
+            plate_number=data.get("plate_number"),
+            raw_text=data.get("raw_ocr_text", ""),
+            confidence=float(data.get("confidence", 0.0)),
+            validated=bool(data.get("validated", False)),
+            corrections=data.get("corrections_applied"),
+            errors=data.get("validation_errors")
+        )
+
 
 def read_plate_enhanced(p_crop, min_confidence: float = 0.5) -> OCRResult:
     """
@@ -99,7 +152,7 @@ def read_plate_enhanced(p_crop, min_confidence: float = 0.5) -> OCRResult:
     plate_rgb = cv2.cvtColor(p_crop, cv2.COLOR_BGR2RGB)
     
     # Run OCR
-    results = paddle_ocr.ocr(plate_rgb, cls=True)
+    results = get_ocr_engine().ocr(plate_rgb, cls=True)
     
     if not results or not results[0] or len(results[0]) == 0:
         return OCRResult(
@@ -239,6 +292,13 @@ def validate_plate_format(text: str) -> Tuple[bool, Optional[str]]:
     return False, None
 
 
+def timed_read_plate(p_crop, pass_name: str, min_confidence: float = 0.5) -> OCRResult:
+    """read_plate_enhanced, recorded as one OCR pass in the service metrics"""
+    OCR_CALLS.inc(**{"pass": pass_name})
+    with timed(OCR_PASS_SECONDS, span=f"ocr_{pass_name}", **{"pass": pass_name}):
+        return read_plate_enhanced(p_crop, min_confidence)
+
+
 def multi_pass_ocr(p_crop, max_attempts: int = 3) -> OCRResult:
     """
     Perform multiple OCR passes with different preprocessing
@@ -257,7 +317,7 @@ def multi_pass_ocr(p_crop, max_attempts: int = 3) -> OCRResult:
     results = []
     
     # Pass 1: Original image
-    result1 = read_plate_enhanced(p_crop)
+    result1 = timed_read_plate(p_crop, "original")
     results.append(result1)
     
     if result1.validated and result1.confidence > 0.85:
@@ -266,13 +326,13 @@ def multi_pass_ocr(p_crop, max_attempts: int = 3) -> OCRResult:
     # Pass 2: Contrast enhancement
     if max_attempts >= 2:
         enhanced = enhance_contrast(p_crop)
-        result2 = read_plate_enhanced(enhanced)
+        result2 = timed_read_plate(enhanced, "contrast")
         results.append(result2)
     
     # Pass 3: Sharpening
     if max_attempts >= 3:
         sharpened = sharpen_image(p_crop)
-        result3 = read_plate_enhanced(sharpened)
+        result3 = timed_read_plate(sharpened, "sharpen")
         results.append(result3)
     
     # Return best result (prioritize validated, then confidence)
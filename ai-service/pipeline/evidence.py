@@ -0,0 +1,287 @@
+"""
+Violation evidence written in the same pass as the analysis
+
+When a vehicle's plate is read, the frame is JPEG-encoded and kept with the
+vehicle box until the track ends, together with the next processed frames
+the vehicle appears in (EVIDENCE_FRAMES_PER_VEHICLE in all). Frames before
+the read are not kept: that would mean encoding every frame of every track
+in case it ends up a violation. Only a bounded number of frames
+(EVIDENCE_BUFFER_FRAMES, oldest vehicles dropped first) is held at a time.
+If the finalized track is a violation, the frames are annotated with the
+box, plate and speed and written as snapshots (the plate read first, then
+v_001_2.jpg, v_001_3.jpg, ...); otherwise they are dropped. Optionally
+(EVIDENCE_CLIPS) ffmpeg cuts a clip of the track from the source file by
+stream copy, so nothing is re-encoded; the clip starts at the keyframe
+before the track. Clips are cut on a background thread so ffmpeg does not
+stall the frame loop: the record links the clip right away, the file
+appears once it is cut, and close() waits for the outstanding clips (call
+it before the source file is removed). A clip that fails is logged and its
+link returns 404.
+
+Files are stored under EVIDENCE_DIR/<evidence_id>/ and referenced from the
+violation record:
+    "evidence": {"snapshot": "/api/evidence/<evidence_id>/v_001.jpg",
+                 "frames": ["/api/evidence/<evidence_id>/v_001_2.jpg", ...],
+                 "clip": "/api/evidence/<evidence_id>/v_001.mp4"}
+
+The whole directory is bounded by EVIDENCE_MAX_MB: after each violation
+the oldest files (of any analysis or stream) are deleted beyond it.
+"""
+import logging
+import re
+import shutil
+import subprocess
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.config import (
+    ALLOWED_EXT,
+    EVIDENCE_BUFFER_FRAMES,
+    EVIDENCE_FRAMES_PER_VEHICLE,
+    EVIDENCE_JPEG_QUALITY,
+    EVIDENCE_CLIPS,
+    EVIDENCE_CLIP_PADDING_SECONDS,
+    EVIDENCE_MAX_MB,
+    FFMPEG_PATH
+)
+
+logger = logging.getLogger("ai-service")
+
+EVIDENCE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# Clips keep the container of the source; any accepted video type can be served
+CLIP_SUFFIXES = tuple(ext.lower() for ext in ALLOWED_EXT)
+EVIDENCE_FILE_PATTERN = re.compile(
+    r"^v_\d+(_\d+)?(\.jpg|" + "|".join(re.escape(suffix) for suffix in CLIP_SUFFIXES) + r")$"
+)
+CLIP_TIMEOUT_SECONDS = 60
+
+BOX_COLOR = (0, 0, 255)
+TEXT_COLOR = (255, 255, 255)
+
+
+def evidence_path(directory: str, evidence_id: str, name: str) -> Optional[Path]:
+    """Path of a stored evidence file, or None if the name is malformed or unknown"""
+    if not EVIDENCE_ID_PATTERN.match(evidence_id) or not EVIDENCE_FILE_PATTERN.match(name):
+        return None
+    path = Path(directory) / evidence_id / name
+    return path if path.is_file() else None
+
+
+def prune_evidence(directory: str, max_bytes: int):
+    """Delete the oldest evidence files until the directory holds at most max_bytes"""
+    files = []
+    try:
+        for path in Path(directory).glob("*/*"):
+            if EVIDENCE_ID_PATTERN.match(path.parent.name) and EVIDENCE_FILE_PATTERN.match(path.name):
+                stat = path.stat()
+                files.append((stat.st_mtime, stat.st_size, path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        # Drop the evidence directory with its last file
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+
+
+def annotate(frame: np.ndarray, bbox: Tuple[int, int, int, int], lines) -> np.ndarray:
+    """Draw the vehicle box with a caption above it and a footer line"""
+    x1, y1, x2, y2 = bbox
+    thickness = max(2, frame.shape[1] // 640)
+    scale = max(0.5, frame.shape[1] / 1600)
+    cv2.rectangle(frame, (x1, y1), (x2, y2), BOX_COLOR, thickness)
+
+    caption, footer = lines
+    (width, height), baseline = cv2.getTextSize(caption, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    top = max(0, y1 - height - baseline - 4)
+    cv2.rectangle(frame, (x1, top), (x1 + width + 4, top + height + baseline + 4), BOX_COLOR, -1)
+    cv2.putText(frame, caption, (x1 + 2, top + height + 2), cv2.FONT_HERSHEY_SIMPLEX, scale, TEXT_COLOR, thickness)
+
+    (width, height), baseline = cv2.getTextSize(footer, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    bottom = frame.shape[0] - baseline - 4
+    cv2.rectangle(frame, (0, bottom - height - 4), (width + 8, frame.shape[0]), (0, 0, 0), -1)
+    cv2.putText(frame, footer, (4, bottom), cv2.FONT_HERSHEY_SIMPLEX, scale, TEXT_COLOR, thickness)
+    return frame
+
+
+def cut_clip(source: str, start: float, duration: float, output: Path) -> Optional[str]:
+    """
+    Copy part of a video into a new file without re-encoding
+
+    Returns:
+        None on success, otherwise the ffmpeg error
+    """
+    command = [
+        FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-y",
+        "-ss", f"{start:.3f}", "-i", source, "-t", f"{duration:.3f}",
+        "-map", "0:v", "-c", "copy", "-avoid_negative_ts", "make_zero",
+        str(output)
+    ]
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=CLIP_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return str(e)
+    if completed.returncode != 0:
+        return completed.stderr.decode(errors="replace").strip() or f"exit code {completed.returncode}"
+    return None
+
+
+class EvidenceRecorder:
+    """
+    Snapshot (and clip) of every violation of one analysis
+
+    Call capture() when a vehicle's plate is read, follow() on every
+    processed frame, finish() when a track is finalized and close() after
+    the last frame. Not thread-safe; one recorder per pipeline.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fps: float,
+        source_path: Optional[str] = None,
+        max_frames: int = EVIDENCE_BUFFER_FRAMES,
+        frames_per_vehicle: int = EVIDENCE_FRAMES_PER_VEHICLE,
+        clips: bool = EVIDENCE_CLIPS,
+        correlation_id: str = "-",
+        max_bytes: int = EVIDENCE_MAX_MB * 1024 * 1024
+    ):
+        self.evidence_id = uuid.uuid4().hex
+        self.root = directory
+        self.directory = Path(directory) / self.evidence_id
+        self.fps = fps
+        self.source_path = source_path
+        self.max_frames = max_frames
+        self.frames_per_vehicle = frames_per_vehicle
+        self.max_bytes = max_bytes
+        self.correlation_id = correlation_id
+
+        self.clips = clips and source_path is not None
+        if self.clips and shutil.which(FFMPEG_PATH) is None:
+            logger.warning("[%s] ffmpeg not found (%s), evidence clips disabled", correlation_id, FFMPEG_PATH)
+            self.clips = False
+
+        self._clip_worker = None
+        self._clip_jobs = []
+
+        # vehicle_id -> (frame_id, JPEG bytes, vehicle box) from the plate read on, oldest vehicle first
+        self._frames: "OrderedDict[int, Deque[Tuple[int, np.ndarray, Tuple]]]" = OrderedDict()
+        self._held = 0
+        self.snapshots_written = 0
+        self.clips_written = 0
+        self.frames_dropped = 0
+
+    @property
+    def url_prefix(self) -> str:
+        return f"/api/evidence/{self.evidence_id}"
+
+    def _encode(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_JPEG_QUALITY])
+        return jpeg if ok else None
+
+    def _drop(self, vehicle_id: int) -> Optional[Deque]:
+        frames = self._frames.pop(vehicle_id, None)
+        if frames is not None:
+            self._held -= len(frames)
+        return frames
+
+    def capture(self, vehicle_id: int, frame_id: int, frame: np.ndarray, bbox: Tuple[int, int, int, int]):
+        """Keep the frame in which the vehicle's plate was read"""
+        jpeg = self._encode(frame)
+        if jpeg is None:
+            return
+        self._drop(vehicle_id)
+        self._frames[vehicle_id] = deque([(frame_id, jpeg, bbox)], maxlen=self.frames_per_vehicle)
+        self._held += 1
+        self._evict()
+
+    def follow(self, frame_id: int, frame: np.ndarray, vehicles: Dict[int, Tuple[int, int, int, int]]):
+        """Keep this frame for the vehicles whose plate was read and that still need frames"""
+        jpeg = None
+        for vehicle_id, frames in self._frames.items():
+            bbox = vehicles.get(vehicle_id)
+            if bbox is None or len(frames) == frames.maxlen or frames[-1][0] >= frame_id:
+                continue
+            if jpeg is None:
+                # Encoded once, shared by every vehicle in the frame
+                jpeg = self._encode(frame)
+                if jpeg is None:
+                    return
+            frames.append((frame_id, jpeg, bbox))
+            self._held += 1
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest vehicles while more than max_frames frames are held"""
+        while self._held > self.max_frames:
+            self.frames_dropped += len(self._drop(next(iter(self._frames))))
+
+    def finish(self, vehicle_id: int, vehicle_record: Dict, violation: Optional[Dict]):
+        """Write the evidence of a violation and reference it from the record"""
+        captured = self._drop(vehicle_id)
+        if violation is None:
+            return
+
+        evidence = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = violation["violation_id"]
+
+        for index, (frame_id, jpeg, bbox) in enumerate(captured or ()):
+            frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            annotate(frame, bbox, (
+                f"{violation['plate_number']}  {violation['speed_kmh']:.1f} km/h",
+                f"limit {violation['speed_limit_kmh']:g} km/h | frame {frame_id} | t={frame_id / self.fps:.2f}s"
+            ))
+            file_name = f"{name}.jpg" if index == 0 else f"{name}_{index + 1}.jpg"
+            cv2.imwrite(str(self.directory / file_name), frame, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_JPEG_QUALITY])
+            if index == 0:
+                evidence["snapshot"] = f"{self.url_prefix}/{file_name}"
+            else:
+                evidence.setdefault("frames", []).append(f"{self.url_prefix}/{file_name}")
+            self.snapshots_written += 1
+
+        if self.clips:
+            tracking = vehicle_record["tracking_info"]
+            start = max(0.0, tracking["first_frame"] / self.fps - EVIDENCE_CLIP_PADDING_SECONDS)
+            end = tracking["last_frame"] / self.fps + EVIDENCE_CLIP_PADDING_SECONDS
+            # Stream copy into Matroska (holds any codec) if the source type cannot be served
+            suffix = Path(self.source_path).suffix.lower()
+            clip_name = f"{name}{suffix if suffix in CLIP_SUFFIXES else '.mkv'}"
+            if self._clip_worker is None:
+                self._clip_worker = ThreadPoolExecutor(1, thread_name_prefix="evidence-clips")
+            self._clip_jobs.append(self._clip_worker.submit(self._cut_clip, start, end - start, clip_name))
+            evidence["clip"] = f"{self.url_prefix}/{clip_name}"
+
+        if evidence:
+            violation["evidence"] = evidence
+            prune_evidence(self.root, self.max_bytes)
+
+    def _cut_clip(self, start: float, duration: float, clip_name: str):
+        error = cut_clip(self.source_path, start, duration, self.directory / clip_name)
+        if error is None:
+            self.clips_written += 1
+        else:
+            logger.warning("[%s] Evidence clip %s failed: %s", self.correlation_id, clip_name, error)
+
+    def close(self):
+        """Wait for the clips still being cut"""
+        if self._clip_worker is None:
+            return
+        for job in self._clip_jobs:
+            job.result()
+        self._clip_jobs.clear()
+        self._clip_worker.shutdown()
+        self._clip_worker = None
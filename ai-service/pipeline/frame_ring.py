@@ -0,0 +1,288 @@
+"""
+Shared-memory frame transport between processes
+
+Pickling a 1080p frame (6 MB) through a multiprocessing queue costs far
+more than decoding it. A FrameRing instead preallocates a fixed number of
+frame slots in one multiprocessing.shared_memory block; processes exchange
+small FrameHandle tuples (slot index + frame number) and map the slot as a
+numpy array. The decoder writes straight into the slot (cv2 retrieve with
+an output array), detection reads the same memory, and crops taken with
+utils.pre_process.safe_crop are views into it, so a frame is never copied
+on its way through the pipeline.
+
+Memory is capped at slots x frame size: when every slot is in use the
+producer blocks until a consumer releases one. A handle has a single
+owner at a time; whoever holds it last releases the slot.
+"""
+import logging
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from pipeline.processor import select_frames
+from utils.config import DECODE_RING_SLOTS, FRAME_SKIP
+from utils.metrics import stage_timer
+
+logger = logging.getLogger("ai-service")
+
+# Child processes are spawned: forking the service would copy the loaded
+# models and the state of its threads
+mp_context = multiprocessing.get_context("spawn")
+
+ACQUIRE_POLL_SECONDS = 0.5
+# How often the consumer checks that the decoder process is still alive
+HANDLE_POLL_SECONDS = 0.5
+# Slot of the handle marking skipped time (see read_frames)
+GAP_SLOT = -1
+
+
+class FrameHandle(NamedTuple):
+    slot: int
+    frame_id: int
+
+
+class FrameRing:
+    """
+    Fixed pool of shared frame slots
+
+    The ring is created by one process and passed to others as a Process
+    argument; the copy attaches to the same shared memory by name. Only
+    the creating process may unlink() it.
+    """
+
+    def __init__(self, slots: int, shape: Tuple[int, ...], dtype=np.uint8):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * slots)
+        self._owner = True
+        self._free = mp_context.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._map()
+
+    def _map(self):
+        self._frames = np.ndarray((self.slots, *self.shape), dtype=self.dtype, buffer=self._shm.buf)
+
+    def __getstate__(self):
+        return {
+            "name": self._shm.name,
+            "slots": self.slots,
+            "shape": self.shape,
+            "dtype": self.dtype.str,
+            "free": self._free
+        }
+
+    def __setstate__(self, state):
+        self.slots = state["slots"]
+        self.shape = state["shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._owner = False
+        self._free = state["free"]
+        self._map()
+
+    @property
+    def nbytes(self) -> int:
+        return self.frame_bytes * self.slots
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """A free slot, or None if none was released within timeout"""
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot: int):
+        self._free.put(slot)
+
+    def view(self, slot: int) -> np.ndarray:
+        """The slot as an array backed by the shared memory (no copy)"""
+        return self._frames[slot]
+
+    def close(self):
+        """Detach this process; views of the ring must not be used afterwards"""
+        self._frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # A frame view is still referenced; the mapping goes with it
+            logger.warning("Frame ring %s closed while frames were still in use", self._shm.name)
+
+    def unlink(self):
+        """Free the shared memory (creating process only, after every close)"""
+        if self._owner:
+            self._shm.unlink()
+
+
+def decode_to_ring(path: str, ring: FrameRing, handles, stop, frame_skip: int, ranges=None):
+    """
+    Decoder process: decode frames into ring slots and publish their handles
+
+    Frames are selected as in read_frames (numbers start at 1, skipped
+    frames are not decoded); skipped time between ranges is published as a
+    handle with slot -1. The end of the video is signalled with None, a
+    failure with the error message.
+    """
+    cap = cv2.VideoCapture(path)
+    frame = decoded = None
+    try:
+        for frame_id, after_gap, _ in select_frames(cap, frame_skip, ranges):
+            if stop.is_set():
+                break
+            if after_gap:
+                handles.put(FrameHandle(GAP_SLOT, frame_id))
+
+            # Blocks while every slot is in use (bounded memory)
+            slot = None
+            while slot is None and not stop.is_set():
+                slot = ring.acquire(ACQUIRE_POLL_SECONDS)
+            if slot is None:
+                break
+
+            frame = ring.view(slot)
+            ok, decoded = cap.retrieve(frame)
+            if not ok:
+                ring.release(slot)
+                break
+            if decoded is not frame:
+                # OpenCV allocated a new image (unexpected size or format)
+                if decoded.shape != frame.shape:
+                    ring.release(slot)
+                    raise ValueError(f"Frame {frame_id} has shape {decoded.shape}, ring expects {frame.shape}")
+                frame[...] = decoded
+
+            handles.put(FrameHandle(slot, frame_id))
+    except Exception as e:
+        handles.put(f"{type(e).__name__}: {e}")
+    finally:
+        cap.release()
+        frame = decoded = None  # views must be gone before the ring is closed
+        ring.close()
+        handles.put(None)
+
+
+def next_handle(handles, process=None):
+    """
+    Next item published by a decoder process
+
+    Raises:
+        RuntimeError: if the process died without signalling the end
+    """
+    while True:
+        try:
+            return handles.get(timeout=HANDLE_POLL_SECONDS)
+        except queue.Empty:
+            if process is None or process.is_alive():
+                continue
+        # Items flushed before the process exited are still readable
+        try:
+            return handles.get(timeout=HANDLE_POLL_SECONDS)
+        except queue.Empty:
+            raise RuntimeError(f"Decoder process died (exit code {process.exitcode})")
+
+
+def ring_frames(ring: FrameRing, handles, process=None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (frame_id, frame) from a decoder process, like read_frames
+
+    Each frame is a view into its slot and stays valid until the next frame
+    is requested; the slot is released then.
+
+    Raises:
+        RuntimeError: if the decoder failed or its process died
+    """
+    previous = None
+    try:
+        while True:
+            with stage_timer("decode"):
+                item = next_handle(handles, process)
+            if previous is not None:
+                ring.release(previous)
+                previous = None
+
+            if item is None:
+                return
+            if isinstance(item, str):
+                raise RuntimeError(f"Decoder failed: {item}")
+
+            if item.slot == GAP_SLOT:
+                yield item.frame_id, None
+                continue
+
+            previous = item.slot
+            yield item.frame_id, ring.view(item.slot)
+    finally:
+        if previous is not None:
+            ring.release(previous)
+
+
+class ProcessDecoder:
+    """
+    Decode a video file in a separate process into a FrameRing
+
+    Usage:
+        with ProcessDecoder(path) as decoder:
+            for event in pipeline.run(decoder.frames()):
+                ...
+    """
+
+    def __init__(
+        self,
+        path: str,
+        slots: int = DECODE_RING_SLOTS,
+        frame_skip: int = FRAME_SKIP,
+        ranges: Optional[List[Tuple[int, int]]] = None
+    ):
+        self.path = path
+        self.slots = slots
+        self.frame_skip = frame_skip
+        self.ranges = ranges
+        self.ring = None
+        self._handles = None
+        self._stop = None
+        self._process = None
+
+    def __enter__(self) -> "ProcessDecoder":
+        cap = cv2.VideoCapture(self.path)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Cannot read the frame size of {self.path}")
+
+        self.ring = FrameRing(self.slots, (height, width, 3))
+        self._handles = mp_context.Queue()
+        self._stop = mp_context.Event()
+        self._process = mp_context.Process(
+            target=decode_to_ring,
+            args=(self.path, self.ring, self._handles, self._stop, self.frame_skip, self.ranges),
+            name="frame-decoder",
+            daemon=True
+        )
+        self._process.start()
+        logger.debug(
+            "Decoder process %d started: %d slots of %dx%d (%.1f MB)",
+            self._process.pid, self.slots, width, height, self.ring.nbytes / 1024 ** 2
+        )
+        return self
+
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        return ring_frames(self.ring, self._handles, self._process)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._process.join(5)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._handles.cancel_join_thread()
+        self.ring.close()
+        self.ring.unlink()
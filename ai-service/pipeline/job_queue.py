@@ -0,0 +1,266 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from pipeline.model_lock import lock_wait_seconds
+from utils.metrics import JOBS_REJECTED, QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger("ai-service")
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class QueueFull(Exception):
+    """Raised when a job is not admitted; retry_after is in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CostModel:
+    """
+    Processing cost per video frame, learned from finished jobs
+
+    An exponentially weighted moving average of seconds per frame; the
+    first measurement replaces the initial guess.
+    """
+
+    def __init__(self, initial_seconds_per_frame: float, alpha: float = 0.3):
+        self.seconds_per_frame = initial_seconds_per_frame
+        self.alpha = alpha
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, frames: int) -> float:
+        return frames * self.seconds_per_frame
+
+    def update(self, frames: int, seconds: float):
+        if frames <= 0:
+            return
+        observed = seconds / frames
+        with self._lock:
+            if self.samples == 0:
+                self.seconds_per_frame = observed
+            else:
+                self.seconds_per_frame = self.alpha * observed + (1 - self.alpha) * self.seconds_per_frame
+            self.samples += 1
+
+
+class Job:
+    """A queued unit of work; fn(job) runs on a worker thread"""
+
+    def __init__(self, fn: Callable[["Job"], object], frames: int, priority: str, estimated_seconds: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.fn = fn
+        self.frames = frames
+        self.priority = priority
+        self.estimated_seconds = estimated_seconds
+        self.future = Future()
+        self.cancelled = threading.Event()
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.estimated_wait_seconds = 0.0
+
+    def cancel(self) -> bool:
+        """
+        Drop the job if still queued, or ask a running job to stop
+
+        Returns:
+            True if the job was dropped before it started
+        """
+        self.cancelled.set()
+        return self.future.cancel()
+
+    @property
+    def dropped(self) -> bool:
+        """Cancelled through cancel() or directly on the future"""
+        return self.cancelled.is_set() or self.future.cancelled()
+
+    @property
+    def wait_seconds(self) -> float:
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    def remaining_seconds(self, now: float) -> float:
+        if self.started_at is None:
+            return self.estimated_seconds
+        return max(0.0, self.estimated_seconds - (now - self.started_at))
+
+
+class JobQueue:
+    """
+    Bounded priority queue in front of the processing pipeline
+
+    Jobs are admitted while fewer than max_queued jobs are waiting and the
+    estimated backlog (remaining work of running jobs plus queued jobs)
+    stays under max_backlog_seconds; otherwise submit() raises QueueFull
+    with an estimate of when to retry. A job that can start right away (a
+    worker is free) is always admitted, so a single long video is never
+    rejected outright.
+
+    Higher priority jobs run first; jobs of equal priority run in order of
+    arrival.
+    """
+
+    def __init__(self, workers: int, max_queued: int, max_backlog_seconds: float, cost_model: CostModel):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_backlog_seconds = max_backlog_seconds
+        self.cost_model = cost_model
+
+        self._heap = []
+        self._running: Dict[str, Job] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopping = False
+
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _queued(self) -> List[Job]:
+        # Drop cancelled jobs, so they neither count nor pile up in the heap
+        if any(job.dropped for _, _, job in self._heap):
+            self._heap = [entry for entry in self._heap if not entry[2].dropped]
+            heapq.heapify(self._heap)
+        return [job for _, _, job in self._heap]
+
+    def _backlog_seconds(self, now: float) -> float:
+        running = sum(job.remaining_seconds(now) for job in self._running.values())
+        return running + sum(job.estimated_seconds for job in self._queued())
+
+    def submit(self, fn: Callable[[Job], object], frames: int, priority: str = "normal") -> Job:
+        """
+        Queue fn for execution
+
+        Raises:
+            ValueError: if the priority is unknown
+            QueueFull: if the job is not admitted
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Invalid priority '{priority}'. Allowed: {tuple(PRIORITIES)}")
+
+        estimate = self.cost_model.estimate(frames)
+
+        with self._condition:
+            now = time.monotonic()
+            queued = self._queued()
+            backlog = self._backlog_seconds(now)
+
+            # Only a job that has to wait for a worker can be turned away
+            if queued or len(self._running) >= self.workers:
+                reason = None
+                if len(queued) >= self.max_queued:
+                    # Wait for the next running job to finish
+                    running = [job.remaining_seconds(now) for job in self._running.values()]
+                    retry_after = min(running) if running else 1.0
+                    reason = f"{len(queued)} jobs already queued"
+                elif backlog + estimate > self.max_backlog_seconds:
+                    # Wait until the backlog has drained enough for this job
+                    retry_after = (backlog + estimate - self.max_backlog_seconds) / self.workers
+                    reason = f"estimated backlog of {backlog:.0f}s plus {estimate:.0f}s for this video"
+
+                if reason is not None:
+                    self.rejected += 1
+                    JOBS_REJECTED.inc()
+                    raise QueueFull(f"Service at capacity: {reason}", max(1, math.ceil(retry_after)))
+
+            job = Job(fn, frames, priority, estimate)
+            job.estimated_wait_seconds = backlog / self.workers if len(self._running) >= self.workers else 0.0
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._sequence), job))
+            self.admitted += 1
+            self._condition.notify()
+
+        return job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._heap and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+
+                # Jobs cancelled while queued are skipped
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                job.started_at = time.monotonic()
+                self._running[job.id] = job
+
+            QUEUE_WAIT_SECONDS.observe(job.wait_seconds)
+            start = time.perf_counter()
+            waited = lock_wait_seconds()
+            try:
+                result = job.fn(job)
+            except BaseException as e:
+                self.failed += 1
+                job.future.set_exception(e)
+            else:
+                self.completed += 1
+                if not job.cancelled.is_set():
+                    # Waiting for a model another job holds is not the cost of this video
+                    waited = lock_wait_seconds() - waited
+                    self.cost_model.update(job.frames, time.perf_counter() - start - waited)
+                job.future.set_result(result)
+            finally:
+                with self._condition:
+                    self._running.pop(job.id, None)
+
+    def position(self, job: Job) -> Optional[int]:
+        """1-based position of a queued job, or None once it has started"""
+        with self._condition:
+            ordered = sorted(entry for entry in self._heap if not entry[2].dropped)
+        for position, (_, _, queued_job) in enumerate(ordered, start=1):
+            if queued_job is job:
+                return position
+        return None
+
+    def stop(self):
+        """Stop the workers once their current job is done (queued jobs are dropped)"""
+        with self._condition:
+            self._stopping = True
+            for _, _, job in self._heap:
+                job.cancel()
+            self._heap.clear()
+            self._condition.notify_all()
+
+    def stats(self) -> Dict:
+        with self._condition:
+            now = time.monotonic()
+            queued = self._queued()
+            backlog = self._backlog_seconds(now)
+            running = len(self._running)
+
+        return {
+            "workers": self.workers,
+            "running": running,
+            "queued": len(queued),
+            "queued_by_priority": {
+                name: sum(1 for job in queued if job.priority == name) for name in PRIORITIES
+            },
+            "max_queued": self.max_queued,
+            "backlog_seconds": round(backlog, 1),
+            "max_backlog_seconds": self.max_backlog_seconds,
+            "seconds_per_frame": round(self.cost_model.seconds_per_frame, 5),
+            "cost_samples": self.cost_model.samples,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed
+        }
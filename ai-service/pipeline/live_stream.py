@@ -0,0 +1,454 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from fnmatch import fnmatch
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import cv2
+
+from pipeline.evidence import EvidenceRecorder
+from pipeline.processor import VideoPipeline
+from utils.config import (
+    EVIDENCE_DIR,
+    EVIDENCE_ENABLED,
+    LIVE_STREAM_MAX,
+    LIVE_STREAM_QUEUE_SIZE,
+    LIVE_STREAM_MAX_LAG_SECONDS,
+    LIVE_STREAM_RECONNECT_SECONDS,
+    LIVE_STREAM_EVENT_BUFFER,
+    LIVE_STREAM_FILE_ROOT,
+    LIVE_STREAM_ALLOWED_HOSTS,
+    LIVE_STREAM_ERROR_TTL_SECONDS
+)
+from utils.runtime_config import RuntimeConfig
+
+logger = logging.getLogger("ai-service")
+
+NETWORK_SCHEMES = ("rtsp", "rtsps", "rtmp", "http", "https")
+DEFAULT_STREAM_FPS = 25.0
+FILE_POLL_SECONDS = 0.5  # wait before re-reading a growing file that hit EOF
+
+
+def validate_stream_source(source: str) -> Optional[str]:
+    """
+    Check that a stream source is allowed
+
+    Network URLs must point to a host matching LIVE_STREAM_ALLOWED_HOSTS,
+    so the service cannot be made to open arbitrary URLs. Local files and
+    named pipes must live under LIVE_STREAM_FILE_ROOT.
+
+    Returns:
+        An error message, or None if the source is allowed
+    """
+    parsed = urlparse(source)
+    if parsed.scheme.lower() in NETWORK_SCHEMES:
+        if not LIVE_STREAM_ALLOWED_HOSTS:
+            return "Network stream sources are disabled (LIVE_STREAM_ALLOWED_HOSTS is not set)"
+        host = (parsed.hostname or "").lower()
+        if not host or not any(fnmatch(host, pattern) for pattern in LIVE_STREAM_ALLOWED_HOSTS):
+            return f"Stream host not allowed: {host or '(none)'}"
+        return None
+
+    if not LIVE_STREAM_FILE_ROOT:
+        return "Local stream sources are disabled (LIVE_STREAM_FILE_ROOT is not set)"
+
+    root = os.path.realpath(LIVE_STREAM_FILE_ROOT)
+    path = os.path.realpath(source)
+    if os.path.commonpath([root, path]) != root:
+        return f"Local stream sources must be under {LIVE_STREAM_FILE_ROOT}"
+
+    if not os.path.exists(path):
+        return f"Stream source not found: {source}"
+
+    return None
+
+
+class LiveStream:
+    """
+    Continuous detection/tracking/OCR over a live source
+
+    A reader thread decodes frames into a small queue; when processing falls
+    behind, the oldest queued frames are dropped, and frames older than
+    LIVE_STREAM_MAX_LAG_SECONDS are skipped, which bounds the latency.
+    Frame numbers count every frame read from the source, so speeds stay
+    correct when frames are dropped.
+
+    Growing files are re-opened and resumed at the last frame on EOF;
+    network sources and pipes are reconnected after
+    LIVE_STREAM_RECONNECT_SECONDS. Tracks end at a reconnect, so no vehicle
+    is followed (and measured) across the outage.
+
+    The configuration is fixed when the stream starts; restart the stream
+    to apply a changed camera profile.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        source: str,
+        vehicle_detector,
+        plate_detector,
+        config: Optional[RuntimeConfig] = None,
+        camera_id: Optional[str] = None
+    ):
+        self.stream_id = stream_id
+        self.source = source
+        self.config = config or RuntimeConfig()
+        self.camera_id = camera_id
+        self.vehicle_detector = vehicle_detector
+        self.plate_detector = plate_detector
+        self.is_growing_file = os.path.isfile(source)
+
+        self.status = "starting"
+        self.error = None
+        self.fps = None
+        self.started_at = time.time()
+        self.failed_at = None
+
+        self._frames = queue.Queue(maxsize=LIVE_STREAM_QUEUE_SIZE)
+        self._connection = 0  # incremented on every (re)connect of a non-file source
+        self._stop = threading.Event()
+        self._opened = threading.Event()
+
+        # Metrics
+        self.frames_read = 0
+        self.frames_queued = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.vehicles = 0
+        self.violations = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.avg_lag_seconds = 0.0
+
+        # Violation events
+        self.recent_events = deque(maxlen=LIVE_STREAM_EVENT_BUFFER)
+        self._subscribers: List[queue.Queue] = []
+        self._subscribers_lock = threading.Lock()
+
+        self._reader = threading.Thread(target=self._read_loop, name=f"stream-read-{stream_id}", daemon=True)
+        self._processor = threading.Thread(target=self._process_loop, name=f"stream-proc-{stream_id}", daemon=True)
+
+    def start(self):
+        self._reader.start()
+        self._processor.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._opened.set()
+        self._reader.join(timeout)
+        self._processor.join(timeout)
+        self.status = "stopped"
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    # Reader
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+
+        if self.fps is None:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.fps = fps if fps and fps > 0 else DEFAULT_STREAM_FPS
+            self._opened.set()
+
+        # Resume a growing file where the previous read stopped
+        if self.is_growing_file and self.frames_read:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.frames_read)
+
+        return cap
+
+    def _enqueue(self, item: Tuple[int, object, float, int]):
+        while True:
+            try:
+                self._frames.put_nowait(item)
+                self.frames_queued += 1
+                return
+            except queue.Full:
+                pass
+            try:
+                self._frames.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                self.status = "reconnecting"
+                self.reconnects += 1
+                logger.warning("[stream:%s] Cannot open source, retrying", self.stream_id)
+                self._stop.wait(LIVE_STREAM_RECONNECT_SECONDS)
+                continue
+
+            if not self.is_growing_file:
+                self._connection += 1
+            self.status = "running"
+            read_any = False
+            while not self._stop.is_set():
+                if not cap.grab():
+                    break
+                read_any = True
+                self.frames_read += 1
+                frame_id = self.frames_read
+
+                # Frame skipping (skipped frames are not decoded)
+                frame_skip = self.config.frame_skip
+                if frame_skip > 0 and frame_id % (frame_skip + 1) != 0:
+                    continue
+
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                self._enqueue((frame_id, frame, time.monotonic(), self._connection))
+
+            cap.release()
+            if self._stop.is_set():
+                break
+
+            if self.is_growing_file:
+                # EOF on a growing file: wait for more data
+                self.status = "waiting"
+                self._stop.wait(FILE_POLL_SECONDS)
+            else:
+                self.status = "reconnecting"
+                self.reconnects += 1
+                logger.warning(
+                    "[stream:%s] Source ended%s, reconnecting",
+                    self.stream_id, "" if read_any else " without frames"
+                )
+                self._stop.wait(LIVE_STREAM_RECONNECT_SECONDS)
+
+    # Processor
+
+    def _iter_frames(self) -> Iterator[Tuple[int, Optional[object]]]:
+        """
+        Yield the frames to process, dropping the ones that lag too far
+
+        After a reconnect, (frame_id, None) comes first, so VideoPipeline
+        ends the tracks of the previous connection.
+        """
+        previous_capture = None
+        connection = None
+        while not self._stop.is_set():
+            try:
+                frame_id, frame, captured_at, frame_connection = self._frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if connection is not None and frame_connection != connection:
+                yield frame_id, None
+            connection = frame_connection
+
+            now = time.monotonic()
+
+            # End-to-end lag of the frame processed last
+            if previous_capture is not None:
+                self._record_lag(now - previous_capture)
+                previous_capture = None
+
+            if now - captured_at > LIVE_STREAM_MAX_LAG_SECONDS:
+                self.frames_dropped += 1
+                continue
+
+            previous_capture = captured_at
+            self.frames_processed += 1
+            yield frame_id, frame
+
+    def _record_lag(self, lag: float):
+        self.last_lag_seconds = lag
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        self.avg_lag_seconds = 0.9 * self.avg_lag_seconds + 0.1 * lag if self.avg_lag_seconds else lag
+
+    def _process_loop(self):
+        self._opened.wait()
+        if self._stop.is_set():
+            return
+
+        # Snapshots only: there is no file to cut clips from
+        evidence = None
+        if EVIDENCE_ENABLED:
+            evidence = EvidenceRecorder(EVIDENCE_DIR, self.fps, correlation_id=f"stream:{self.stream_id}")
+
+        pipeline = VideoPipeline(
+            self.vehicle_detector,
+            self.plate_detector,
+            self.fps,
+            total_frames=0,
+            correlation_id=f"stream:{self.stream_id}",
+            config=self.config,
+            evidence=evidence
+        )
+
+        try:
+            for event in pipeline.run(self._iter_frames()):
+                if event["event"] != "vehicle":
+                    continue
+                self.vehicles += 1
+                if event["violation"] is not None:
+                    self.violations += 1
+                    self._publish({
+                        "event": "violation",
+                        "stream_id": self.stream_id,
+                        "detected_at": time.time(),
+                        "violation": event["violation"],
+                        "vehicle": event["vehicle"]
+                    })
+        except Exception as e:
+            logger.exception("[stream:%s] Processing failed", self.stream_id)
+            self.error = str(e)
+            self.status = "error"
+            self.failed_at = time.time()
+            self._stop.set()
+
+    # Events
+
+    def _publish(self, event: Dict):
+        self.recent_events.append(event)
+        with self._subscribers_lock:
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    pass  # slow consumer, drop the event for this subscriber
+
+    def subscribe(self) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=LIVE_STREAM_EVENT_BUFFER)
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def metrics(self) -> Dict:
+        uptime = time.time() - self.started_at
+        return {
+            "stream_id": self.stream_id,
+            "source": self.source,
+            "camera_id": self.camera_id,
+            "status": self.status,
+            "error": self.error,
+            "fps": self.fps,
+            "uptime_seconds": round(uptime, 1),
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "queue_depth": self._frames.qsize(),
+            "processing_fps": round(self.frames_processed / uptime, 2) if uptime > 0 else 0.0,
+            "lag_seconds": {
+                "last": round(self.last_lag_seconds, 3),
+                "average": round(self.avg_lag_seconds, 3),
+                "max": round(self.max_lag_seconds, 3)
+            },
+            "reconnects": self.reconnects,
+            "vehicles_tracked": self.vehicles,
+            "violations_detected": self.violations
+        }
+
+
+class LiveStreamManager:
+    """
+    Registry of running live streams
+
+    Streams that failed stay listed for error_ttl seconds, so the error can
+    be inspected, and are then dropped.
+    """
+
+    def __init__(
+        self,
+        load_detectors: Callable[[], Tuple],
+        max_streams: int = LIVE_STREAM_MAX,
+        error_ttl: float = LIVE_STREAM_ERROR_TTL_SECONDS
+    ):
+        self.load_detectors = load_detectors
+        self._detectors = None
+        self.max_streams = max_streams
+        self.error_ttl = error_ttl
+        self._streams: Dict[str, LiveStream] = {}
+        self._lock = threading.Lock()
+
+    def _evict_failed(self):
+        """Drop failed streams older than error_ttl (call with the lock held)"""
+        cutoff = time.time() - self.error_ttl
+        for stream_id, stream in list(self._streams.items()):
+            if stream.failed_at is not None and stream.failed_at <= cutoff:
+                del self._streams[stream_id]
+                logger.info("[stream:%s] Failed stream removed (%s)", stream_id, stream.error)
+
+    def start(
+        self,
+        source: str,
+        stream_id: Optional[str] = None,
+        config: Optional[RuntimeConfig] = None,
+        camera_id: Optional[str] = None
+    ) -> LiveStream:
+        """
+        Start processing a source
+
+        Raises:
+            ValueError: if the source is not allowed, the ID is taken or
+                the stream limit is reached
+        """
+        error = validate_stream_source(source)
+        if error:
+            raise ValueError(error)
+
+        stream_id = stream_id or uuid.uuid4().hex[:12]
+
+        with self._lock:
+            self._evict_failed()
+            if stream_id in self._streams and self._streams[stream_id].running:
+                raise ValueError(f"Stream already running: {stream_id}")
+            active = sum(1 for s in self._streams.values() if s.running)
+            if active >= self.max_streams:
+                raise ValueError(f"Too many live streams (max {self.max_streams})")
+
+            # Every stream shares one pair of detectors, separate from the
+            # uploads' (loaded on the first start): streams do not wait for
+            # uploads, but do wait for each other
+            if self._detectors is None:
+                self._detectors = self.load_detectors()
+            vehicle_detector, plate_detector = self._detectors
+            stream = LiveStream(stream_id, source, vehicle_detector, plate_detector, config, camera_id)
+            self._streams[stream_id] = stream
+
+        stream.start()
+        logger.info("[stream:%s] ▶ Started live stream from '%s'", stream_id, source)
+        return stream
+
+    def get(self, stream_id: str) -> Optional[LiveStream]:
+        with self._lock:
+            self._evict_failed()
+            return self._streams.get(stream_id)
+
+    def list(self) -> List[LiveStream]:
+        with self._lock:
+            self._evict_failed()
+            return list(self._streams.values())
+
+    def stop(self, stream_id: str) -> Optional[LiveStream]:
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            stream.stop()
+            logger.info("[stream:%s] ⏹ Stopped live stream", stream_id)
+        return stream
+
+    def stop_all(self):
+        for stream_id in list(self._streams):
+            self.stop(stream_id)
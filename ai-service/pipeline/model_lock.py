@@ -0,0 +1,38 @@
+"""
+Per-instance model locks
+
+The detectors and the OCR engine are not safe to call from two threads at
+once, but separate instances are independent. Each instance gets its own
+lock, so the vehicle detection of one video overlaps the plate detection or
+OCR of another and only calls into the same instance wait for each other.
+
+The time a thread spends waiting for a lock is added up per thread, so the
+job queue can leave it out of the per-frame cost it learns.
+"""
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+_locks = weakref.WeakKeyDictionary()
+_locks_guard = threading.Lock()
+_waits = threading.local()
+
+
+def lock_wait_seconds() -> float:
+    """Seconds the calling thread has waited for model locks so far"""
+    return getattr(_waits, "seconds", 0.0)
+
+
+@contextmanager
+def model_lock(model):
+    """Hold the lock of one model instance (created on first use)"""
+    with _locks_guard:
+        lock = _locks.get(model)
+        if lock is None:
+            lock = _locks[model] = threading.Lock()
+
+    start = time.perf_counter()
+    with lock:
+        _waits.seconds = lock_wait_seconds() + time.perf_counter() - start
+        yield
@@ -0,0 +1,176 @@
+"""
+Activity pre-scan
+
+On fixed highway cameras vehicles are in view only part of the time. The
+pre-scan runs before the full pass: it samples the video at a low rate
+(PRESCAN_FPS), shrinks each sample to PRESCAN_WIDTH pixels and compares it
+with the previous sample and a running background. A sample in which more
+than prescan_motion_threshold of the pixels changed is active. Active
+samples are padded by prescan_padding_seconds and merged into frame
+ranges, and detection, tracking and OCR run only inside those ranges.
+
+Frames between samples are only grabbed (no colour conversion or copy) and
+no model is involved, so the scan costs a fraction of the full pass.
+OpenCV does not expose keyframe-only decoding, so every frame is still
+decoded once.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.config import PRESCAN_WIDTH
+from utils.metrics import stage_timer
+from utils.runtime_config import RuntimeConfig
+
+logger = logging.getLogger("ai-service")
+
+# Grey level difference counted as a changed pixel
+PIXEL_DIFF_THRESHOLD = 25
+# Adaptation rate of the running background (per sample)
+BACKGROUND_RATE = 0.1
+
+
+@dataclass
+class ScanResult:
+    """Active frame ranges of a video (inclusive, 1-based, ascending)"""
+
+    ranges: List[Tuple[int, int]]
+    total_frames: int
+    fps: float
+    sampled_frames: int = 0
+    active_samples: int = 0
+    seconds: float = 0.0
+
+    @property
+    def active_frames(self) -> int:
+        return sum(end - start + 1 for start, end in self.ranges)
+
+    def video_info(self) -> Dict:
+        """Fields added to the video_info of a response"""
+        skipped_frames = max(0, self.total_frames - self.active_frames)
+        return {
+            "skipped_seconds": round(skipped_frames / self.fps, 2),
+            "active_ranges": [
+                [round((start - 1) / self.fps, 2), round(end / self.fps, 2)]
+                for start, end in self.ranges
+            ],
+            "prescan_seconds": round(self.seconds, 2)
+        }
+
+
+def motion_fraction(gray: np.ndarray, previous: np.ndarray, background: np.ndarray) -> float:
+    """Share of pixels that differ from the previous sample or the background"""
+    changed = cv2.absdiff(gray, previous) > PIXEL_DIFF_THRESHOLD
+    changed |= cv2.absdiff(gray, cv2.convertScaleAbs(background)) > PIXEL_DIFF_THRESHOLD
+    return float(np.count_nonzero(changed)) / changed.size
+
+
+def merge_ranges(frames: List[int], padding: int, total_frames: int) -> List[Tuple[int, int]]:
+    """Pad active frame numbers and merge overlapping or adjacent ranges"""
+    ranges = []
+    for frame_id in frames:
+        start = max(1, frame_id - padding)
+        end = frame_id + padding
+        if total_frames > 0:
+            end = min(total_frames, end)
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def scan_activity(
+    path: str,
+    fps: float,
+    total_frames: int,
+    config: RuntimeConfig,
+    width: int = PRESCAN_WIDTH
+) -> ScanResult:
+    """
+    Find the time ranges of a video with motion
+
+    Args:
+        path: Video file
+        fps, total_frames: As returned by open_video
+        config: Sampling rate, padding and motion threshold
+        width: Width of the analysed samples in pixels
+
+    Returns:
+        ScanResult with the padded, merged ranges to process
+    """
+    start_time = time.time()
+    step = max(1, round(fps / config.prescan_fps))
+    # At least one sample interval, so consecutive active samples connect
+    padding = max(step, round(config.prescan_padding_seconds * fps))
+
+    cap = cv2.VideoCapture(path)
+    previous = background = None
+    active = []
+    sampled = 0
+    frame_id = 0
+    try:
+        with stage_timer("prescan"):
+            while cap.grab():
+                frame_id += 1
+                if (frame_id - 1) % step != 0:
+                    continue
+
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                sampled += 1
+
+                height = max(1, frame.shape[0] * width // frame.shape[1])
+                small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+                if previous is None:
+                    background = gray.astype(np.float32)
+                else:
+                    if motion_fraction(gray, previous, background) > config.prescan_motion_threshold:
+                        active.append(frame_id)
+                    cv2.accumulateWeighted(gray, background, BACKGROUND_RATE)
+                previous = gray
+    finally:
+        cap.release()
+
+    # The container may report a wrong frame count
+    total = frame_id if frame_id else total_frames
+    return ScanResult(
+        ranges=merge_ranges(active, padding, total),
+        total_frames=total,
+        fps=fps,
+        sampled_frames=sampled,
+        active_samples=len(active),
+        seconds=time.time() - start_time
+    )
+
+
+def plan_frames(
+    path: str,
+    fps: float,
+    total_frames: int,
+    config: RuntimeConfig,
+    correlation_id: str = "-"
+) -> Optional[ScanResult]:
+    """Pre-scan a video if the configuration enables it, or None"""
+    if not config.prescan_enabled:
+        return None
+
+    scan = scan_activity(path, fps, total_frames, config)
+    logger.info(
+        "[%s] 🔭 Pre-scan: %d/%d samples active, %d ranges, %d/%d frames to process (%.2fs)",
+        correlation_id,
+        scan.active_samples,
+        scan.sampled_frames,
+        len(scan.ranges),
+        scan.active_frames,
+        scan.total_frames,
+        scan.seconds
+    )
+    return scan
@@ -0,0 +1,502 @@
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+
+from ocr.ocr_reader import OCRResult, get_ocr_engine, timed_read_plate, multi_pass_ocr
+from pipeline.model_lock import model_lock
+from pipeline.records import build_vehicle_record, build_violation_record
+from tracker.centroid_tracker import CentroidTracker
+from utils.config import FRAME_SKIP, STREAM_PROGRESS_INTERVAL
+from utils.metrics import FRAMES_PROCESSED, record_stage, stage_timer
+from utils.pre_process import safe_crop
+from utils.runtime_config import RuntimeConfig
+from utils.ground_plane import ground_plane
+from utils.speed_estimator import calculate_speeds
+from utils import tracing, tuning
+
+logger = logging.getLogger("ai-service")
+
+# Gaps shorter than this are grabbed through: seeking restarts decoding at
+# the previous keyframe and only pays off over long gaps
+SEEK_MIN_FRAMES = 250
+
+
+def update_tracked(tracked: Dict, vehicles: Dict, frame_id: int):
+    """
+    Append the centroid of every vehicle returned by the tracker to its history
+
+    Args:
+        tracked: vehicle_id -> tracking info (updated in place)
+        vehicles: vehicle_id -> bbox as returned by CentroidTracker.update
+        frame_id: Current frame number
+    """
+    for vehicle_id, bbox in vehicles.items():
+        x1, y1, x2, y2 = bbox
+        cX, cY = (x1 + x2) // 2, (y1 + y2) // 2
+
+        if vehicle_id not in tracked:
+            tracked[vehicle_id] = {
+                "first_frame": frame_id,
+                "last_frame": frame_id,
+                "positions": [(cX, cY)],
+                "plate_detected_frame": None
+            }
+        else:
+            tracked[vehicle_id]["last_frame"] = frame_id
+            tracked[vehicle_id]["positions"].append((cX, cY))
+
+
+def select_frames(
+    cap,
+    frame_skip: int = FRAME_SKIP,
+    ranges: Optional[List[Tuple[int, int]]] = None
+) -> Iterator[Tuple[int, bool, float]]:
+    """
+    Advance a capture to every frame that should be processed
+
+    Yields (frame_id, after_gap, grab_seconds) once the frame is grabbed;
+    the image is then fetched with cap.retrieve(). grab_seconds is the time
+    spent seeking and grabbing since the previous frame, skipped frames
+    included. Frame numbers start at 1; with
+    frame_skip=N only every (N+1)-th frame is selected. With ranges
+    (inclusive frame numbers, ascending and disjoint, e.g. from the
+    pre-scan) frames outside them are skipped: long gaps are seeked over,
+    short ones grabbed through without conversion. after_gap is True for
+    the first frame after skipped time.
+    """
+    frame_id = 0
+    grab_start = time.perf_counter()
+    for index, (start, end) in enumerate(ranges if ranges is not None else [(1, None)]):
+        if start - 1 - frame_id >= SEEK_MIN_FRAMES and cap.set(cv2.CAP_PROP_POS_FRAMES, start - 1):
+            frame_id = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+        after_gap = index > 0
+        while end is None or frame_id < end:
+            if not cap.grab():
+                return
+            frame_id += 1
+
+            if frame_id < start:
+                continue
+
+            # Frame skipping
+            if frame_skip > 0 and frame_id % (frame_skip + 1) != 0:
+                continue
+
+            yield frame_id, after_gap, time.perf_counter() - grab_start
+            grab_start = time.perf_counter()
+            after_gap = False
+
+
+def read_frames(
+    cap,
+    frame_skip: int = FRAME_SKIP,
+    ranges: Optional[List[Tuple[int, int]]] = None
+) -> Iterator[Tuple[int, object]]:
+    """
+    Yield (frame_id, frame) for every frame that should be processed
+
+    Frames are selected as in select_frames. Skipped time between ranges is
+    marked with (frame_id, None) before the first frame after it, so
+    VideoPipeline ends the tracks instead of linking vehicles across it.
+
+    Grabbing (skipped frames included) and retrieving are recorded as one
+    decode observation per yielded frame.
+    """
+    for frame_id, after_gap, grab_seconds in select_frames(cap, frame_skip, ranges):
+        if after_gap:
+            yield frame_id, None
+
+        start = time.perf_counter()
+        ret, frame = cap.retrieve()
+        record_stage("decode", start - grab_seconds, time.perf_counter() - start + grab_seconds)
+        if not ret:
+            break
+
+        yield frame_id, frame
+
+
+class TrackFinalizer:
+    """
+    Turn tracks into vehicle and violation records as soon as they end
+
+    Only running totals are kept for finalized tracks, so the state held
+    here is proportional to the number of vehicles currently in view.
+
+    With a ground calibration speeds are measured on the road plane;
+    frame_size (width, height) of the analysed frames scales positions to
+    the calibration resolution (None: frames have that resolution).
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        config: Optional[RuntimeConfig] = None,
+        frame_size: Optional[Tuple[int, int]] = None
+    ):
+        config = config or RuntimeConfig()
+        self.fps = fps
+        self.speed_limit = config.speed_limit_kmh
+        self.pixel_to_meter = config.pixel_to_meter
+        self.ground = ground_plane(config.ground_calibration)
+        self.frame_size = frame_size
+        self.min_tracked_frames = config.min_tracked_frames
+        self.include_trajectory = config.include_trajectory
+        self.trajectory_sampling = config.trajectory_sampling
+
+        self.tracked = {}      # vehicle_id -> tracking info
+        self.ocr_results = {}  # vehicle_id -> OCRResult
+
+        self.vehicles_tracked = 0
+        self.vehicles_with_plates = 0
+        self.violations_detected = 0
+        self.speed_total = 0.0
+        self.speed_count = 0
+
+    def update(self, vehicles: Dict, frame_id: int):
+        update_tracked(self.tracked, vehicles, frame_id)
+
+    def has_plate(self, vehicle_id: int) -> bool:
+        return vehicle_id in self.ocr_results
+
+    def set_plate(self, vehicle_id: int, ocr_result: OCRResult, frame_id: int):
+        self.ocr_results[vehicle_id] = ocr_result
+        self.tracked[vehicle_id]["plate_detected_frame"] = frame_id
+
+    def finalize_many(self, vehicle_ids: List[int]) -> List[Tuple[int, Dict, Optional[Dict]]]:
+        """
+        Compute the speeds of ended tracks in one batch and build their records
+
+        Unknown or already finalized vehicles are skipped.
+
+        Returns:
+            (vehicle_id, vehicle_record, violation_record or None) per
+            track, in the order given
+        """
+        ended = []
+        for vehicle_id in vehicle_ids:
+            info = self.tracked.pop(vehicle_id, None)
+            if info is not None:
+                ended.append((vehicle_id, info, self.ocr_results.pop(vehicle_id, None)))
+
+        # Calculate the speeds of every track long enough to measure
+        measured = [info for _, info, _ in ended if len(info["positions"]) >= self.min_tracked_frames]
+        speeds = iter(calculate_speeds(
+            [info["first_frame"] for info in measured],
+            [info["last_frame"] for info in measured],
+            [info["positions"][0] for info in measured],
+            [info["positions"][-1] for info in measured],
+            self.fps,
+            self.pixel_to_meter,
+            self.ground,
+            self.frame_size
+        ))
+
+        finalized = []
+        for vehicle_id, info, ocr_result in ended:
+            positions_count = len(info["positions"])
+            if positions_count >= self.min_tracked_frames:
+                speed_kmh = next(speeds)
+                self.speed_total += speed_kmh
+                self.speed_count += 1
+            else:
+                speed_kmh = 0.0
+
+            # Build vehicle record
+            vehicle_record = build_vehicle_record(
+                f"veh_{vehicle_id:03d}",
+                info,
+                ocr_result,
+                speed_kmh,
+                self.fps,
+                self.speed_limit,
+                self.min_tracked_frames,
+                self.include_trajectory,
+                self.trajectory_sampling
+            )
+
+            self.vehicles_tracked += 1
+            if vehicle_record["plate_info"]["plate_number"] is not None:
+                self.vehicles_with_plates += 1
+
+            # Check for violation
+            violation = None
+            if (ocr_result and
+                ocr_result.plate_number and
+                positions_count >= self.min_tracked_frames and
+                speed_kmh > self.speed_limit):
+
+                self.violations_detected += 1
+                violation = build_violation_record(
+                    f"v_{self.violations_detected:03d}",
+                    vehicle_record["plate_info"],
+                    speed_kmh,
+                    info["first_frame"] / self.fps,
+                    info["first_frame"],
+                    self.speed_limit
+                )
+
+            finalized.append((vehicle_id, vehicle_record, violation))
+
+        return finalized
+
+    def finalize_all(self) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+        """Finalize every track still open, in order of appearance"""
+        for _, vehicle_record, violation in self.finalize_many(sorted(self.tracked)):
+            yield vehicle_record, violation
+
+    def summary(self) -> Dict:
+        """Aggregate statistics for the response summary"""
+        avg_speed = round(self.speed_total / self.speed_count, 2) if self.speed_count else 0.0
+
+        return {
+            "total_vehicles_tracked": self.vehicles_tracked,
+            "vehicles_with_plates": self.vehicles_with_plates,
+            "violations_detected": self.violations_detected,
+            "average_speed_kmh": avg_speed
+        }
+
+
+def vehicle_event(vehicle_record: Dict, violation: Optional[Dict]) -> Dict:
+    return {"event": "vehicle", "vehicle": vehicle_record, "violation": violation}
+
+
+class VideoPipeline:
+    """
+    Detection, tracking and OCR over a sequence of frames
+
+    run() is a generator of events, so callers can either stream them to
+    the client or collect them into a single response:
+
+    - {"event": "vehicle", "vehicle": {...}, "violation": {...} | None}
+      as soon as a track is deregistered and finalized
+    - {"event": "progress", ...} every STREAM_PROGRESS_INTERVAL processed frames
+
+    Thresholds, tracking and OCR settings come from config (a RuntimeConfig,
+    defaults from the environment); frame skipping is up to the caller of
+    read_frames. A frame of None marks skipped time and ends every track.
+
+    Plate detection runs on up to plate_batch_size vehicle crops of a frame
+    per model call (default from the host tuning profile).
+    """
+
+    def __init__(
+        self,
+        vehicle_detector,
+        plate_detector,
+        fps: float,
+        total_frames: int,
+        store_writer=None,
+        correlation_id: str = "-",
+        progress_interval: int = STREAM_PROGRESS_INTERVAL,
+        tracer=None,
+        config: Optional[RuntimeConfig] = None,
+        evidence=None,
+        plate_batch_size: Optional[int] = None
+    ):
+        self.vehicle_detector = vehicle_detector
+        self.plate_detector = plate_detector
+        self.total_frames = total_frames
+        self.store_writer = store_writer
+        self.correlation_id = correlation_id
+        self.progress_interval = progress_interval
+        self.tracer = tracer  # utils.tracing.Tracer, or None
+        self.config = config or RuntimeConfig()
+        self.evidence = evidence  # pipeline.evidence.EvidenceRecorder, or None
+        self.plate_batch_size = plate_batch_size or tuning.active.plate_batch_size
+
+        self.finalizer = TrackFinalizer(fps, self.config)
+        self.processed_frames = 0
+
+    def detect_plates(self, v_crops: List) -> List[Optional[Tuple[int, int, int, int]]]:
+        """Plate box in each vehicle crop (or None), plate_batch_size crops per call"""
+        p_boxes = []
+        for start in range(0, len(v_crops), self.plate_batch_size):
+            batch = v_crops[start:start + self.plate_batch_size]
+            with model_lock(self.plate_detector), stage_timer("plate_detect"):
+                if len(batch) == 1:
+                    p_boxes.append(self.plate_detector.detect(batch[0], conf=self.config.plate_confidence))
+                else:
+                    p_boxes.extend(self.plate_detector.detect_batch(batch, conf=self.config.plate_confidence))
+        return p_boxes
+
+    def read_plates(self, frame, bboxes: List[Tuple[int, int, int, int]]) -> List[Optional[OCRResult]]:
+        """Detect and read the plate inside each vehicle box (None where there is none)"""
+        results = [None] * len(bboxes)
+
+        with stage_timer("safe_crop"):
+            v_crops = [safe_crop(frame, bbox) for bbox in bboxes]
+        indices = [i for i, v_crop in enumerate(v_crops) if v_crop is not None]
+        p_boxes = self.detect_plates([v_crops[i] for i in indices])
+
+        for i, p_box in zip(indices, p_boxes):
+            if not p_box:
+                continue
+
+            with stage_timer("safe_crop"):
+                p_crop = safe_crop(v_crops[i], p_box)
+            if p_crop is None:
+                continue
+
+            # Use multi-pass OCR if enabled (passes are timed in ocr_reader)
+            with model_lock(get_ocr_engine()):
+                if self.config.ocr_multi_pass:
+                    results[i] = multi_pass_ocr(p_crop, self.config.ocr_max_attempts)
+                else:
+                    results[i] = timed_read_plate(p_crop, "single", self.config.ocr_confidence)
+        return results
+
+    def run(self, frames: Iterator[Tuple[int, object]]) -> Iterator[Dict]:
+        ended = []
+        tracker = CentroidTracker(
+            max_disappeared=self.config.max_disappeared,
+            max_distance=self.config.max_distance,
+            on_deregister=ended.append
+        )
+        start_time = time.time()
+        frames = iter(frames)
+
+        while True:
+            # The tracer is activated around each step (not across yields)
+            # and only for sampled frames
+            tracer = self.tracer
+            if tracer is not None and not tracer.should_sample(self.processed_frames):
+                tracer = None
+
+            with tracing.activate(tracer):
+                item = next(frames, None)
+                if item is None:
+                    break
+                frame_id, frame = item
+                if frame is None:
+                    # Skipped time: tracks do not continue across it
+                    tracker.deregister_all()
+                    events = self._finalize_ended(ended)
+                else:
+                    with tracing.span("frame", "frame", frame_id=frame_id):
+                        events = self._process_frame(tracker, ended, frame_id, frame, start_time)
+                    if tracer is not None:
+                        tracer.sampled_frames += 1
+
+            yield from events
+
+        # End of video: every remaining track is complete
+        with tracing.activate(self.tracer), tracing.span("finalize_all"):
+            events = self._finalize_ended(sorted(self.finalizer.tracked))
+        yield from events
+
+    def _finalize_ended(self, ended: List[int]) -> List[Dict]:
+        """Finalize the tracks the tracker dropped and return their events"""
+        with stage_timer("finalize"):
+            finalized = self.finalizer.finalize_many(ended)
+        ended.clear()
+
+        events = []
+        for vehicle_id, vehicle_record, violation in finalized:
+            if self.evidence is not None:
+                with stage_timer("evidence"):
+                    self.evidence.finish(vehicle_id, vehicle_record, violation)
+            events.append(vehicle_event(vehicle_record, violation))
+        return events
+
+    def _process_frame(self, tracker, ended, frame_id, frame, start_time) -> List[Dict]:
+        """Run detection, tracking and OCR on one frame and return its events"""
+        finalizer = self.finalizer
+        events = []
+
+        self.processed_frames += 1
+        FRAMES_PROCESSED.inc()
+
+        if finalizer.frame_size is None:
+            finalizer.frame_size = (frame.shape[1], frame.shape[0])
+            if self.store_writer is not None:
+                self.store_writer.metadata["frame_size"] = list(finalizer.frame_size)
+
+        # Detect vehicles
+        with model_lock(self.vehicle_detector), stage_timer("vehicle_detect"):
+            rects = self.vehicle_detector.detect(frame, conf=self.config.vehicle_confidence)
+
+        # Update tracker
+        with stage_timer("tracker_update"):
+            vehicles = tracker.update(rects)
+
+        tracing.counter("tracker", detections=len(rects), active_tracks=len(vehicles))
+
+        if self.store_writer is not None:
+            first_row = self.store_writer.add_frame(frame_id, rects)
+
+        if self.processed_frames % 100 == 0:
+            logger.debug(
+                "[%s] Frame %d/%d → detected=%d tracked=%d",
+                self.correlation_id, frame_id, self.total_frames, len(rects), len(vehicles)
+            )
+
+        # Update tracked vehicles
+        finalizer.update(vehicles, frame_id)
+
+        if self.evidence is not None:
+            with stage_timer("evidence"):
+                self.evidence.follow(frame_id, frame, vehicles)
+
+        # Try OCR on the vehicles without a plate yet
+        pending = [
+            (vehicle_id, bbox) for vehicle_id, bbox in vehicles.items()
+            if not finalizer.has_plate(vehicle_id)
+        ]
+        ocr_results = self.read_plates(frame, [bbox for _, bbox in pending])
+
+        for (vehicle_id, bbox), ocr_result in zip(pending, ocr_results):
+            if ocr_result is None:
+                continue
+
+            finalizer.set_plate(vehicle_id, ocr_result, frame_id)
+
+            if self.evidence is not None and ocr_result.plate_number:
+                with stage_timer("evidence"):
+                    self.evidence.capture(vehicle_id, frame_id, frame, bbox)
+
+            if self.store_writer is not None:
+                self.store_writer.add_plate(first_row + tracker.detection_index[vehicle_id], frame_id, ocr_result)
+
+            if ocr_result.plate_number:
+                logger.debug(
+                    "[%s] 🔍 Vehicle %s → Plate '%s' (conf=%.2f, valid=%s)",
+                    self.correlation_id,
+                    vehicle_id,
+                    ocr_result.plate_number,
+                    ocr_result.confidence,
+                    ocr_result.validated
+                )
+
+        # Finalize tracks dropped by the tracker
+        events.extend(self._finalize_ended(ended))
+
+        if self.processed_frames % self.progress_interval == 0:
+            events.append({
+                "event": "progress",
+                "frame": frame_id,
+                "total_frames": self.total_frames,
+                "processed_frames": self.processed_frames,
+                "active_tracks": len(finalizer.tracked),
+                "vehicles_finalized": finalizer.vehicles_tracked,
+                "violations_detected": finalizer.violations_detected,
+                "elapsed_seconds": round(time.time() - start_time, 2)
+            })
+
+        return events
+
+
+def open_video(path: str):
+    """
+    Open a video file
+
+    Returns:
+        (capture, fps, total_frames, duration_seconds)
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = total_frames / fps if fps > 0 else 0
+    return cap, fps, total_frames, duration
@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional, Tuple
+
+from ocr.ocr_reader import OCRResult
+from utils.config import (
+    INCLUDE_TRAJECTORY,
+    TRAJECTORY_SAMPLING,
+    SPEED_LIMIT,
+    MIN_TRACKED_FRAMES,
+    get_violation_severity
+)
+
+
+def sample_trajectory(positions: List[tuple], sampling_rate: int) -> List[Dict]:
+    """Sample trajectory points for compact response"""
+    sampled = []
+    for i, (frame, pos) in enumerate(positions):
+        if i % sampling_rate == 0 or i == len(positions) - 1:
+            sampled.append({
+                "frame": frame,
+                "x": pos[0],
+                "y": pos[1]
+            })
+
+    return sampled
+
+
+def calculate_trajectory_length(positions: List[tuple]) -> float:
+    """Calculate total trajectory length in pixels"""
+    if len(positions) < 2:
+        return 0.0
+
+    total_distance = 0.0
+    for i in range(1, len(positions)):
+        x1, y1 = positions[i-1][1]
+        x2, y2 = positions[i][1]
+        distance = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+        total_distance += distance
+
+    return round(total_distance, 2)
+
+
+def build_violation_record(
+    violation_id: str,
+    plate_info: Dict,
+    speed_kmh: float,
+    timestamp_seconds: float,
+    frame_number: int,
+    speed_limit: float = SPEED_LIMIT
+) -> Dict:
+    """Build a violation record in the new format"""
+    overspeed = round(speed_kmh - speed_limit, 2)
+    severity = get_violation_severity(overspeed)
+
+    return {
+        "violation_id": violation_id,
+        "plate_number": plate_info["plate_number"],
+        "plate_confidence": plate_info["confidence"],
+        "plate_validated": plate_info["validated"],
+        "speed_kmh": speed_kmh,
+        "speed_limit_kmh": speed_limit,
+        "overspeed_kmh": overspeed,
+        "timestamp_seconds": round(timestamp_seconds, 2),
+        "frame_number": frame_number,
+        "severity": severity
+    }
+
+
+def build_vehicle_record(
+    vehicle_id: str,
+    tracked_info: Dict,
+    ocr_result: Optional[OCRResult],
+    speed_kmh: float,
+    fps: float,
+    speed_limit: float = SPEED_LIMIT,
+    min_tracked_frames: int = MIN_TRACKED_FRAMES,
+    include_trajectory: bool = INCLUDE_TRAJECTORY,
+    trajectory_sampling: int = TRAJECTORY_SAMPLING
+) -> Dict:
+    """Build a tracked vehicle record in the new format"""
+
+    first_frame = tracked_info["first_frame"]
+    last_frame = tracked_info["last_frame"]
+    positions_with_frames = [
+        (first_frame + i, pos)
+        for i, pos in enumerate(tracked_info["positions"])
+    ]
+
+    trajectory_length = calculate_trajectory_length(positions_with_frames)
+
+    # Build vehicle record
+    vehicle = {
+        "vehicle_id": vehicle_id,
+        "tracking_info": {
+            "first_frame": first_frame,
+            "last_frame": last_frame,
+            "frames_tracked": last_frame - first_frame + 1,
+            "trajectory_length_pixels": trajectory_length
+        },
+        "speed_info": {
+            "speed_kmh": speed_kmh,
+            "is_violation": speed_kmh > speed_limit,
+            "calculation_valid": len(tracked_info["positions"]) >= min_tracked_frames
+        }
+    }
+
+    # Add plate information
+    if ocr_result:
+        vehicle["plate_info"] = ocr_result.to_dict()
+        vehicle["plate_info"]["detection_frame"] = tracked_info.get("plate_detected_frame")
+    else:
+        vehicle["plate_info"] = {
+            "plate_number": None,
+            "raw_ocr_text": "",
+            "confidence": 0.0,
+            "validated": False,
+            "validation_errors": ["not_detected"]
+        }
+
+    # Add sampled trajectory
+    if include_trajectory:
+        vehicle["positions"] = sample_trajectory(
+            positions_with_frames,
+            trajectory_sampling
+        )
+
+    return vehicle
+
+
+def build_response_parts(
+    filename: str,
+    fps: float,
+    total_frames: int,
+    duration: float,
+    processed_frames: int,
+    summary: Dict,
+    configuration: Dict,
+    processing_time: float,
+    queue_wait: float,
+    scan_info: Optional[Dict] = None
+) -> Tuple[Dict, Dict]:
+    """
+    Build the fields of a process-video response around the record arrays
+
+    Shared by the API and batch processing. Callers add analysis_id,
+    evidence_id, trace_id or source to the tail.
+
+    Returns:
+        (head, tail) for ResultWriter: the keys before and after
+        "violations" and "tracked_vehicles"
+    """
+    head = {
+        "status": "success",
+        "processing_time_seconds": round(processing_time, 2),
+        "queue_wait_seconds": round(queue_wait, 2),
+        "video_info": {
+            "filename": filename,
+            "duration_seconds": round(duration, 2),
+            "fps": round(fps, 1),
+            "total_frames": total_frames,
+            "processed_frames": processed_frames
+        },
+        "summary": summary
+    }
+
+    if scan_info is not None:
+        head["video_info"].update(scan_info)
+
+    return head, {"configuration": configuration}
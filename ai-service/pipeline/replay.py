@@ -0,0 +1,118 @@
+import bisect
+from typing import Dict, List, Optional
+
+from pipeline.processor import TrackFinalizer
+from tracker.centroid_tracker import CentroidTracker
+from utils.detection_store import DetectionStore
+from utils.runtime_config import ConfigError, RuntimeConfig
+
+# Parameters that can change without re-running detection and OCR
+REPLAY_PARAMETERS = (
+    "speed_limit_kmh",
+    "pixel_to_meter",
+    "ground_calibration",
+    "max_distance",
+    "max_disappeared",
+    "min_tracked_frames",
+    "include_trajectory",
+    "trajectory_sampling"
+)
+
+
+def validate_replay_parameters(overrides: Dict) -> List[str]:
+    """
+    Validate re-analysis overrides with the same rules as RuntimeConfig
+
+    Returns:
+        List of errors (empty when valid)
+    """
+    errors = [f"Unsupported parameter: {key}" for key in overrides if key not in REPLAY_PARAMETERS]
+    if errors:
+        return errors
+
+    try:
+        RuntimeConfig().with_overrides(overrides)
+    except ConfigError as e:
+        return e.errors
+    return []
+
+
+def replay_detections(store: DetectionStore, overrides: Dict, base: Optional[RuntimeConfig] = None) -> Dict:
+    """
+    Re-run tracking, speed estimation and violation logic on persisted detections
+
+    A new track picks up the first stored plate read among its boxes, which
+    mirrors the original pipeline reading a plate once per vehicle.
+
+    Args:
+        store: Persisted detections of a previous analysis
+        overrides: New values for any of REPLAY_PARAMETERS
+        base: Configuration for settings the analysis did not record
+            (defaults from the environment)
+
+    Returns:
+        Response parts: video_info, summary, violations, tracked_vehicles, configuration
+    """
+    base = base or RuntimeConfig()
+    known = set(base.to_dict())
+    stored = {key: value for key, value in store.metadata.get("configuration", {}).items() if key in known}
+    config = base.with_overrides(stored).with_overrides(overrides)
+
+    fps = store.metadata["fps"]
+    finalizer = TrackFinalizer(fps, config, store.metadata.get("frame_size"))
+
+    ended = []
+    tracker = CentroidTracker(
+        max_disappeared=config.max_disappeared,
+        max_distance=config.max_distance,
+        on_deregister=ended.append
+    )
+
+    violations = []
+    tracked_vehicles = []
+
+    def collect(vehicle_record, violation):
+        tracked_vehicles.append(vehicle_record)
+        if violation is not None:
+            violations.append(violation)
+
+    # Frame ranges processed after a pre-scan; tracks end at the gaps
+    range_starts = [start for start, _ in store.metadata.get("active_ranges") or []]
+    segment = None
+
+    for frame_id, first_row, rects in store.iter_frames():
+        current = bisect.bisect_right(range_starts, frame_id)
+        if segment is not None and current != segment:
+            tracker.deregister_all()
+        segment = current
+
+        vehicles = tracker.update(rects)
+        finalizer.update(vehicles, frame_id)
+
+        for vehicle_id in vehicles:
+            if finalizer.has_plate(vehicle_id):
+                continue
+            ocr_result = store.plate_for(first_row + tracker.detection_index[vehicle_id])
+            if ocr_result is not None:
+                finalizer.set_plate(vehicle_id, ocr_result, frame_id)
+
+        for _, vehicle_record, violation in finalizer.finalize_many(ended):
+            collect(vehicle_record, violation)
+        ended.clear()
+
+    for vehicle_record, violation in finalizer.finalize_all():
+        collect(vehicle_record, violation)
+
+    return {
+        "video_info": {
+            "filename": store.metadata["filename"],
+            "duration_seconds": store.metadata["duration_seconds"],
+            "fps": round(fps, 1),
+            "total_frames": store.metadata["total_frames"],
+            "processed_frames": len(store)
+        },
+        "summary": finalizer.summary(),
+        "violations": violations,
+        "tracked_vehicles": tracked_vehicles,
+        "configuration": config.to_dict()
+    }
@@ -0,0 +1,69 @@
+import json
+import tempfile
+from typing import Dict, Iterator, Optional
+
+
+class ResultWriter:
+    """
+    Disk-backed collection of vehicle and violation records
+
+    Records are appended as JSON lines to anonymous temporary files as soon
+    as a track is finalized, so the in-memory state does not grow with the
+    length of the video. The full response document is assembled from
+    those files at the end.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self._vehicles = tempfile.TemporaryFile(mode="w+", encoding="utf-8", dir=directory)
+        self._violations = tempfile.TemporaryFile(mode="w+", encoding="utf-8", dir=directory)
+        self.vehicle_count = 0
+        self.violation_count = 0
+
+    def add(self, vehicle_record: Dict, violation: Optional[Dict] = None):
+        """Spill one finalized vehicle (and its violation, if any) to disk"""
+        self._vehicles.write(json.dumps(vehicle_record))
+        self._vehicles.write("\n")
+        self.vehicle_count += 1
+
+        if violation is not None:
+            self._violations.write(json.dumps(violation))
+            self._violations.write("\n")
+            self.violation_count += 1
+
+    @staticmethod
+    def _iter_array(f) -> Iterator[str]:
+        f.flush()
+        f.seek(0)
+        yield "["
+        for i, line in enumerate(f):
+            if i:
+                yield ", "
+            yield line.rstrip("\n")
+        yield "]"
+
+    def iter_json(self, head: Dict, tail: Dict) -> Iterator[str]:
+        """
+        Yield the response document in chunks
+
+        The document is head's keys, then "violations" and
+        "tracked_vehicles", then tail's keys.
+        """
+        yield json.dumps(head)[:-1]
+        yield ", \"violations\": "
+        yield from self._iter_array(self._violations)
+        yield ", \"tracked_vehicles\": "
+        yield from self._iter_array(self._vehicles)
+        if tail:
+            yield ", " + json.dumps(tail)[1:]
+        else:
+            yield "}"
+
+    def write_json(self, path: str, head: Dict, tail: Dict):
+        """Write the response document to path"""
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in self.iter_json(head, tail):
+                f.write(chunk)
+
+    def close(self):
+        self._vehicles.close()
+        self._violations.close()
@@ -1,12 +1,14 @@
 from utils.config import MAX_DISAPPEARED, MAX_DISTANCE
 
 class CentroidTracker:
-    def __init__(self, max_disappeared=MAX_DISAPPEARED, max_distance=MAX_DISTANCE):
+    def __init__(self, max_disappeared=MAX_DISAPPEARED, max_distance=MAX_DISTANCE, on_deregister=None):
         self.next_object_id = 0
         self.objects = {}        # object ID -> centroid
         self.disappeared = {}    # object ID -> disappeared count
+        self.detection_index = {}  # object ID -> index in rects of the last update
         self.max_disappeared = max_disappeared
         self.max_distance = max_distance
+        self.on_deregister = on_deregister  # called with the object ID once a track ends
 
     def register(self, centroid):
         oid = self.next_object_id
@@ -18,6 +20,13 @@ class CentroidTracker:
     def deregister(self, oid):
         del self.objects[oid]
         del self.disappeared[oid]
+        if self.on_deregister is not None:
+            self.on_deregister(oid)
+
+    def deregister_all(self):
+        # End every track, e.g. when the following frames are not contiguous
+        for oid in list(self.objects):
+            self.deregister(oid)
 
     def distance(self, c1, c2):
         return ((c1[0] - c2[0]) ** 2 + (c1[1] - c2[1]) ** 2) ** 0.5
@@ -35,6 +44,7 @@ class CentroidTracker:
             for oid in to_remove:
                 self.deregister(oid)
 
+            self.detection_index = {}
             return {}
 
         # Compute centroids from rects
@@ -44,12 +54,14 @@ class CentroidTracker:
             centroids.append((cX, cY))
 
         updated = {}
+        self.detection_index = {}
 
         # CASE 2 — No tracked objects yet
         if len(self.objects) == 0:
             for i, centroid in enumerate(centroids):
                 oid = self.register(centroid)
                 updated[oid] = rects[i]
+                self.detection_index[oid] = i
             return updated
 
         # CASE 3 — Match old objects with new detections
@@ -76,6 +88,7 @@ class CentroidTracker:
             self.objects[oid] = new_centroids[i]
             self.disappeared[oid] = 0
             updated[oid] = rects[i]
+            self.detection_index[oid] = i
 
             used_new.add(i)
             used_old.add(j)
@@ -93,5 +106,6 @@ class CentroidTracker:
             if i not in used_new:
                 oid = self.register(new_centroids[i])
                 updated[oid] = rects[i]
+                self.detection_index[oid] = i
 
         return updated
@@ -1,3 +1,4 @@
+import json
 import os
 from typing import Tuple
 
@@ -8,10 +9,19 @@ PLATE_MODEL_PATH = os.getenv("PLATE_MODEL_PATH", "models/plate_yolo.pt")
 # Speed / Physics Calibration
 PIXEL_TO_METER = float(os.getenv("PIXEL_TO_METER", "0.05"))
 SPEED_LIMIT = float(os.getenv("SPEED_LIMIT", "50.0"))
+GROUND_CALIBRATION = os.getenv("GROUND_CALIBRATION", "")  # JSON homography calibration, replaces PIXEL_TO_METER
+GROUND_PLANE_CACHE_SIZE = int(os.getenv("GROUND_PLANE_CACHE_SIZE", "4"))  # Lookup tables kept, 8 bytes per calibration pixel each
 
 # Processing Settings
 FRAME_SKIP = int(os.getenv("FRAME_SKIP", "1"))
 MIN_TRACKED_FRAMES = int(os.getenv("MIN_TRACKED_FRAMES", "8"))
+PRESCAN_ENABLED = os.getenv("PRESCAN_ENABLED", "false").lower() == "true"  # Skip time without motion
+PRESCAN_FPS = float(os.getenv("PRESCAN_FPS", "2.0"))  # Sampled frames per second in the pre-scan
+PRESCAN_PADDING_SECONDS = float(os.getenv("PRESCAN_PADDING_SECONDS", "2.0"))  # Processed around activity
+PRESCAN_MOTION_THRESHOLD = float(os.getenv("PRESCAN_MOTION_THRESHOLD", "0.002"))  # Changed pixel fraction
+PRESCAN_WIDTH = int(os.getenv("PRESCAN_WIDTH", "160"))  # Pre-scan resolution (pixels wide)
+DECODE_IN_PROCESS = os.getenv("DECODE_IN_PROCESS", "false").lower() == "true"  # Decode uploads in a child process
+DECODE_RING_SLOTS = int(os.getenv("DECODE_RING_SLOTS", "8"))  # Shared-memory frames between decoder and pipeline
 
 # Detection Confidence Thresholds
 VEHICLE_CONFIDENCE = float(os.getenv("VEHICLE_CONFIDENCE", "0.35"))
@@ -25,6 +35,7 @@ MAX_DISTANCE = float(os.getenv("MAX_DISTANCE", "70.0"))
 # File Upload Settings
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
 ALLOWED_EXT = (".mp4", ".avi", ".mov", ".mkv")
+SHARED_VIDEO_ROOT = os.getenv("SHARED_VIDEO_ROOT", "")  # Videos referenced by path are read in place under this root
 
 # OCR Enhancement Settings
 OCR_MULTI_PASS = os.getenv("OCR_MULTI_PASS", "true").lower() == "true"
@@ -33,6 +44,65 @@ OCR_MAX_ATTEMPTS = int(os.getenv("OCR_MAX_ATTEMPTS", "3"))
 # Response Format Settings
 INCLUDE_TRAJECTORY = os.getenv("INCLUDE_TRAJECTORY", "true").lower() == "true"
 TRAJECTORY_SAMPLING = int(os.getenv("TRAJECTORY_SAMPLING", "10"))  # Every N frames
+STREAM_PROGRESS_INTERVAL = int(os.getenv("STREAM_PROGRESS_INTERVAL", "100"))  # Processed frames between progress events
+
+# Job Queue / Admission Control
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Videos processed concurrently
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "8"))  # Videos waiting before 429
+JOB_QUEUE_MAX_BACKLOG_SECONDS = float(os.getenv("JOB_QUEUE_MAX_BACKLOG_SECONDS", "1800"))  # Estimated queued work before 429
+JOB_INITIAL_FRAME_COST_SECONDS = float(os.getenv("JOB_INITIAL_FRAME_COST_SECONDS", "0.05"))  # Until measured
+JOB_COST_EWMA_ALPHA = float(os.getenv("JOB_COST_EWMA_ALPHA", "0.3"))
+
+# Runtime Configuration (hot-reloadable analysis settings and camera profiles)
+RUNTIME_CONFIG_FILE = os.getenv("RUNTIME_CONFIG_FILE", "cache/runtime-config.json")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Admin endpoints are disabled when empty
+
+# Host Tuning (thread counts and batch size written by benchmarks.tune)
+TUNING_PROFILE_FILE = os.getenv("TUNING_PROFILE_FILE", "cache/tuning-profile.json")
+
+# Live Stream Settings
+LIVE_STREAM_MAX = int(os.getenv("LIVE_STREAM_MAX", "4"))
+LIVE_STREAM_QUEUE_SIZE = int(os.getenv("LIVE_STREAM_QUEUE_SIZE", "2"))  # Frames buffered before dropping
+LIVE_STREAM_MAX_LAG_SECONDS = float(os.getenv("LIVE_STREAM_MAX_LAG_SECONDS", "2.0"))
+LIVE_STREAM_RECONNECT_SECONDS = float(os.getenv("LIVE_STREAM_RECONNECT_SECONDS", "5.0"))
+LIVE_STREAM_EVENT_BUFFER = int(os.getenv("LIVE_STREAM_EVENT_BUFFER", "100"))
+LIVE_STREAM_FILE_ROOT = os.getenv("LIVE_STREAM_FILE_ROOT", "")  # Local files/pipes allowed under this root
+LIVE_STREAM_ALLOWED_HOSTS = [  # Hosts (fnmatch patterns) of network sources; empty disables them
+    host.strip().lower() for host in os.getenv("LIVE_STREAM_ALLOWED_HOSTS", "").split(",") if host.strip()
+]
+LIVE_STREAM_ERROR_TTL_SECONDS = float(os.getenv("LIVE_STREAM_ERROR_TTL_SECONDS", "300"))  # Failed streams kept for inspection
+
+# Request Tracing Settings (opt-in per request with the X-Trace header)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_DIR = os.getenv("TRACE_DIR", "cache/traces")
+TRACE_SAMPLE_EVERY = int(os.getenv("TRACE_SAMPLE_EVERY", "10"))  # Trace every N-th processed frame
+TRACE_MAX_EVENTS = int(os.getenv("TRACE_MAX_EVENTS", "200000"))  # Per trace
+TRACE_MAX_FILES = int(os.getenv("TRACE_MAX_FILES", "50"))  # Oldest traces are deleted beyond this
+
+# Stub Inference (load testing without model files)
+STUB_DETECTORS = os.getenv("STUB_DETECTORS", "false").lower() == "true"
+STUB_INFERENCE_MS = float(os.getenv("STUB_INFERENCE_MS", "0"))  # Simulated latency per model call
+
+# Result Cache Settings
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache/results")
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "500"))
+
+# Detection Store Settings (persisted detections for re-analysis)
+DETECTION_STORE_ENABLED = os.getenv("DETECTION_STORE_ENABLED", "false").lower() == "true"
+DETECTION_STORE_DIR = os.getenv("DETECTION_STORE_DIR", "cache/detections")
+DETECTION_STORE_MAX_ANALYSES = int(os.getenv("DETECTION_STORE_MAX_ANALYSES", "200"))  # Oldest analyses are deleted beyond this
+
+# Violation Evidence Settings (snapshots and clips written during processing)
+EVIDENCE_ENABLED = os.getenv("EVIDENCE_ENABLED", "false").lower() == "true"
+EVIDENCE_DIR = os.getenv("EVIDENCE_DIR", "cache/evidence")
+EVIDENCE_BUFFER_FRAMES = int(os.getenv("EVIDENCE_BUFFER_FRAMES", "64"))  # JPEG frames held for open tracks
+EVIDENCE_FRAMES_PER_VEHICLE = int(os.getenv("EVIDENCE_FRAMES_PER_VEHICLE", "3"))  # Snapshots from the plate read on
+EVIDENCE_JPEG_QUALITY = int(os.getenv("EVIDENCE_JPEG_QUALITY", "85"))
+EVIDENCE_CLIPS = os.getenv("EVIDENCE_CLIPS", "false").lower() == "true"  # Needs ffmpeg
+EVIDENCE_CLIP_PADDING_SECONDS = float(os.getenv("EVIDENCE_CLIP_PADDING_SECONDS", "2.0"))  # Around the track
+EVIDENCE_MAX_MB = int(os.getenv("EVIDENCE_MAX_MB", "2000"))  # Oldest files are deleted beyond this
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
 
 
 def get_violation_severity(overspeed_kmh: float) -> str:
@@ -64,17 +134,27 @@ def validate_configuration() -> Tuple[bool, list]:
     """
     errors = []
     
-    # Check model files exist
-    if not os.path.exists(VEHICLE_MODEL_PATH):
+    # Check model files exist (not needed with stub detectors)
+    if not STUB_DETECTORS and not os.path.exists(VEHICLE_MODEL_PATH):
         errors.append(f"Vehicle model not found: {VEHICLE_MODEL_PATH}")
     
-    if not os.path.exists(PLATE_MODEL_PATH):
+    if not STUB_DETECTORS and not os.path.exists(PLATE_MODEL_PATH):
         errors.append(f"Plate model not found: {PLATE_MODEL_PATH}")
     
     # Validate ranges
     if PIXEL_TO_METER <= 0:
         errors.append(f"PIXEL_TO_METER must be positive, got {PIXEL_TO_METER}")
     
+    if GROUND_PLANE_CACHE_SIZE < 1:
+        errors.append(f"GROUND_PLANE_CACHE_SIZE must be >= 1, got {GROUND_PLANE_CACHE_SIZE}")
+    
+    if GROUND_CALIBRATION:
+        from utils.ground_plane import calibration_errors
+        try:
+            errors.extend(calibration_errors(json.loads(GROUND_CALIBRATION)))
+        except ValueError as e:
+            errors.append(f"GROUND_CALIBRATION must be a JSON object: {e}")
+    
     if SPEED_LIMIT <= 0:
         errors.append(f"SPEED_LIMIT must be positive, got {SPEED_LIMIT}")
     
@@ -96,6 +176,78 @@ def validate_configuration() -> Tuple[bool, list]:
     if MAX_DISTANCE <= 0:
         errors.append(f"MAX_DISTANCE must be positive, got {MAX_DISTANCE}")
     
+    if PRESCAN_FPS <= 0:
+        errors.append(f"PRESCAN_FPS must be positive, got {PRESCAN_FPS}")
+    
+    if PRESCAN_PADDING_SECONDS < 0:
+        errors.append(f"PRESCAN_PADDING_SECONDS must be >= 0, got {PRESCAN_PADDING_SECONDS}")
+    
+    if not (0 < PRESCAN_MOTION_THRESHOLD < 1):
+        errors.append(f"PRESCAN_MOTION_THRESHOLD must be in (0,1), got {PRESCAN_MOTION_THRESHOLD}")
+    
+    if PRESCAN_WIDTH < 16:
+        errors.append(f"PRESCAN_WIDTH must be >= 16, got {PRESCAN_WIDTH}")
+    
+    if DECODE_RING_SLOTS < 2:
+        errors.append(f"DECODE_RING_SLOTS must be >= 2, got {DECODE_RING_SLOTS}")
+    
+    if STREAM_PROGRESS_INTERVAL < 1:
+        errors.append(f"STREAM_PROGRESS_INTERVAL must be >= 1, got {STREAM_PROGRESS_INTERVAL}")
+    
+    if JOB_WORKERS < 1:
+        errors.append(f"JOB_WORKERS must be >= 1, got {JOB_WORKERS}")
+    
+    if JOB_QUEUE_MAX < 1:
+        errors.append(f"JOB_QUEUE_MAX must be >= 1, got {JOB_QUEUE_MAX}")
+    
+    if JOB_QUEUE_MAX_BACKLOG_SECONDS <= 0:
+        errors.append(f"JOB_QUEUE_MAX_BACKLOG_SECONDS must be positive, got {JOB_QUEUE_MAX_BACKLOG_SECONDS}")
+    
+    if JOB_INITIAL_FRAME_COST_SECONDS <= 0:
+        errors.append(f"JOB_INITIAL_FRAME_COST_SECONDS must be positive, got {JOB_INITIAL_FRAME_COST_SECONDS}")
+    
+    if not (0 < JOB_COST_EWMA_ALPHA <= 1):
+        errors.append(f"JOB_COST_EWMA_ALPHA must be in (0,1], got {JOB_COST_EWMA_ALPHA}")
+    
+    if LIVE_STREAM_QUEUE_SIZE < 1:
+        errors.append(f"LIVE_STREAM_QUEUE_SIZE must be >= 1, got {LIVE_STREAM_QUEUE_SIZE}")
+    
+    if LIVE_STREAM_MAX_LAG_SECONDS <= 0:
+        errors.append(f"LIVE_STREAM_MAX_LAG_SECONDS must be positive, got {LIVE_STREAM_MAX_LAG_SECONDS}")
+    
+    if LIVE_STREAM_ERROR_TTL_SECONDS < 0:
+        errors.append(f"LIVE_STREAM_ERROR_TTL_SECONDS must be >= 0, got {LIVE_STREAM_ERROR_TTL_SECONDS}")
+    
+    if TRACE_SAMPLE_EVERY < 1:
+        errors.append(f"TRACE_SAMPLE_EVERY must be >= 1, got {TRACE_SAMPLE_EVERY}")
+    
+    if TRACE_MAX_EVENTS < 1:
+        errors.append(f"TRACE_MAX_EVENTS must be >= 1, got {TRACE_MAX_EVENTS}")
+    
+    if STUB_INFERENCE_MS < 0:
+        errors.append(f"STUB_INFERENCE_MS must be >= 0, got {STUB_INFERENCE_MS}")
+    
+    if RESULT_CACHE_MAX_MB <= 0:
+        errors.append(f"RESULT_CACHE_MAX_MB must be positive, got {RESULT_CACHE_MAX_MB}")
+    
+    if DETECTION_STORE_MAX_ANALYSES < 1:
+        errors.append(f"DETECTION_STORE_MAX_ANALYSES must be >= 1, got {DETECTION_STORE_MAX_ANALYSES}")
+    
+    if EVIDENCE_BUFFER_FRAMES < 1:
+        errors.append(f"EVIDENCE_BUFFER_FRAMES must be >= 1, got {EVIDENCE_BUFFER_FRAMES}")
+    
+    if EVIDENCE_FRAMES_PER_VEHICLE < 1:
+        errors.append(f"EVIDENCE_FRAMES_PER_VEHICLE must be >= 1, got {EVIDENCE_FRAMES_PER_VEHICLE}")
+    
+    if not (1 <= EVIDENCE_JPEG_QUALITY <= 100):
+        errors.append(f"EVIDENCE_JPEG_QUALITY must be in [1,100], got {EVIDENCE_JPEG_QUALITY}")
+    
+    if EVIDENCE_CLIP_PADDING_SECONDS < 0:
+        errors.append(f"EVIDENCE_CLIP_PADDING_SECONDS must be >= 0, got {EVIDENCE_CLIP_PADDING_SECONDS}")
+    
+    if EVIDENCE_MAX_MB <= 0:
+        errors.append(f"EVIDENCE_MAX_MB must be positive, got {EVIDENCE_MAX_MB}")
+    
     return len(errors) == 0, errors
 
 
@@ -126,12 +278,24 @@ def log_configuration(logger):
     logger.info(f"Models:")
     logger.info(f"  Vehicle: {VEHICLE_MODEL_PATH}")
     logger.info(f"  Plate:   {PLATE_MODEL_PATH}")
+    if STUB_DETECTORS:
+        logger.info(f"  STUBS:   enabled ({STUB_INFERENCE_MS} ms per call)")
     logger.info(f"Speed:")
     logger.info(f"  Limit:         {SPEED_LIMIT} km/h")
-    logger.info(f"  Calibration:   {PIXEL_TO_METER} m/pixel")
+    if GROUND_CALIBRATION:
+        logger.info(f"  Calibration:   ground plane (GROUND_CALIBRATION)")
+    else:
+        logger.info(f"  Calibration:   {PIXEL_TO_METER} m/pixel")
+    logger.info(f"  Ground tables: {GROUND_PLANE_CACHE_SIZE} cached")
     logger.info(f"Processing:")
     logger.info(f"  Frame skip:    {FRAME_SKIP}")
+    if PRESCAN_ENABLED:
+        logger.info(f"  Pre-scan:      {PRESCAN_FPS} fps at {PRESCAN_WIDTH}px, padding {PRESCAN_PADDING_SECONDS} s")
+    if DECODE_IN_PROCESS:
+        logger.info(f"  Decoding:      child process, {DECODE_RING_SLOTS} shared frame slots")
     logger.info(f"  Min frames:    {MIN_TRACKED_FRAMES}")
+    if SHARED_VIDEO_ROOT:
+        logger.info(f"  Shared videos: {SHARED_VIDEO_ROOT} (read in place)")
     logger.info(f"Confidence Thresholds:")
     logger.info(f"  Vehicle:       {VEHICLE_CONFIDENCE}")
     logger.info(f"  Plate:         {PLATE_CONFIDENCE}")
@@ -142,4 +306,34 @@ def log_configuration(logger):
     logger.info(f"OCR Enhancement:")
     logger.info(f"  Multi-pass:    {OCR_MULTI_PASS}")
     logger.info(f"  Max attempts:  {OCR_MAX_ATTEMPTS}")
+    logger.info(f"Runtime Config:")
+    logger.info(f"  File:          {RUNTIME_CONFIG_FILE or '(none)'}")
+    logger.info(f"  Admin API:     {'enabled' if ADMIN_TOKEN else 'disabled'}")
+    logger.info(f"  Tuning:        {TUNING_PROFILE_FILE or '(none)'}")
+    logger.info(f"Job Queue:")
+    logger.info(f"  Workers:       {JOB_WORKERS}")
+    logger.info(f"  Max queued:    {JOB_QUEUE_MAX}")
+    logger.info(f"  Max backlog:   {JOB_QUEUE_MAX_BACKLOG_SECONDS} s")
+    logger.info(f"Live Streams:")
+    logger.info(f"  Max streams:   {LIVE_STREAM_MAX}")
+    logger.info(f"  Queue size:    {LIVE_STREAM_QUEUE_SIZE} frames")
+    logger.info(f"  Max lag:       {LIVE_STREAM_MAX_LAG_SECONDS} s")
+    logger.info(f"  Allowed hosts: {', '.join(LIVE_STREAM_ALLOWED_HOSTS) or '(none)'}")
+    logger.info(f"Tracing:")
+    logger.info(f"  Enabled:       {TRACE_ENABLED}")
+    logger.info(f"  Sample every:  {TRACE_SAMPLE_EVERY} frames")
+    logger.info(f"  Directory:     {TRACE_DIR}")
+    logger.info(f"Result Cache:")
+    logger.info(f"  Enabled:       {RESULT_CACHE_ENABLED}")
+    logger.info(f"  Directory:     {RESULT_CACHE_DIR}")
+    logger.info(f"  Max size:      {RESULT_CACHE_MAX_MB} MB")
+    logger.info(f"Detection Store:")
+    logger.info(f"  Enabled:       {DETECTION_STORE_ENABLED}")
+    logger.info(f"  Directory:     {DETECTION_STORE_DIR}")
+    logger.info(f"  Max analyses:  {DETECTION_STORE_MAX_ANALYSES}")
+    logger.info(f"Evidence:")
+    logger.info(f"  Enabled:       {EVIDENCE_ENABLED}")
+    logger.info(f"  Directory:     {EVIDENCE_DIR}")
+    logger.info(f"  Clips:         {EVIDENCE_CLIPS}")
+    logger.info(f"  Max size:      {EVIDENCE_MAX_MB} MB")
     logger.info("=" * 50)
\ No newline at end of file
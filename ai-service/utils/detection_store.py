@@ -0,0 +1,154 @@
+import json
+import re
+import shutil
+import time
+import uuid
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ocr.ocr_reader import OCRResult
+
+# Column files written for every analysis
+FRAMES_FILE = "frames.npy"    # (F,)   int32  processed frame numbers
+OFFSETS_FILE = "offsets.npy"  # (F+1,) int64  row range of each frame in boxes
+BOXES_FILE = "boxes.npy"      # (N, 4) int32  vehicle boxes x1, y1, x2, y2
+PLATES_FILE = "plates.json"   # plate reads keyed by box row
+META_FILE = "meta.json"       # video and capture configuration
+
+ANALYSIS_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class DetectionStoreWriter:
+    """
+    Accumulate per-frame vehicle detections and plate reads in compact arrays
+
+    Boxes are held in typed arrays (4 bytes per coordinate) while the video
+    is processed and written as .npy columns on close(), so they can be
+    memory-mapped when the analysis is replayed.
+    """
+
+    def __init__(self, root: str, metadata: Dict):
+        self.analysis_id = uuid.uuid4().hex
+        self.directory = Path(root) / self.analysis_id
+        self.metadata = dict(metadata)
+
+        self._frames = array("i")
+        self._offsets = array("q", [0])
+        self._boxes = array("i")
+        self._plates = []
+
+    def add_frame(self, frame_id: int, rects: List[Tuple[int, int, int, int]]) -> int:
+        """
+        Record the detections of one processed frame
+
+        Returns:
+            Row index of the first box of this frame
+        """
+        base = self._offsets[-1]
+        for rect in rects:
+            self._boxes.extend(rect)
+        self._frames.append(frame_id)
+        self._offsets.append(base + len(rects))
+        return base
+
+    def add_plate(self, box_row: int, frame_id: int, ocr_result: OCRResult):
+        """Record the plate read for the vehicle box at box_row"""
+        self._plates.append({
+            "box_row": box_row,
+            "frame": frame_id,
+            "ocr": ocr_result.to_dict()
+        })
+
+    def close(self) -> str:
+        """
+        Write all columns to disk
+
+        Returns:
+            The analysis ID under which the detections were stored
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        np.save(self.directory / FRAMES_FILE, np.frombuffer(self._frames, dtype=np.int32))
+        np.save(self.directory / OFFSETS_FILE, np.frombuffer(self._offsets, dtype=np.int64))
+        np.save(
+            self.directory / BOXES_FILE,
+            np.frombuffer(self._boxes, dtype=np.int32).reshape(-1, 4)
+        )
+
+        with open(self.directory / PLATES_FILE, "w", encoding="utf-8") as f:
+            json.dump(self._plates, f)
+
+        metadata = dict(self.metadata)
+        metadata["analysis_id"] = self.analysis_id
+        metadata["created_at"] = time.time()
+        metadata["processed_frames"] = len(self._frames)
+        metadata["total_detections"] = len(self._boxes) // 4
+        with open(self.directory / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+
+        return self.analysis_id
+
+
+def prune_analyses(root: str, max_analyses: int):
+    """
+    Delete the oldest persisted analyses beyond max_analyses
+
+    Only complete analyses (with their metadata written) are counted, so
+    one being closed concurrently is never removed half-written.
+    """
+    try:
+        analyses = sorted(
+            (path for path in Path(root).glob(f"*/{META_FILE}") if ANALYSIS_ID_PATTERN.match(path.parent.name)),
+            key=lambda p: p.stat().st_mtime
+        )
+    except OSError:
+        return
+    for path in analyses[:max(0, len(analyses) - max_analyses)]:
+        shutil.rmtree(path.parent, ignore_errors=True)
+
+
+class DetectionStore:
+    """Read-only, memory-mapped view of a persisted analysis"""
+
+    def __init__(self, root: str, analysis_id: str):
+        if not ANALYSIS_ID_PATTERN.match(analysis_id):
+            raise FileNotFoundError(f"Invalid analysis ID: {analysis_id}")
+
+        self.analysis_id = analysis_id
+        self.directory = Path(root) / analysis_id
+        if not (self.directory / META_FILE).exists():
+            raise FileNotFoundError(f"Analysis not found: {analysis_id}")
+
+        with open(self.directory / META_FILE, "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+
+        self.frames = np.load(self.directory / FRAMES_FILE, mmap_mode="r")
+        self.offsets = np.load(self.directory / OFFSETS_FILE, mmap_mode="r")
+        self.boxes = np.load(self.directory / BOXES_FILE, mmap_mode="r")
+
+        with open(self.directory / PLATES_FILE, "r", encoding="utf-8") as f:
+            self.plates = {
+                entry["box_row"]: OCRResult.from_dict(entry["ocr"])
+                for entry in json.load(f)
+            }
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def iter_frames(self):
+        """
+        Yield (frame_id, first_box_row, rects) for every processed frame
+
+        rects are plain integer tuples, the same shape VehicleDetector.detect
+        returns, so they can be fed straight into CentroidTracker.update.
+        """
+        for i in range(len(self.frames)):
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            rects = [tuple(int(v) for v in row) for row in self.boxes[start:end]]
+            yield int(self.frames[i]), start, rects
+
+    def plate_for(self, box_row: int) -> Optional[OCRResult]:
+        return self.plates.get(box_row)
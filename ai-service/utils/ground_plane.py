@@ -0,0 +1,148 @@
+"""
+Perspective-corrected positions on the road plane
+
+A single PIXEL_TO_METER only holds for a camera looking straight down: on an
+angled camera a pixel far from the camera covers much more road than one
+near it. A ground calibration maps image pixels to metres on the road:
+
+    {"image_points": [[412, 300], [868, 300], [1180, 700], [100, 700]],
+     "ground_points": [[0, 0], [7, 0], [7, 30], [0, 30]],
+     "resolution": [1280, 720]}
+
+image_points are at least four points on the road surface (lane marking
+corners, ...) marked on a frame of the given resolution, ground_points the
+same points in metres in any flat coordinate system on the road. The
+homography between them is turned once per calibration into a lookup table
+with the ground coordinates of every pixel, so mapping positions is an
+array index. Frames of another resolution are scaled to the calibration
+resolution. The table takes 8 bytes per pixel (7.4 MB at 1280x720): mark
+the points on a smaller frame to make it cheaper.
+"""
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.config import GROUND_PLANE_CACHE_SIZE
+
+
+def _is_point(value) -> bool:
+    return (
+        isinstance(value, (list, tuple)) and len(value) == 2 and
+        all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+    )
+
+
+def calibration_homography(calibration: Dict) -> np.ndarray:
+    """
+    3x3 matrix from image pixels to ground metres (least squares over all points)
+
+    Raises:
+        ValueError: if the points are degenerate (e.g. three on one line)
+    """
+    image_points = np.asarray(calibration["image_points"], dtype=np.float64)
+    ground_points = np.asarray(calibration["ground_points"], dtype=np.float64)
+    matrix, _ = cv2.findHomography(image_points, ground_points, 0)
+    if matrix is None or abs(np.linalg.det(matrix)) < 1e-12:
+        raise ValueError("the points do not define a plane mapping (are three of them on one line?)")
+
+    # Scale so that points in front of the camera have a positive w
+    center = image_points.mean(axis=0)
+    if matrix[2, 0] * center[0] + matrix[2, 1] * center[1] + matrix[2, 2] < 0:
+        matrix = -matrix
+    return matrix
+
+
+def calibration_errors(calibration) -> List[str]:
+    """Problems with a ground calibration (empty when valid)"""
+    if not isinstance(calibration, dict):
+        return [f"ground_calibration must be an object, got {calibration!r}"]
+
+    errors = [f"ground_calibration: unknown key {key}" for key in calibration
+              if key not in ("image_points", "ground_points", "resolution")]
+
+    resolution = calibration.get("resolution")
+    if (not isinstance(resolution, (list, tuple)) or len(resolution) != 2 or
+            not all(isinstance(v, int) and not isinstance(v, bool) and v > 0 for v in resolution)):
+        errors.append(f"ground_calibration.resolution must be [width, height] in pixels, got {resolution!r}")
+        resolution = None
+
+    for key in ("image_points", "ground_points"):
+        points = calibration.get(key)
+        if not isinstance(points, (list, tuple)) or len(points) < 4 or not all(map(_is_point, points)):
+            errors.append(f"ground_calibration.{key} must be a list of at least 4 [x, y] points")
+    if errors:
+        return errors
+
+    if len(calibration["image_points"]) != len(calibration["ground_points"]):
+        errors.append("ground_calibration: image_points and ground_points must have the same length")
+    elif resolution is not None:
+        width, height = resolution
+        outside = [point for point in calibration["image_points"]
+                   if not (0 <= point[0] < width and 0 <= point[1] < height)]
+        if outside:
+            errors.append(f"ground_calibration.image_points outside the {width}x{height} frame: {outside}")
+    if errors:
+        return errors
+
+    try:
+        calibration_homography(calibration)
+    except ValueError as e:
+        errors.append(f"ground_calibration: {e}")
+    return errors
+
+
+class GroundPlane:
+    """Ground coordinates (metres) of every pixel of one calibration"""
+
+    def __init__(self, calibration: Dict):
+        self.width, self.height = calibration["resolution"]
+        self.matrix = calibration_homography(calibration)
+
+        m = self.matrix
+        xs = np.arange(self.width, dtype=np.float64)[np.newaxis, :]
+        ys = np.arange(self.height, dtype=np.float64)[:, np.newaxis]
+        w = m[2, 0] * xs + m[2, 1] * ys + m[2, 2]
+
+        self.lut = np.empty((self.height, self.width, 2), dtype=np.float32)
+        # Pixels at or above the horizon have no ground position
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = np.where(w > 0, w, np.nan)
+            self.lut[..., 0] = (m[0, 0] * xs + m[0, 1] * ys + m[0, 2]) / w
+            self.lut[..., 1] = (m[1, 0] * xs + m[1, 1] * ys + m[1, 2]) / w
+
+    def to_ground(self, points, frame_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Look up the ground coordinates of pixel positions
+
+        Args:
+            points: (N, 2) x, y pixel positions
+            frame_size: (width, height) of the frames the positions come
+                from (default: the calibration resolution)
+
+        Returns:
+            (N, 2) float32 positions in metres (NaN above the horizon)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if frame_size is not None and tuple(frame_size) != (self.width, self.height):
+            points = points * (self.width / frame_size[0], self.height / frame_size[1])
+        x = np.clip(np.rint(points[:, 0]), 0, self.width - 1).astype(np.intp)
+        y = np.clip(np.rint(points[:, 1]), 0, self.height - 1).astype(np.intp)
+        return self.lut[y, x]
+
+
+# Lookup tables kept in memory (least recently used are rebuilt on demand).
+# Each takes 8 bytes per calibration pixel: 7.4 MB at 1280x720, 16.6 MB at
+# 1920x1080, so the cache costs up to GROUND_PLANE_CACHE_SIZE times that.
+@lru_cache(maxsize=GROUND_PLANE_CACHE_SIZE)
+def _cached_ground_plane(key: str) -> GroundPlane:
+    return GroundPlane(json.loads(key))
+
+
+def ground_plane(calibration: Optional[Dict]) -> Optional[GroundPlane]:
+    """The (cached) GroundPlane of a validated calibration, or None without one"""
+    if calibration is None:
+        return None
+    return _cached_ground_plane(json.dumps(calibration, sort_keys=True))
@@ -0,0 +1,244 @@
+"""
+Minimal Prometheus-compatible metrics (text exposition format 0.0.4)
+
+Counters, gauges and histograms with labels, collected in a registry that
+is rendered by the /metrics endpoint. Collector callbacks registered with
+REGISTRY.add_collector() run before each scrape to refresh values owned by
+other components (cache statistics, live stream lag, ...).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.tracing import record_span
+
+# Stage latencies range from sub-millisecond crops to multi-second OCR passes
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Whole requests range from cache hits to long videos
+REQUEST_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback that refreshes metric values before each scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a total counted by another component"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = STAGE_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{labels} {values[-1]}")
+        return lines
+
+
+@contextmanager
+def timed(histogram: Histogram, span: Optional[str] = None, **labels):
+    """
+    Observe the duration of the with-block in histogram
+
+    If span is given, the block is also recorded in the trace of the
+    current request (see utils.tracing).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        histogram.observe(duration, **labels)
+        if span is not None:
+            record_span(span, "stage", start, duration)
+
+
+# Service Metrics
+STAGE_SECONDS = Histogram(
+    "ai_stage_duration_seconds",
+    "Duration of one pipeline stage call",
+    ("stage",)
+)
+OCR_PASS_SECONDS = Histogram(
+    "ai_ocr_pass_duration_seconds",
+    "Duration of one OCR pass by preprocessing variant",
+    ("pass",)
+)
+REQUEST_SECONDS = Histogram(
+    "ai_request_duration_seconds",
+    "End-to-end duration of video processing requests",
+    ("endpoint",),
+    buckets=REQUEST_BUCKETS
+)
+FRAMES_PROCESSED = Counter(
+    "ai_frames_processed_total",
+    "Frames run through detection and tracking"
+)
+OCR_CALLS = Counter(
+    "ai_ocr_calls_total",
+    "OCR engine invocations",
+    ("pass",)
+)
+VIDEOS_PROCESSED = Counter(
+    "ai_videos_processed_total",
+    "Video processing requests by outcome",
+    ("outcome",)
+)
+ACTIVE_JOBS = Gauge(
+    "ai_active_jobs",
+    "Video processing requests currently running"
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "ai_job_queue_wait_seconds",
+    "Time jobs spend in the queue before processing starts",
+    buckets=REQUEST_BUCKETS
+)
+JOBS_REJECTED = Counter(
+    "ai_jobs_rejected_total",
+    "Video processing requests rejected by admission control"
+)
+
+
+def stage_timer(stage: str):
+    """Time one call of a pipeline stage (decode, vehicle_detect, ...)"""
+    return timed(STAGE_SECONDS, span=stage, stage=stage)
+
+
+def record_stage(stage: str, start: float, duration: float):
+    """Record one stage call measured in several pieces (start: perf_counter)"""
+    STAGE_SECONDS.observe(duration, stage=stage)
+    record_span(stage, "stage", start, duration)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
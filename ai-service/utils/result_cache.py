@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+from utils.config import PLATE_MODEL_PATH, STUB_DETECTORS, VEHICLE_MODEL_PATH
+
+
+def hash_config(config: Dict, model_fingerprint: str = "") -> str:
+    """
+    Hash a configuration dictionary together with the model fingerprint
+
+    Args:
+        config: Configuration values that influence the analysis result
+        model_fingerprint: Digest of the model files (see fingerprint_files)
+
+    Returns:
+        Hex digest identifying the configuration
+    """
+    payload = json.dumps(config, sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode("utf-8"))
+    digest.update(model_fingerprint.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fingerprint_files(paths: Iterable[str], chunk_size: int = 1024 ** 2) -> str:
+    """
+    Compute a content digest over a set of files (e.g. model weights)
+
+    Missing files contribute only their path, so a fingerprint can still be
+    computed when the configuration is invalid.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_models() -> str:
+    """Fingerprint of the configured detection models ("stub" for the stub detectors)"""
+    return "stub" if STUB_DETECTORS else fingerprint_files([VEHICLE_MODEL_PATH, PLATE_MODEL_PATH])
+
+
+def make_cache_key(video_digest: str, config_digest: str) -> str:
+    """Combine video and configuration digests into a cache key"""
+    return hashlib.sha256(f"{video_digest}:{config_digest}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of analysis results
+
+    Entries are stored as one JSON file per key. The total size on disk is
+    bounded by max_bytes; least recently used entries are evicted first.
+    Recency survives restarts through the file modification times.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes (oldest first)
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load_index(self):
+        """Rebuild the LRU index from the files already on disk"""
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str, usable: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        """
+        Look up a cached result
+
+        Args:
+            key: Cache key
+            usable: Check of the cached result; a result it rejects is a miss
+
+        Returns:
+            The cached result, or None on a miss
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                # Entry vanished or is corrupt, treat as a miss
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            # Rejected results stay cached but are not refreshed
+            if usable is not None and not usable(result):
+                self.misses += 1
+                return None
+
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict):
+        """Store a result, evicting old entries if the size bound is exceeded"""
+        data = json.dumps(result, default=str).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+
+        with self._lock:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            self._commit(key, tmp_path)
+
+    def put_file(self, key: str, source: str):
+        """Store a result already serialized as a JSON file at source"""
+        if os.path.getsize(source) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+
+        with self._lock:
+            shutil.copyfile(source, tmp_path)
+            self._commit(key, tmp_path)
+
+    def _commit(self, key: str, tmp_path: Path):
+        path = self._path(key)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)
+        self._entries[key] = size
+        self._total_bytes += size
+        self.stores += 1
+
+        self._evict()
+
+    def _remove(self, key: str):
+        size = self._entries.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss statistics for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,341 @@
+"""
+Runtime analysis configuration
+
+Settings that only change how a video is analysed (speed limit,
+calibration, frame skip, thresholds, OCR and response options) live in a
+RuntimeConfig, which is passed explicitly through the pipeline. They can be
+changed without a restart, so the loaded models stay in memory:
+
+- the service starts from the environment (utils.config)
+- RUNTIME_CONFIG_FILE overlays defaults and per-camera profiles, and can be
+  reloaded through the admin endpoints
+- admin PATCH requests change values at runtime (persisted to the file)
+- a request can select a camera profile and override single values
+
+Settings that need a restart (model paths, directories, worker counts)
+stay in utils.config.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import Dict, List, Optional
+
+from utils.config import (
+    SPEED_LIMIT,
+    PIXEL_TO_METER,
+    GROUND_CALIBRATION,
+    MIN_TRACKED_FRAMES,
+    FRAME_SKIP,
+    VEHICLE_CONFIDENCE,
+    PLATE_CONFIDENCE,
+    OCR_CONFIDENCE,
+    MAX_DISAPPEARED,
+    MAX_DISTANCE,
+    OCR_MULTI_PASS,
+    OCR_MAX_ATTEMPTS,
+    INCLUDE_TRAJECTORY,
+    TRAJECTORY_SAMPLING,
+    PRESCAN_ENABLED,
+    PRESCAN_FPS,
+    PRESCAN_PADDING_SECONDS,
+    PRESCAN_MOTION_THRESHOLD
+)
+from utils.ground_plane import calibration_errors, ground_plane
+
+
+def default_ground_calibration() -> Optional[Dict]:
+    """GROUND_CALIBRATION from the environment (invalid JSON is reported by validate_configuration)"""
+    try:
+        return json.loads(GROUND_CALIBRATION) if GROUND_CALIBRATION else None
+    except ValueError:
+        return None
+
+
+class ConfigError(ValueError):
+    """Invalid configuration values; errors lists every problem found"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """Analysis settings of one request (keys match the /config response)"""
+
+    speed_limit_kmh: float = SPEED_LIMIT
+    pixel_to_meter: float = PIXEL_TO_METER
+    min_tracked_frames: int = MIN_TRACKED_FRAMES
+    frame_skip: int = FRAME_SKIP
+    vehicle_confidence: float = VEHICLE_CONFIDENCE
+    plate_confidence: float = PLATE_CONFIDENCE
+    ocr_confidence: float = OCR_CONFIDENCE
+    max_disappeared: int = MAX_DISAPPEARED
+    max_distance: float = MAX_DISTANCE
+    ocr_multi_pass: bool = OCR_MULTI_PASS
+    ocr_max_attempts: int = OCR_MAX_ATTEMPTS
+    include_trajectory: bool = INCLUDE_TRAJECTORY
+    trajectory_sampling: int = TRAJECTORY_SAMPLING
+    prescan_enabled: bool = PRESCAN_ENABLED
+    prescan_fps: float = PRESCAN_FPS
+    prescan_padding_seconds: float = PRESCAN_PADDING_SECONDS
+    prescan_motion_threshold: float = PRESCAN_MOTION_THRESHOLD
+    # Homography calibration of the camera (see utils.ground_plane); replaces pixel_to_meter
+    ground_calibration: Optional[Dict] = field(default_factory=default_ground_calibration)
+
+    def with_overrides(self, overrides: Dict) -> "RuntimeConfig":
+        """
+        Return a copy with some values replaced
+
+        Raises:
+            ConfigError: on unknown keys, wrong types or out-of-range values
+        """
+        errors = []
+        values = {}
+        types = {field.name: field.type for field in fields(self)}
+
+        for key, value in overrides.items():
+            expected = types.get(key)
+            if expected is None:
+                errors.append(f"Unknown setting: {key}")
+            elif key == "ground_calibration":
+                if value is None or isinstance(value, dict):
+                    values[key] = value
+                else:
+                    errors.append(f"{key} must be an object or null, got {value!r}")
+            elif expected is bool:
+                if isinstance(value, bool):
+                    values[key] = value
+                else:
+                    errors.append(f"{key} must be true or false, got {value!r}")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                errors.append(f"{key} must be a number, got {value!r}")
+            elif expected is int and not float(value).is_integer():
+                errors.append(f"{key} must be an integer, got {value!r}")
+            else:
+                values[key] = expected(value)
+
+        if errors:
+            raise ConfigError(errors)
+
+        config = replace(self, **values)
+        errors = config.validate()
+        if errors:
+            raise ConfigError(errors)
+        return config
+
+    def validate(self) -> List[str]:
+        """Range checks, with the same rules as validate_configuration"""
+        errors = []
+
+        if self.speed_limit_kmh <= 0:
+            errors.append(f"speed_limit_kmh must be positive, got {self.speed_limit_kmh}")
+
+        if self.pixel_to_meter <= 0:
+            errors.append(f"pixel_to_meter must be positive, got {self.pixel_to_meter}")
+
+        if self.min_tracked_frames < 2:
+            errors.append(f"min_tracked_frames must be >= 2, got {self.min_tracked_frames}")
+
+        if self.frame_skip < 0:
+            errors.append(f"frame_skip must be >= 0, got {self.frame_skip}")
+
+        for key in ("vehicle_confidence", "plate_confidence", "ocr_confidence"):
+            value = getattr(self, key)
+            if not (0 < value < 1):
+                errors.append(f"{key} must be in (0,1), got {value}")
+
+        if self.max_disappeared < 1:
+            errors.append(f"max_disappeared must be >= 1, got {self.max_disappeared}")
+
+        if self.max_distance <= 0:
+            errors.append(f"max_distance must be positive, got {self.max_distance}")
+
+        if self.ocr_max_attempts < 1:
+            errors.append(f"ocr_max_attempts must be >= 1, got {self.ocr_max_attempts}")
+
+        if self.trajectory_sampling < 1:
+            errors.append(f"trajectory_sampling must be >= 1, got {self.trajectory_sampling}")
+
+        if self.prescan_fps <= 0:
+            errors.append(f"prescan_fps must be positive, got {self.prescan_fps}")
+
+        if self.prescan_padding_seconds < 0:
+            errors.append(f"prescan_padding_seconds must be >= 0, got {self.prescan_padding_seconds}")
+
+        if not (0 < self.prescan_motion_threshold < 1):
+            errors.append(f"prescan_motion_threshold must be in (0,1), got {self.prescan_motion_threshold}")
+
+        if self.ground_calibration is not None:
+            errors.extend(calibration_errors(self.ground_calibration))
+
+        return errors
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class RuntimeConfigStore:
+    """
+    Current defaults and camera profiles, swapped atomically on change
+
+    The file holds only the values that differ from the environment:
+        {"defaults": {"speed_limit_kmh": 60}, "cameras": {"cam-1": {"pixel_to_meter": 0.04}}}
+    Camera profiles are applied on top of the defaults.
+    """
+
+    def __init__(self, base: RuntimeConfig, path: Optional[str] = None):
+        self.base = base
+        self.path = path
+        self.version = 0
+        self.loaded_at = None
+
+        self._overrides: Dict = {}
+        self._camera_overrides: Dict[str, Dict] = {}
+        self._defaults = base
+        self._cameras: Dict[str, RuntimeConfig] = {}
+        self._lock = threading.Lock()
+
+    def _build(self, overrides: Dict, camera_overrides: Dict[str, Dict]):
+        """Validate everything before anything is swapped in"""
+        errors = []
+        defaults = self.base
+        try:
+            defaults = self.base.with_overrides(overrides)
+        except ConfigError as e:
+            errors.extend(f"defaults: {error}" for error in e.errors)
+
+        cameras = {}
+        for camera_id, values in camera_overrides.items():
+            if not isinstance(values, dict):
+                errors.append(f"cameras.{camera_id}: must be an object")
+                continue
+            try:
+                cameras[camera_id] = defaults.with_overrides(values)
+            except ConfigError as e:
+                errors.extend(f"cameras.{camera_id}: {error}" for error in e.errors)
+
+        if errors:
+            raise ConfigError(errors)
+
+        # Build the ground lookup tables now rather than on the first request
+        for config in (defaults, *cameras.values()):
+            ground_plane(config.ground_calibration)
+        return defaults, cameras
+
+    def _swap(self, overrides: Dict, camera_overrides: Dict[str, Dict], save: bool = False):
+        defaults, cameras = self._build(overrides, camera_overrides)
+        if save:
+            # Written first, so a failed write leaves the current configuration in place
+            self._save(overrides, camera_overrides)
+        self._overrides = overrides
+        self._camera_overrides = camera_overrides
+        self._defaults = defaults
+        self._cameras = cameras
+        self.version += 1
+        self.loaded_at = time.time()
+
+    def load(self):
+        """
+        (Re)load the configuration file; a missing file means no overrides
+
+        Raises:
+            ConfigError: if the file is unreadable or invalid (the current
+                configuration is kept)
+        """
+        overrides, camera_overrides = {}, {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                raise ConfigError([f"Cannot read {self.path}: {e}"])
+            if not isinstance(data, dict):
+                raise ConfigError([f"{self.path} must contain a JSON object"])
+            overrides = data.get("defaults") or {}
+            camera_overrides = data.get("cameras") or {}
+            if not isinstance(overrides, dict) or not isinstance(camera_overrides, dict):
+                raise ConfigError(["'defaults' and 'cameras' must be objects"])
+
+        with self._lock:
+            self._swap(overrides, camera_overrides)
+
+    def update(self, values: Dict, camera_id: Optional[str] = None):
+        """
+        Change default (or camera) values; a null value removes an override
+
+        The result is written back to the configuration file, if any.
+
+        Raises:
+            ConfigError: if the values are invalid (nothing is changed)
+            OSError: if the file cannot be written (nothing is changed)
+        """
+        with self._lock:
+            overrides = dict(self._overrides)
+            camera_overrides = {key: dict(value) for key, value in self._camera_overrides.items()}
+            target = overrides if camera_id is None else camera_overrides.setdefault(camera_id, {})
+
+            for key, value in values.items():
+                if value is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = value
+
+            self._swap(overrides, camera_overrides, save=True)
+
+    def remove_camera(self, camera_id: str) -> bool:
+        with self._lock:
+            if camera_id not in self._camera_overrides:
+                return False
+            camera_overrides = dict(self._camera_overrides)
+            del camera_overrides[camera_id]
+            self._swap(self._overrides, camera_overrides, save=True)
+            return True
+
+    def _save(self, overrides: Dict, camera_overrides: Dict[str, Dict]):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"defaults": overrides, "cameras": camera_overrides}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def get(self, camera_id: Optional[str] = None) -> RuntimeConfig:
+        """
+        Configuration for a camera (or the defaults)
+
+        Raises:
+            ConfigError: if the camera has no profile
+        """
+        if camera_id is None:
+            return self._defaults
+        config = self._cameras.get(camera_id)
+        if config is None:
+            raise ConfigError([f"Unknown camera: {camera_id}"])
+        return config
+
+    def resolve(self, camera_id: Optional[str] = None, overrides: Optional[Dict] = None) -> RuntimeConfig:
+        """Configuration of one request: camera profile plus request overrides"""
+        config = self.get(camera_id)
+        return config.with_overrides(overrides) if overrides else config
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "loaded_at": self.loaded_at,
+                "source": self.path or None,
+                "defaults": self._defaults.to_dict(),
+                "cameras": {camera_id: config.to_dict() for camera_id, config in self._cameras.items()},
+                "overrides": {"defaults": dict(self._overrides), "cameras": dict(self._camera_overrides)}
+            }
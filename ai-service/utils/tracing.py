@@ -0,0 +1,179 @@
+"""
+Per-request trace timelines in Chrome trace-event format
+
+A Tracer collects timestamped spans ("X" events) and counters ("C" events)
+that can be opened in chrome://tracing or https://ui.perfetto.dev.
+
+The tracer of the current request is held in a context variable, so code
+deep in the pipeline (stage timers, OCR passes) records spans without
+having it passed around. When no tracer is active, span() is a no-op.
+Frames are sampled (every sample_every-th frame is traced) and the number
+of events is capped, so tracing a long video stays cheap.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_current_tracer: ContextVar[Optional["Tracer"]] = ContextVar("tracer", default=None)
+
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Tracer:
+    """Collect the spans of one request"""
+
+    def __init__(self, sample_every: int = 1, max_events: int = 100000, metadata: Optional[Dict] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.sample_every = max(1, sample_every)
+        self.max_events = max_events
+        self.metadata = metadata or {}
+
+        self.events: List[Dict] = []
+        self.dropped_events = 0
+        self.sampled_frames = 0
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def should_sample(self, frame_index: int) -> bool:
+        """Whether the frame_index-th processed frame (0-based) is traced"""
+        return frame_index % self.sample_every == 0
+
+    def _append(self, event: Dict):
+        tid = threading.get_ident()
+        event["pid"] = self._pid
+        event["tid"] = tid
+        with self._lock:
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+            self.events.append(event)
+
+    def add_span(self, name: str, category: str, start: float, duration: float, args: Optional[Dict] = None):
+        """Record a span from perf_counter() start time and duration in seconds"""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round(duration * 1e6, 1)
+        }
+        if args:
+            event["args"] = args
+        self._append(event)
+
+    def add_counter(self, name: str, values: Dict):
+        self._append({
+            "name": name,
+            "ph": "C",
+            "ts": round((time.perf_counter() - self._origin) * 1e6, 1),
+            "args": values
+        })
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+
+        thread_names = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        process_name = {"name": "process_name", "ph": "M", "pid": self._pid, "tid": 0, "args": {"name": "ai-service"}}
+
+        return {
+            "traceEvents": [process_name] + thread_names + events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                **self.metadata,
+                "trace_id": self.trace_id,
+                "sample_every": self.sample_every,
+                "sampled_frames": self.sampled_frames,
+                "dropped_events": self.dropped_events
+            }
+        }
+
+    def write(self, directory: str) -> Path:
+        """Write the trace to <directory>/<trace_id>.json"""
+        os.makedirs(directory, exist_ok=True)
+        path = Path(directory) / f"{self.trace_id}.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+        return path
+
+
+@contextmanager
+def activate(tracer: Optional[Tracer]):
+    """
+    Make tracer the current tracer inside the with-block
+
+    Activation must not span a yield: generators re-activate around each
+    step instead, since they may be resumed from another thread.
+    """
+    token = _current_tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _current_tracer.reset(token)
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name: str, category: str = "stage", **args):
+    """Record the with-block as a span of the current tracer, if any"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add_span(name, category, start, time.perf_counter() - start, args)
+
+
+def record_span(name: str, category: str, start: float, duration: float):
+    """Record an already measured span (used by the metric timers)"""
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        tracer.add_span(name, category, start, duration)
+
+
+def counter(name: str, **values):
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        tracer.add_counter(name, values)
+
+
+def prune_traces(directory: str, max_files: int):
+    """Delete the oldest trace files beyond max_files"""
+    try:
+        traces = sorted(Path(directory).glob("*.json"), key=lambda p: p.stat().st_mtime)
+    except OSError:
+        return
+    for path in traces[:max(0, len(traces) - max_files)]:
+        path.unlink(missing_ok=True)
+
+
+def trace_path(directory: str, trace_id: str) -> Optional[Path]:
+    """Path of a stored trace, or None if the ID is malformed or unknown"""
+    if not TRACE_ID_PATTERN.match(trace_id):
+        return None
+    path = Path(directory) / f"{trace_id}.json"
+    return path if path.is_file() else None
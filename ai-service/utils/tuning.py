@@ -0,0 +1,142 @@
+"""
+Host tuning profile
+
+torch, OpenCV and PaddleOCR each size their thread pools for the whole
+machine, so in one process they compete for the same cores. The profile
+written by benchmarks.tune records the thread counts and the plate
+detection batch size that were fastest on this host; the service applies
+it at startup, before the models are loaded.
+
+A profile is tied to the host it was measured on: if the CPU count or
+architecture differ it is ignored (run the tuner again after moving to
+other hardware).
+"""
+import json
+import logging
+import os
+import platform
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, Optional
+
+import cv2
+
+logger = logging.getLogger("ai-service")
+
+
+def usable_cpus() -> int:
+    """CPUs this process may run on (affinity, e.g. docker --cpuset-cpus)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def host_fingerprint() -> Dict:
+    return {
+        "cpu_count": usable_cpus(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine()
+    }
+
+
+@dataclass
+class TuningProfile:
+    """Thread counts (None = library default) and batch size for this host"""
+
+    torch_threads: Optional[int] = None
+    opencv_threads: Optional[int] = None
+    paddle_threads: Optional[int] = None
+    plate_batch_size: int = 1
+    host: Dict = field(default_factory=host_fingerprint)
+    created_at: float = field(default_factory=time.time)
+    measurements: Dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TuningProfile":
+        known = {f.name for f in fields(cls)}
+        profile = cls(**{key: value for key, value in data.items() if key in known})
+        for key in ("torch_threads", "opencv_threads", "paddle_threads"):
+            value = getattr(profile, key)
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise ValueError(f"{key} must be a positive integer, got {value!r}")
+        if not isinstance(profile.plate_batch_size, int) or profile.plate_batch_size < 1:
+            raise ValueError(f"plate_batch_size must be a positive integer, got {profile.plate_batch_size!r}")
+        return profile
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def settings(self) -> Dict:
+        """The tuned values only"""
+        return {
+            "torch_threads": self.torch_threads,
+            "opencv_threads": self.opencv_threads,
+            "paddle_threads": self.paddle_threads,
+            "plate_batch_size": self.plate_batch_size
+        }
+
+    def matches_host(self) -> bool:
+        current = host_fingerprint()
+        return all(self.host.get(key) == current[key] for key in ("cpu_count", "machine"))
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+# Profile in effect in this process (defaults until apply_profile is called)
+active = TuningProfile(host={}, created_at=0.0)
+
+
+def load_profile(path: str) -> Optional[TuningProfile]:
+    """
+    Read a profile; None if there is none or it was made on another host
+
+    Raises:
+        ValueError: if the file is unreadable or holds invalid values
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = TuningProfile.from_dict(json.load(f))
+    except (OSError, TypeError, ValueError) as e:
+        raise ValueError(f"Cannot read tuning profile {path}: {e}")
+
+    if not profile.matches_host():
+        logger.warning(
+            "Tuning profile %s was made on another host (%s, now %s); ignored, run benchmarks.tune again",
+            path, profile.host, host_fingerprint()
+        )
+        return None
+    return profile
+
+
+def apply_profile(profile: TuningProfile):
+    """
+    Set the thread pools and make the profile active
+
+    Call before the models and the OCR engine are created: PaddleOCR reads
+    its thread count only when the engine is built.
+    """
+    global active
+
+    if profile.opencv_threads is not None:
+        cv2.setNumThreads(profile.opencv_threads)
+    if profile.torch_threads is not None:
+        try:
+            import torch
+        except ImportError:
+            pass
+        else:
+            torch.set_num_threads(profile.torch_threads)
+    if profile.paddle_threads is not None:
+        from ocr.ocr_reader import set_ocr_threads
+        set_ocr_threads(profile.paddle_threads)
+
+    active = profile